@@ -1,9 +1,22 @@
 import streamlit as st
 from snowflake.snowpark.context import get_active_session
-import pandas as pd
+from catalog import get_snapshot, invalidate_snapshot
+from table_info_editor import (
+    DEFAULT_PAGE_SIZE,
+    PAGE_SIZE_OPTIONS,
+    apply_pending_to_page,
+    apply_table_info_changes,
+    build_filter,
+    count_table_info,
+    diff_table_info,
+    fetch_table_info_page,
+    merge_pending_changes,
+    pending_to_changes,
+)
+from query_log import instrument_session, render_debug_panel
 
-# Snowflakeセッションを取得
-session = get_active_session()
+# Snowflakeセッションを取得（クエリごとに所要時間・件数を記録する）
+session = instrument_session(get_active_session(), page="TABLE_INFO編集")
 
 st.set_page_config(layout="wide")
 st.title("TABLE_INFO編集")
@@ -11,21 +24,22 @@ st.title("TABLE_INFO編集")
 # セッションステートの初期化
 if 'refresh' not in st.session_state:
     st.session_state.refresh = 0
+if 'pending_changes' not in st.session_state:
+    # 保存前の編集内容 {(LOCATION, TABLE_NAME): {カラム: 値}}（ページをまたいで保持）
+    st.session_state.pending_changes = {}
+if 'page_cursors' not in st.session_state:
+    # 各ページの開始位置（直前のページ末尾のキー）。先頭ページは None
+    st.session_state.page_cursors = [None]
 
 # フィルター・検索セクション
+session.set_section("フィルター")
 st.markdown("### 🔍 フィルター・検索")
-col_filter1, col_filter2 = st.columns([1, 2])
+col_filter1, col_filter2, col_filter3 = st.columns([1, 2, 1])
 
 with col_filter1:
-    # ロケーション一覧を取得
+    # スナップショットからロケーション一覧を取得
     try:
-        locations_query = """
-            SELECT DISTINCT LOCATION
-            FROM DIESELPJ_GEN.DATA_CATALOG.TABLE_INFO
-            ORDER BY LOCATION
-        """
-        locations_result = session.sql(locations_query).collect()
-        location_list = ["すべて"] + [row['LOCATION'] for row in locations_result]
+        location_list = ["すべて"] + get_snapshot(session).locations
         
         selected_location = st.selectbox(
             "📁 ロケーションでフィルター",
@@ -43,59 +57,48 @@ with col_filter2:
         key="search_text"
     )
 
+with col_filter3:
+    page_size = st.selectbox(
+        "📄 1ページの表示件数",
+        PAGE_SIZE_OPTIONS,
+        index=PAGE_SIZE_OPTIONS.index(DEFAULT_PAGE_SIZE),
+        key="page_size"
+    )
+
 st.markdown("---")
 
-# TABLE_INFOテーブルからデータを取得
+# TABLE_INFOテーブルからデータを取得（1ページ分のみ）
+session.set_section("一覧")
 try:
-    # WHERE句を構築
-    where_clauses = []
-    
-    if selected_location != "すべて":
-        where_clauses.append(f"LOCATION = '{selected_location}'")
-    
-    if search_text and search_text.strip():
-        # テーブル名またはロケーション名で部分一致検索
-        search_escaped = search_text.replace("'", "''")
-        where_clauses.append(f"(UPPER(TABLE_NAME) LIKE UPPER('%{search_escaped}%') OR UPPER(LOCATION) LIKE UPPER('%{search_escaped}%'))")
+    where_clause, params = build_filter(selected_location, search_text)
     
-    where_clause = " AND ".join(where_clauses) if where_clauses else "1=1"
+    # 件数はフィルター条件が変わったとき（または再読込時）だけ数える
+    filter_key = (where_clause, tuple(params), page_size, st.session_state.refresh)
+    if st.session_state.get('filter_key') != filter_key:
+        st.session_state.filter_key = filter_key
+        st.session_state.total_count = count_table_info(session, where_clause, params)
+        st.session_state.page_cursors = [None]
     
-    query = f"""
-        SELECT 
-            TABLE_NAME,
-            LOCATION,
-            ACCOUNT,
-            CLASSIFICATION,
-            COLUMN_NUM,
-            RECORD_NUM,
-            CREATION_DATE,
-            UPDATE_DATE,
-            OWNER,
-            SUB_OWNER,
-            TABLE_COMMENT,
-            COLUMN_COMMENT,
-            COLUMN_COMMENT_FLAG,
-            PUBLISH,
-            SCOPE,
-            APPLICATION_PROJECT,
-            COMMENT
-        FROM DIESELPJ_GEN.DATA_CATALOG.TABLE_INFO
-        WHERE {where_clause}
-        ORDER BY LOCATION, TABLE_NAME
-    """
+    total_count = st.session_state.total_count
+    page_cursors = st.session_state.page_cursors
+    page_number = len(page_cursors)
+    page_count = max(1, -(-total_count // page_size))
     
-    result = session.sql(query).collect()
+    df = fetch_table_info_page(session, where_clause, params, page_cursors[-1], page_size)
     
-    if result:
-        # DataFrameに変換
-        df = pd.DataFrame([row.as_dict() for row in result])
+    if not df.empty:
+        pending = st.session_state.pending_changes
         
         st.markdown("**📋 TABLE_INFO 編集**")
-        st.caption(f"表示件数: {len(df)} 件")
+        first_row = (page_number - 1) * page_size + 1
+        st.caption(
+            f"全 {total_count} 件中 {first_row}〜{first_row + len(df) - 1} 件を表示"
+            f"（{page_number} / {page_count} ページ）"
+        )
         
         # データエディタで表示・編集
         edited_df = st.data_editor(
-            df,
+            apply_pending_to_page(df, pending),
             use_container_width=True,
             hide_index=True,
             disabled=[
@@ -105,6 +108,7 @@ try:
                 "CLASSIFICATION",
                 "COLUMN_NUM",
                 "RECORD_NUM",
+                "BYTES",
                 "CREATION_DATE",
                 "UPDATE_DATE",
                 "TABLE_COMMENT",
@@ -118,6 +122,7 @@ try:
                 "CLASSIFICATION": st.column_config.TextColumn("分類", width="small"),
                 "COLUMN_NUM": st.column_config.NumberColumn("カラム数", width="small"),
                 "RECORD_NUM": st.column_config.NumberColumn("レコード数", width="small"),
+                "BYTES": st.column_config.NumberColumn("サイズ(バイト)", width="small"),
                 "CREATION_DATE": st.column_config.DatetimeColumn("作成日", width="medium"),
                 "UPDATE_DATE": st.column_config.DatetimeColumn("更新日", width="medium"),
                 "OWNER": st.column_config.TextColumn("オーナー", width="medium"),
@@ -130,10 +135,32 @@ try:
                 "APPLICATION_PROJECT": st.column_config.TextColumn("関連プロジェクト", width="medium"),
                 "COMMENT": st.column_config.TextColumn("備考", width="large")
             },
-            key=f"table_info_editor_{st.session_state.refresh}",
+            key=f"table_info_editor_{st.session_state.refresh}_{page_number}_{page_size}",
             height=600
         )
         
+        # このページの編集内容を未保存の変更に反映する
+        merge_pending_changes(pending, df, diff_table_info(df, edited_df))
+        
+        # ページ移動
+        col_prev, col_page, col_next = st.columns([1, 4, 1])
+        
+        with col_prev:
+            if st.button("◀ 前へ", disabled=page_number <= 1, use_container_width=True):
+                page_cursors.pop()
+                st.rerun()
+        
+        with col_page:
+            if pending:
+                st.caption(f"✏️ 未保存の変更: {len(pending)} 件（ページを移動しても保持されます）")
+        
+        with col_next:
+            last_page = len(df) < page_size or first_row + len(df) - 1 >= total_count
+            if st.button("次へ ▶", disabled=last_page, use_container_width=True):
+                last_row = df.iloc[-1]
+                page_cursors.append((last_row["LOCATION"], last_row["TABLE_NAME"]))
+                st.rerun()
+        
         st.markdown("---")
         
         # 保存ボタン
@@ -142,70 +169,26 @@ try:
         with col1:
             if st.button("💾 変更を保存", type="primary", use_container_width=True):
                 try:
-                    success_count = 0
-                    error_count = 0
+                    # 全ページの変更行を1トランザクションのMERGEでまとめて反映
+                    changes = pending_to_changes(pending)
                     
-                    # 変更があった行を更新
-                    for idx in range(len(edited_df)):
-                        # 編集可能カラムが変更されたかチェック
-                        if (df.loc[idx, 'OWNER'] != edited_df.loc[idx, 'OWNER'] or
-                            df.loc[idx, 'SUB_OWNER'] != edited_df.loc[idx, 'SUB_OWNER'] or
-                            df.loc[idx, 'PUBLISH'] != edited_df.loc[idx, 'PUBLISH'] or
-                            df.loc[idx, 'SCOPE'] != edited_df.loc[idx, 'SCOPE'] or
-                            df.loc[idx, 'APPLICATION_PROJECT'] != edited_df.loc[idx, 'APPLICATION_PROJECT'] or
-                            df.loc[idx, 'COMMENT'] != edited_df.loc[idx, 'COMMENT']):
-                            
-                            try:
-                                table_name = edited_df.loc[idx, 'TABLE_NAME']
-                                location = edited_df.loc[idx, 'LOCATION']
-                                
-                                # NULL値を適切に処理
-                                owner = edited_df.loc[idx, 'OWNER'] if pd.notna(edited_df.loc[idx, 'OWNER']) else None
-                                sub_owner = edited_df.loc[idx, 'SUB_OWNER'] if pd.notna(edited_df.loc[idx, 'SUB_OWNER']) else None
-                                publish = edited_df.loc[idx, 'PUBLISH'] if pd.notna(edited_df.loc[idx, 'PUBLISH']) else None
-                                scope = edited_df.loc[idx, 'SCOPE'] if pd.notna(edited_df.loc[idx, 'SCOPE']) else None
-                                app_project = edited_df.loc[idx, 'APPLICATION_PROJECT'] if pd.notna(edited_df.loc[idx, 'APPLICATION_PROJECT']) else None
-                                comment = edited_df.loc[idx, 'COMMENT'] if pd.notna(edited_df.loc[idx, 'COMMENT']) else None
-                                
-                                # エスケープ処理
-                                owner_sql = f"'{owner.replace(chr(39), chr(39)+chr(39))}'" if owner else "NULL"
-                                sub_owner_sql = f"'{sub_owner.replace(chr(39), chr(39)+chr(39))}'" if sub_owner else "NULL"
-                                publish_sql = f"'{publish.replace(chr(39), chr(39)+chr(39))}'" if publish else "NULL"
-                                scope_sql = f"'{scope.replace(chr(39), chr(39)+chr(39))}'" if scope else "NULL"
-                                app_project_sql = f"'{app_project.replace(chr(39), chr(39)+chr(39))}'" if app_project else "NULL"
-                                comment_sql = f"'{comment.replace(chr(39), chr(39)+chr(39))}'" if comment else "NULL"
-                                
-                                update_query = f"""
-                                    UPDATE DIESELPJ_GEN.DATA_CATALOG.TABLE_INFO
-                                    SET 
-                                        OWNER = {owner_sql},
-                                        SUB_OWNER = {sub_owner_sql},
-                                        PUBLISH = {publish_sql},
-                                        SCOPE = {scope_sql},
-                                        APPLICATION_PROJECT = {app_project_sql},
-                                        COMMENT = {comment_sql}
-                                    WHERE TABLE_NAME = '{table_name}'
-                                      AND LOCATION = '{location}'
-                                """
-                                
-                                session.sql(update_query).collect()
-                                success_count += 1
-                            except Exception as e:
-                                error_count += 1
-                                st.error(f"行 {idx+1} の更新エラー: {str(e)}")
-                    
-                    if success_count > 0:
-                        st.success(f"✅ {success_count}件を更新しました！")
+                    if changes.empty:
+                        st.info("変更がありませんでした")
+                    else:
+                        summary = apply_table_info_changes(session, changes)
+                        st.success(f"✅ {summary['updated']}件を更新しました！（変更行 {summary['changed']}件）")
+                        pending.clear()
+                        invalidate_snapshot()
                         st.session_state.refresh += 1
                         st.rerun()
-                    elif error_count == 0:
-                        st.info("変更がありませんでした")
                     
                 except Exception as e:
                     st.error(f"❌ 保存エラー: {str(e)}")
         
         with col2:
             if st.button("🔄 最新データを再読込", use_container_width=True):
+                pending.clear()
+                invalidate_snapshot()
                 st.session_state.refresh += 1
                 st.rerun()
         
@@ -220,5 +203,9 @@ try:
 except Exception as e:
     st.error(f"❌ データ取得エラー: {str(e)}")
 
+# クエリ計測（URLに ?debug=1 を付けるか、環境変数 CATALOG_QUERY_DEBUG=1 のときに表示）
+render_debug_panel(session)
+session.recorder.finish()
+
 st.markdown("---")
 st.caption("Powered by Powertrain DX Team © DENSO Corporation")
@@ -1,9 +1,15 @@
 import streamlit as st
 from snowflake.snowpark.context import get_active_session
 import pandas as pd
+from catalog import get_snapshot, invalidate_snapshot, snapshot_stats, format_bytes, format_stats
+from column_metadata import get_columns, invalidate_columns
+from data_preview import PREVIEW_ROWS, get_preview, invalidate_preview
+from session_context import connection_text, get_session_context, invalidate_session_context, odbc_connection_string, power_query_m
+from table_export import render_export_panel
+from query_log import instrument_session, render_debug_panel
 
-# Snowflakeセッションを取得
-session = get_active_session()
+# Snowflakeセッションを取得（クエリごとに所要時間・件数を記録する）
+session = instrument_session(get_active_session(), page="TABLE_INFO表示")
 
 st.set_page_config(layout="wide")
 st.title("テーブル情報表示")
@@ -16,83 +22,76 @@ if 'refresh' not in st.session_state:
 left_col, right_col = st.columns([1, 3])
 
 # ===== 左側: コントロールパネル =====
+session.set_section("コントロールパネル")
 with left_col:
-    # TABLE_INFOから一意のデータベース・スキーマ・テーブルを取得
+    # TABLE_INFOのスナップショットからデータベース・スキーマ・テーブルを取得
     try:
-        # LOCATIONを分解してデータベースとスキーマのリストを作成
-        locations = session.sql("""
-            SELECT DISTINCT LOCATION
-            FROM DIESELPJ_GEN.DATA_CATALOG.TABLE_INFO
-            ORDER BY LOCATION
-        """).collect()
+        snapshot = get_snapshot(session)
         
         # データベースのリストを作成
-        databases = sorted(list(set([row['LOCATION'].split('.')[0] for row in locations])))
+        databases = snapshot.databases()
         
     except Exception as e:
         st.error(f"データ取得エラー: {str(e)}")
+        snapshot = None
         databases = []
     
     # データベース選択
-    selected_db = st.selectbox("データベース", databases, key="db_select") if databases else None
+    selected_db = st.selectbox(
+        "データベース",
+        databases,
+        format_func=lambda db: snapshot.label(db),
+        key="db_select"
+    ) if databases else None
     
     # スキーマ選択
     selected_schema = None
     if selected_db:
-        try:
-            schemas_query = f"""
-                SELECT DISTINCT SUBSTRING(LOCATION, LENGTH('{selected_db}') + 2) AS SCHEMA_NAME
-                FROM DIESELPJ_GEN.DATA_CATALOG.TABLE_INFO
-                WHERE LOCATION LIKE '{selected_db}.%'
-                ORDER BY SCHEMA_NAME
-            """
-            schemas = session.sql(schemas_query).collect()
-            schema_list = [row['SCHEMA_NAME'] for row in schemas]
-            selected_schema = st.selectbox("スキーマ", schema_list, key="schema_select") if schema_list else None
-        except Exception as e:
-            st.error(f"スキーマ取得エラー: {str(e)}")
+        schema_list = snapshot.schemas_in(selected_db)
+        selected_schema = st.selectbox(
+            "スキーマ",
+            schema_list,
+            format_func=lambda schema: snapshot.label(selected_db, schema),
+            key="schema_select"
+        ) if schema_list else None
+        
+        # スキーマ内のコメント充足状況
+        schema_node = snapshot.node(selected_db, selected_schema) if selected_schema else None
+        if schema_node:
+            st.caption(
+                f"テーブルコメント {schema_node.table_comment_rate * 100:.0f}% / "
+                f"カラムコメント完了 {schema_node.column_comment_rate * 100:.0f}%"
+            )
     
     # テーブル選択
     selected_table = None
     if selected_db and selected_schema:
-        try:
-            location = f"{selected_db}.{selected_schema}"
-            tables_query = f"""
-                SELECT DISTINCT TABLE_NAME
-                FROM DIESELPJ_GEN.DATA_CATALOG.TABLE_INFO
-                WHERE LOCATION = '{location}'
-                ORDER BY TABLE_NAME
-            """
-            tables = session.sql(tables_query).collect()
-            table_list = [row['TABLE_NAME'] for row in tables]
-            selected_table = st.selectbox("テーブル", table_list, key="table_select") if table_list else None
-        except Exception as e:
-            st.error(f"テーブル取得エラー: {str(e)}")
+        table_list = snapshot.tables_in(f"{selected_db}.{selected_schema}")
+        selected_table = st.selectbox("テーブル", table_list, key="table_select") if table_list else None
     
     # 更新ボタン
     if st.button("🔄 更新", use_container_width=True):
+        invalidate_snapshot()
+        invalidate_columns()
+        invalidate_preview()
+        invalidate_session_context(session)
         st.session_state.refresh += 1
         st.rerun()
+    
+    st.caption(format_stats(snapshot_stats()))
 
 # ===== 右側: テーブル情報表示 =====
+session.set_section("テーブル情報")
 with right_col:
     if selected_db and selected_schema and selected_table:
         st.subheader(f"{selected_table}")
         
         try:
-            # TABLE_INFOからテーブル情報を取得
+            # スナップショットからテーブル情報を取得
             location = f"{selected_db}.{selected_schema}"
-            table_info_query = f"""
-                SELECT *
-                FROM DIESELPJ_GEN.DATA_CATALOG.TABLE_INFO
-                WHERE LOCATION = '{location}'
-                  AND TABLE_NAME = '{selected_table}'
-            """
-            table_info = session.sql(table_info_query).collect()
+            info = snapshot.get(location, selected_table)
             
-            if table_info:
-                info = table_info[0]
-                
+            if info:
                 # テーブル概要セクション
                 st.markdown("---")
                 st.markdown("**📊 テーブル概要**")
@@ -103,7 +102,8 @@ with right_col:
                 with col1:
                     st.markdown(f"**ロケーション:** {info['LOCATION']}")
                     st.markdown(f"**カラム数:** {info['COLUMN_NUM']}")
-                    st.markdown(f"**レコード数:** {info['RECORD_NUM'] if info['RECORD_NUM'] else 'N/A'}")
+                    st.markdown(f"**レコード数:** {info['RECORD_NUM'] if info['RECORD_NUM'] is not None else 'N/A'}")
+                    st.markdown(f"**サイズ:** {format_bytes(info['BYTES'])}")
                     st.markdown(f"**作成日:** {info['CREATION_DATE']}")
                 
                 with col2:
@@ -134,15 +134,8 @@ with right_col:
                 st.markdown("---")
                 with st.expander("📋 カラムコメント", expanded=False):
                     try:
-                        # INFORMATION_SCHEMAからカラム情報を取得
-                        columns_query = f"""
-                            SELECT COLUMN_NAME, DATA_TYPE, COMMENT
-                            FROM "{selected_db}".INFORMATION_SCHEMA.COLUMNS
-                            WHERE TABLE_SCHEMA = '{selected_schema}'
-                              AND TABLE_NAME = '{selected_table}'
-                            ORDER BY ORDINAL_POSITION
-                        """
-                        columns_info = session.sql(columns_query).collect()
+                        # カラム情報はスキーマ単位で先読みしたキャッシュから取得
+                        columns_info = get_columns(session, selected_db, selected_schema, selected_table)
                         
                         if columns_info:
                             # データフレームで表示
@@ -173,22 +166,37 @@ with right_col:
                 
                 # データプレビュー（プルダウン）
                 st.markdown("---")
-                with st.expander("📊 データを表示 (LIMIT 100)", expanded=False):
+                with st.expander(f"📊 データを表示 (LIMIT {PREVIEW_ROWS})", expanded=False):
+                    # エキスパンダーの中身は閉じていても毎回実行されるため、ボタンを押したときだけ取得する
+                    preview_key = f"{location}.{selected_table}"
                     try:
-                        # テーブルデータを取得
-                        data_query = f"""
-                            SELECT *
-                            FROM "{selected_db}"."{selected_schema}"."{selected_table}"
-                            LIMIT 100
-                        """
-                        
-                        with st.spinner("データ取得中..."):
-                            data_result = session.sql(data_query).collect()
+                        preview_column_names = [
+                            column['COLUMN_NAME']
+                            for column in get_columns(session, selected_db, selected_schema, selected_table)
+                        ]
+                    except Exception:
+                        preview_column_names = []
+                    
+                    preview_columns = st.multiselect(
+                        "表示するカラム（未選択の場合は全カラム）",
+                        preview_column_names,
+                        key=f"preview_columns_{preview_key}"
+                    )
+                    
+                    if st.button("📊 データを取得", key=f"preview_btn_{preview_key}"):
+                        st.session_state.preview_requested = preview_key
+                    
+                    if st.session_state.get('preview_requested') == preview_key:
+                        try:
+                            # テーブルの更新日時ごとにキャッシュされる（Arrow経由でDataFrameに変換）
+                            with st.spinner("データ取得中..."):
+                                data_df = get_preview(
+                                    session, selected_db, selected_schema, selected_table,
+                                    update_date=info['UPDATE_DATE'],
+                                    columns=preview_columns
+                                )
                             
-                            if data_result:
-                                # DataFrameに変換
-                                data_df = pd.DataFrame([row.as_dict() for row in data_result])
-                                
+                            if not data_df.empty:
                                 # データ情報を表示
                                 st.caption(f"取得件数: {len(data_df)} 件 / カラム数: {len(data_df.columns)} 列")
                                 
@@ -210,59 +218,63 @@ with right_col:
                                 )
                             else:
                                 st.caption("データがありません")
-                    except Exception as e:
-                        st.error(f"データ取得エラー: {str(e)}")
+                        except Exception as e:
+                            st.error(f"データ取得エラー: {str(e)}")
+                
+                # エクスポート（プルダウン）: バッチごとにファイルへ書き出す
+                st.markdown("---")
+                with st.expander("📤 エクスポート (CSV / Parquet)", expanded=False):
+                    render_export_panel(
+                        session, selected_db, selected_schema, selected_table,
+                        preview_column_names, info['RECORD_NUM']
+                    )
                 
                 # Power BI接続情報
                 st.markdown("---")
                 st.markdown("**📊 Power BI接続**")
                 
-                # 接続情報を取得（実際の環境に合わせて調整が必要）
                 try:
-                    # Snowflakeアカウント情報を取得
-                    account_info = session.sql("SELECT CURRENT_ACCOUNT() AS ACCOUNT, CURRENT_REGION() AS REGION").collect()
-                    if account_info:
-                        account = account_info[0]['ACCOUNT']
-                        region = account_info[0]['REGION']
-                        
-                        # Power BI接続用の情報
-                        server_name = f"{account}.{region}.snowflakecomputing.com"
-                        database_name = selected_db
-                        warehouse = session.sql("SELECT CURRENT_WAREHOUSE() AS WH").collect()[0]['WH']
+                    # アカウント・リージョン・ウェアハウスはセッション中変わらないため1回だけ取得する
+                    context = get_session_context(session)
+                    
+                    col_btn1, col_btn2 = st.columns(2)
+                    
+                    with col_btn1:
+                        connection_tab, odbc_tab, m_tab = st.tabs(["接続情報", "ODBC", "Power Query (M)"])
                         
-                        col_btn1, col_btn2 = st.columns(2)
-                        
-                        with col_btn1:
+                        with connection_tab:
                             # 接続文字列をテキストエリアに表示
-                            connection_info = f"""サーバー: {server_name}
-データベース: {database_name}
-スキーマ: {selected_schema}
-テーブル: {selected_table}
-ウェアハウス: {warehouse}"""
-                            
                             st.text_area(
                                 "接続情報（Power BIで使用）",
-                                value=connection_info,
+                                value=connection_text(context, selected_db, selected_schema, selected_table),
                                 height=150,
                                 key="powerbi_connection_info"
                             )
                         
-                        with col_btn2:
-                            st.markdown("**Power BI接続手順:**")
-                            st.info("⚠️ 事前にODBC設定が必要。[リンクをご参照ください](https://globaldenso.sharepoint.com/sites/jp102749/SitePages/Alluser/snowflake%E3%81%AE%E8%AA%8D%E8%A8%BC%E6%96%B9%E5%BC%8F.aspx)")
-                            st.markdown("""                                        
+                        with odbc_tab:
+                            st.code(odbc_connection_string(context, selected_db, selected_schema), language=None)
+                            st.caption("↑ ODBCデータソース（接続文字列）に使用")
+                        
+                        with m_tab:
+                            st.code(power_query_m(context, selected_db, selected_schema, selected_table), language=None)
+                            st.caption("↑ Power BI の「空のクエリ」→「詳細エディター」に貼り付け")
+                    
+                    with col_btn2:
+                        st.markdown("**Power BI接続手順:**")
+                        st.info("⚠️ 事前にODBC設定が必要。[リンクをご参照ください](https://globaldenso.sharepoint.com/sites/jp102749/SitePages/Alluser/snowflake%E3%81%AE%E8%AA%8D%E8%A8%BC%E6%96%B9%E5%BC%8F.aspx)")
+                        st.markdown("""                                        
 1. Power BI Desktopを起動
 2. 「データを取得」→「その他」
 3. 「Snowflake」を選択
 4. サーバー名とウェアハウスを入力
 5. データベースとスキーマを選択
 6. 対象テーブルを選択
-                            """)
+                        """)
                             
-                            # テーブルの完全パスをコピー用に表示
-                            full_table_path = f"{selected_db}.{selected_schema}.{selected_table}"
-                            st.code(full_table_path, language=None)
-                            st.caption("↑ このテーブルパスをコピーして使用")
+                        # テーブルの完全パスをコピー用に表示
+                        full_table_path = f"{selected_db}.{selected_schema}.{selected_table}"
+                        st.code(full_table_path, language=None)
+                        st.caption("↑ このテーブルパスをコピーして使用")
                 
                 except Exception as e:
                     st.error(f"接続情報取得エラー: {str(e)}")
@@ -282,5 +294,9 @@ with right_col:
     else:
         st.info("👈 左側からテーブルを選択してください")
 
+# クエリ計測（URLに ?debug=1 を付けるか、環境変数 CATALOG_QUERY_DEBUG=1 のときに表示）
+render_debug_panel(session)
+session.recorder.finish()
+
 st.markdown("---")
 st.caption("Powered by Powertrain DX Team © DENSO Corporation")
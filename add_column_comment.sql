@@ -37,24 +37,40 @@ $$
     var success_count = 0;
     var error_count = 0;
     
+    // Step 1': サンプルデータを1回のスキャンで全カラム分取得
+    // （カラムごとに SELECT TOP 100 を発行しない）
+    var MAX_SAMPLES = 20;       // カラムごとの異なり値サンプル数
+    var MAX_VALUE_CHARS = 100;  // 1値あたりの最大文字数
+    var sample_sql = `SELECT TOP 100 * FROM ${catalog_name}.${schema_name}.${table_name}`;
+    var sample_stmt = snowflake.createStatement({sqlText: sample_sql});
+    var sample_result = sample_stmt.execute();
+    var sample_column_count = sample_stmt.getColumnCount();
+    var samples_by_column = {};
+    for (var c = 1; c <= sample_column_count; c++) {
+        samples_by_column[sample_stmt.getColumnName(c)] = [];
+    }
+    while (sample_result.next()) {
+        for (var c = 1; c <= sample_column_count; c++) {
+            var samples = samples_by_column[sample_stmt.getColumnName(c)];
+            var val = sample_result.getColumnValue(c);
+            if (val === null || samples.length >= MAX_SAMPLES) {
+                continue;
+            }
+            val = val.toString().substring(0, MAX_VALUE_CHARS);
+            if (samples.indexOf(val) < 0) {
+                samples.push(val);
+            }
+        }
+    }
+    
     // Step 2: 各カラムに対してコメントを生成・追加
     while (columns.next()) {
         var column_name = columns.getColumnValue(1);
         var data_type = columns.getColumnValue(2);
         
         try {
-            // サンプルデータを取得
-            var sample_sql = `SELECT TOP 100 ${column_name} FROM ${catalog_name}.${schema_name}.${table_name}`;
-            var sample_stmt = snowflake.createStatement({sqlText: sample_sql});
-            var sample_result = sample_stmt.execute();
-            var samples = [];
-            while (sample_result.next()) {
-                var val = sample_result.getColumnValue(1);
-                if (val !== null) {
-                    samples.push(val);
-                }
-            }
-            var sample_data = samples.join(', ');
+            // 取得済みのサンプルデータを使用
+            var sample_data = (samples_by_column[column_name] || []).join(', ');
             
             // Cortex AIでコメントを生成（テーブルとサンプルデータを参照）
             var generate_sql = `
@@ -0,0 +1,364 @@
+# ###
+# Streamlitアプリの再実行ベンチマーク（AppTest + DuckDB の合成TABLE_INFO）
+#
+# 4つのアプリを Streamlit の AppTest でヘッドレス実行し、カタログの規模
+# （既定: 1,000 / 10,000 / 100,000 テーブル）ごとに、操作単位で
+# - 発行クエリ数（FakeSession に届いたクエリ数。st.rerun() による再実行分を含む）
+# - 所要時間
+# - ピークメモリ（tracemalloc。計測中は処理が遅くなるため --no-memory で無効にできる）
+# を計測してJSONレポートに書き出す。
+# テーブル検索の search は検索インデックスを作る初回（cold）、search_warm は作成済みの
+# インデックスに別のキーワードで問い合わせる2回目（warm）の検索。
+#
+# セッションは fake_session.FakeSession で、TABLE_INFO へのクエリは DuckDB 上の合成データで実行し、
+# SHOW / INFORMATION_SCHEMA / データプレビューなどはこのスクリプトの応答で代替する。
+# アプリはimport時に get_active_session() を呼ぶため、実行前に patch_active_session() で差し替える。
+#
+# 実行例:
+#   python benchmarks/app_benchmark.py --sizes 1000 10000 100000 --output app_benchmark_report.json
+# ###
+
+import argparse
+import json
+import os
+import platform
+import re
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import duckdb
+import streamlit
+from streamlit import config
+from streamlit.logger import set_log_level
+from streamlit.testing.v1 import AppTest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from catalog import TABLE_INFO, invalidate_snapshot  # noqa: E402
+from column_metadata import invalidate_columns  # noqa: E402
+from data_preview import invalidate_preview  # noqa: E402
+from fake_session import FakeSession, duckdb_handler, patch_active_session  # noqa: E402
+from session_context import invalidate_session_context  # noqa: E402
+from table_metadata import invalidate_table_metadata  # noqa: E402
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+DATABASES = 8
+SCHEMAS = 25
+
+# 合成データのコメントに使う単語（キーワード検索の対象）
+WORDS = ["売上", "在庫", "生産", "品質", "設備", "人事", "購買", "物流"]
+
+SEARCH_KEYWORD = "売上"
+
+# 2回目（インデックス作成済み）の検索語。結果が1回目と同じにならないよう別の単語にする
+SEARCH_WARM_KEYWORD = "在庫"
+
+# TABLE_INFO編集の検索語（選択したロケーション内でも一致する行が残るもの）
+EDIT_SEARCH_TEXT = "00"
+
+# プレビューで返す行数の上限
+PREVIEW_MAX_ROWS = 1000
+
+
+def create_table_info(connection, tables):
+    """合成TABLE_INFO（DB_0〜 / SCHEMA_0〜 / TABLE_0〜）を作成する"""
+    catalog, schema, _ = TABLE_INFO.split(".")
+    connection.execute(f"ATTACH ':memory:' AS {catalog}")
+    connection.execute(f"CREATE SCHEMA {catalog}.{schema}")
+    words = ", ".join(f"'{word}'" for word in WORDS)
+    connection.execute(f"""
+        CREATE TABLE {TABLE_INFO} AS
+        SELECT
+            'TABLE_' || i AS TABLE_NAME,
+            'DB_' || (i % {DATABASES}) || '.SCHEMA_' || (i % {SCHEMAS}) AS LOCATION,
+            'BENCH' AS ACCOUNT,
+            CASE WHEN i % 5 = 0 THEN 'VIEW' ELSE 'BASE TABLE' END AS CLASSIFICATION,
+            5 + i % 40 AS COLUMN_NUM,
+            (i * 7919) % 1000000 AS RECORD_NUM,
+            (i * 7919) % 1000000 * 128 AS BYTES,
+            TIMESTAMP '2024-01-01' + INTERVAL (i % 1000) MINUTE AS CREATION_DATE,
+            TIMESTAMP '2025-01-01' + INTERVAL (i % 5000) MINUTE AS UPDATE_DATE,
+            CASE WHEN i % 4 = 0 THEN NULL ELSE 'owner' || (i % 30) || '@example.com' END AS OWNER,
+            NULL::VARCHAR AS SUB_OWNER,
+            CASE WHEN i % 3 = 0 THEN NULL
+                 ELSE [{words}][1 + i % {len(WORDS)}] || 'データ ' || i END AS TABLE_COMMENT,
+            '[{{"column": "COL_1", "comment": "' || [{words}][1 + (i // 7) % {len(WORDS)}] || 'コード"}}, '
+                || '{{"column": "COL_2", "comment": "登録日"}}]' AS COLUMN_COMMENT,
+            CASE WHEN i % 3 = 0 THEN 0 ELSE 1 END AS COLUMN_COMMENT_FLAG,
+            CASE WHEN i % 2 = 0 THEN '公開' ELSE '非公開' END AS PUBLISH,
+            NULL::VARCHAR AS SCOPE,
+            NULL::VARCHAR AS APPLICATION_PROJECT,
+            NULL::VARCHAR AS COMMENT,
+            NULL::TIMESTAMP AS DELETED_DATE
+        FROM range({int(tables)}) r(i)
+    """)
+
+
+def _unquote(name):
+    return name.replace('""', '"')
+
+
+def create_session(connection):
+    """TABLE_INFO は DuckDB で、それ以外のメタデータは TABLE_INFO から組み立てて応答する FakeSession"""
+    handler = duckdb_handler(connection)
+
+    def show_databases(query, params):
+        return [{'name': row['NAME'], 'kind': "STANDARD"} for row in handler(f"""
+            SELECT DISTINCT SPLIT_PART(LOCATION, '.', 1) AS NAME FROM {TABLE_INFO} ORDER BY NAME
+        """, [])]
+
+    def show_schemas(query, params):
+        database = _unquote(re.search(r'IN DATABASE "((?:[^"]|"")+)"', query).group(1))
+        return [{'name': row['NAME']} for row in handler(f"""
+            SELECT DISTINCT SPLIT_PART(LOCATION, '.', 2) AS NAME FROM {TABLE_INFO}
+            WHERE SPLIT_PART(LOCATION, '.', 1) = ? ORDER BY NAME
+        """, [database])]
+
+    def show_tables(query, params):
+        database, schema = re.search(r'IN "((?:[^"]|"")+)"\."((?:[^"]|"")+)"', query).groups()
+        return [{'name': row['TABLE_NAME']} for row in handler(f"""
+            SELECT TABLE_NAME FROM {TABLE_INFO} WHERE LOCATION = ? ORDER BY TABLE_NAME
+        """, [f"{_unquote(database)}.{_unquote(schema)}"])]
+
+    def synthetic_columns(location, table=None):
+        # COLUMN_NUM 個のカラム COL_1〜（型・コメントは位置から決める）
+        table_filter = "AND TABLE_NAME = ?" if table else ""
+        return handler(f"""
+            SELECT
+                TABLE_NAME,
+                TABLE_COMMENT,
+                'COL_' || (i + 1) AS COLUMN_NAME,
+                CASE WHEN i % 3 = 0 THEN 'NUMBER' ELSE 'VARCHAR' END AS DATA_TYPE,
+                CASE WHEN i % 4 = 0 THEN NULL ELSE 'カラム' || (i + 1) END AS COMMENT,
+                i + 1 AS ORDINAL_POSITION
+            FROM (SELECT TABLE_NAME, TABLE_COMMENT, UNNEST(range(COLUMN_NUM)) AS i FROM {TABLE_INFO}
+                  WHERE LOCATION = ? {table_filter})
+            ORDER BY TABLE_NAME, ORDINAL_POSITION
+        """, [location] + ([table] if table else []))
+
+    def information_schema_columns(query, params):
+        database = _unquote(re.search(r'"((?:[^"]|"")+)"\.INFORMATION_SCHEMA\.COLUMNS', query).group(1))
+        return synthetic_columns(f"{database}.{params[0]}", params[1] if len(params) > 1 else None)
+
+    def table_metadata(query, params):
+        # INFORMATION_SCHEMA.TABLES と COLUMNS の結合（table_metadata.table_metadata_sql）
+        database = _unquote(re.search(r'"((?:[^"]|"")+)"\.INFORMATION_SCHEMA\.TABLES', query).group(1))
+        return synthetic_columns(f"{database}.{params[0]}", params[1])
+
+    def table_comment(query, params):
+        # テーブルコメントだけの取得（table_metadata.table_comment_sql）
+        database = _unquote(re.search(r'"((?:[^"]|"")+)"\.INFORMATION_SCHEMA\.TABLES', query).group(1))
+        return handler(f"""
+            SELECT TABLE_COMMENT FROM {TABLE_INFO} WHERE LOCATION = ? AND TABLE_NAME = ?
+        """, [f"{database}.{params[0]}", params[1]])
+
+    def information_schema_tables(query, params):
+        database = re.search(r'"((?:[^"]|"")+)"\.INFORMATION_SCHEMA\.TABLES', query).group(1)
+        schema = re.search(r"TABLE_SCHEMA = '([^']*)'", query).group(1)
+        table = re.search(r"TABLE_NAME = '([^']*)'", query).group(1)
+        return handler(f"""
+            SELECT TABLE_COMMENT AS COMMENT FROM {TABLE_INFO} WHERE LOCATION = ? AND TABLE_NAME = ?
+        """, [f"{_unquote(database)}.{schema}", table])
+
+    def table_data(query, params):
+        # データプレビュー・エクスポート: 選択カラム（または COL_1〜COL_10）の合成行
+        select_list = re.search(r"SELECT\s+(.*?)\s+FROM", query, re.DOTALL).group(1)
+        names = ["COL_" + str(i + 1) for i in range(10)] if select_list.strip() == "*" \
+            else [_unquote(name) for name in re.findall(r'"((?:[^"]|"")+)"', select_list)]
+        limit = re.search(r"LIMIT (\d+)", query)
+        rows = min(int(limit.group(1)) if limit else PREVIEW_MAX_ROWS, PREVIEW_MAX_ROWS)
+        return [{name: f"{name}_{i}" for name in names} for i in range(rows)]
+
+    context = [{'ACCOUNT': "BENCH", 'REGION': "AWS_AP_NORTHEAST_1", 'WAREHOUSE': "BENCH_WH", 'ROLE': "BENCH"}]
+
+    return FakeSession(
+        responses=[
+            (r"CURRENT_ACCOUNT\(\)", context),
+            (r"SNOWFLAKE\.CORTEX\.COMPLETE", [{'RESPONSE': "ベンチマーク用の生成コメント"}]),
+            (r"^\s*SHOW DATABASES", show_databases),
+            (r"^\s*SHOW SCHEMAS", show_schemas),
+            (r"^\s*SHOW TABLES", show_tables),
+            (r"INFORMATION_SCHEMA\.TABLES .*INFORMATION_SCHEMA\.COLUMNS", table_metadata),
+            (r"INFORMATION_SCHEMA\.COLUMNS", information_schema_columns),
+            (r"INFORMATION_SCHEMA\.TABLES\s+WHERE TABLE_SCHEMA = \?", table_comment),
+            (r"INFORMATION_SCHEMA\.TABLES", information_schema_tables),
+            (r"^\s*(ALTER|COMMENT)\s", []),
+            (r'FROM "(?:[^"]|"")+"\."(?:[^"]|"")+"\."(?:[^"]|"")+"', table_data),
+        ],
+        handler=handler,
+    )
+
+
+def reset_caches():
+    """プロセス内キャッシュを破棄する（アプリごとに初回表示から計測する）"""
+    invalidate_snapshot()
+    invalidate_columns()
+    invalidate_preview()
+    invalidate_session_context()
+    invalidate_table_metadata()
+
+
+def _widget(widgets, key=None, label=None, key_prefix=None):
+    for widget in widgets:
+        if (key is not None and widget.key == key) or (label is not None and widget.label == label) \
+                or (key_prefix is not None and (widget.key or "").startswith(key_prefix)):
+            return widget
+    raise LookupError(key or label or key_prefix)
+
+
+def _select_second(at, key):
+    selectbox = _widget(at.selectbox, key=key)
+    selectbox.select_index(min(1, len(selectbox.options) - 1)).run()
+
+
+def _first_page_excluded_key(connection):
+    # 表示中のページに含まれない行（ページ内の行は編集内容との比較で未保存の変更から外れる）
+    row = connection.execute(
+        f"SELECT LOCATION, TABLE_NAME FROM {TABLE_INFO} ORDER BY LOCATION DESC, TABLE_NAME DESC LIMIT 1"
+    ).fetchone()
+    return row[0], row[1]
+
+
+def app_scenarios(connection):
+    """{アプリ: (ファイル名, [(操作名, 操作)])}"""
+
+    def edit_save(at):
+        at.session_state["pending_changes"] = {
+            _first_page_excluded_key(connection): {
+                'OWNER': "bench@example.com", 'SUB_OWNER': None, 'PUBLISH': "公開",
+                'SCOPE': None, 'APPLICATION_PROJECT': None, 'COMMENT': "benchmark",
+            }
+        }
+        _widget(at.button, label="💾 変更を保存").click().run()
+
+    def comment_save(at):
+        # 生成直後は生成コメントの編集欄、それ以外は通常の編集欄から保存する
+        if any((text_area.key or "").startswith("generated_table_comment_") for text_area in at.text_area):
+            _widget(at.text_area, key_prefix="generated_table_comment_").input("benchmark")
+            _widget(at.button, key="save_generated_table_comment").click().run()
+        else:
+            _widget(at.text_area, key_prefix="quick_table_comment_").input("benchmark")
+            _widget(at.button, key="save_table_quick").click().run()
+
+    def search(at, keyword=SEARCH_KEYWORD):
+        _widget(at.text_input, key="keyword_query").input(keyword)
+        _widget(at.button, key="keyword_search_btn").click().run()
+
+    return {
+        "TABLE_INFO表示": ("TABLE_INFO表示streamlit.py", [
+            ("initial", lambda at: at.run()),
+            ("select_db", lambda at: _select_second(at, "db_select")),
+            ("open_detail", lambda at: _select_second(at, "table_select")),
+            ("refresh", lambda at: _widget(at.button, label="🔄 更新").click().run()),
+        ]),
+        "テーブル検索": ("テーブル検索streamlit.py", [
+            ("initial", lambda at: at.run()),
+            ("select_db", lambda at: _select_second(at, "database_filter")),
+            ("search", search),
+            ("search_warm", lambda at: search(at, SEARCH_WARM_KEYWORD)),
+            ("open_detail", lambda at: _widget(at.button, key_prefix="btn_detail_").click().run()),
+        ]),
+        "TABLE_INFO編集": ("TABLE_INFO編集streamlit.py", [
+            ("initial", lambda at: at.run()),
+            ("next_page", lambda at: _widget(at.button, label="次へ ▶").click().run()),
+            ("select_db", lambda at: _select_second(at, "location_filter")),
+            ("search", lambda at: _widget(at.text_input, key="search_text").input(EDIT_SEARCH_TEXT).run()),
+            ("save", edit_save),
+        ]),
+        "コメント生成": ("コメント生成streamlit.py", [
+            ("initial", lambda at: at.run()),
+            ("select_db", lambda at: _select_second(at, "db_select")),
+            ("open_detail", lambda at: _select_second(at, "table_select")),
+            ("generate", lambda at: _widget(at.button, label="テーブルコメント生成").click().run()),
+            ("save", comment_save),
+        ]),
+    }
+
+
+def measure(at, session, action, trace_memory):
+    before = len(session.executed)
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    error = None
+    try:
+        action(at)
+    except Exception as e:
+        # ウィジェットが見つからないなど、操作自体ができなかった場合
+        error = f"{type(e).__name__}: {e}"
+    seconds = time.perf_counter() - started
+    peak = None
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {
+        'queries': len(session.executed) - before,
+        'seconds': round(seconds, 4),
+        'peak_memory_mb': round(peak / 1024 / 1024, 2) if peak is not None else None,
+        'exceptions': ([error] if error else [])
+                      + [str(exception.value) for exception in at.exception]
+                      + [str(message.value) for message in at.error],
+    }
+
+
+def run_size(size, apps, timeout, trace_memory):
+    connection = duckdb.connect()
+    create_table_info(connection, size)
+    results = []
+    for app_name, (file_name, interactions) in app_scenarios(connection).items():
+        if apps and app_name not in apps:
+            continue
+        session = patch_active_session(create_session(connection))
+        reset_caches()
+        at = AppTest.from_file(os.path.abspath(os.path.join(ROOT, file_name)), default_timeout=timeout)
+        for interaction, action in interactions:
+            result = measure(at, session, action, trace_memory)
+            results.append({'size': size, 'app': app_name, 'interaction': interaction, **result})
+            print(
+                f"{size:>7,} {app_name:<14} {interaction:<12} "
+                f"{result['queries']:>4}クエリ {result['seconds']:>8.3f}秒 "
+                f"{result['peak_memory_mb'] if result['peak_memory_mb'] is not None else '-':>8}MB"
+                + (f"  ⚠ {result['exceptions'][0][:80]}" if result['exceptions'] else "")
+            )
+    connection.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streamlitアプリの再実行ベンチマーク（AppTest + DuckDB）")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="TABLE_INFOの行数")
+    parser.add_argument("--apps", nargs="*", default=None, help="対象アプリ（例: TABLE_INFO表示 テーブル検索）")
+    parser.add_argument("--timeout", type=float, default=300, help="1回の実行のタイムアウト（秒）")
+    parser.add_argument("--no-memory", action="store_true", help="ピークメモリを計測しない")
+    parser.add_argument("--output", default="app_benchmark_report.json", help="JSONレポートの出力先")
+    args = parser.parse_args()
+
+    # AppTest 実行時の警告ログ（ScriptRunContext・非推奨引数）を抑える
+    config.set_option("logger.level", "error")
+    set_log_level("error")
+
+    results = []
+    for size in args.sizes:
+        results.extend(run_size(size, args.apps, args.timeout, not args.no_memory))
+
+    report = {
+        'generated_at': datetime.now().isoformat(timespec="seconds"),
+        'python': platform.python_version(),
+        'streamlit': streamlit.__version__,
+        'duckdb': duckdb.__version__,
+        'memory_traced': not args.no_memory,
+        'results': results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"レポート: {args.output}")
+    return 1 if any(result['exceptions'] for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+# ###
+# TABLE_INFO 更新SQLのベンチマーク（DuckDB をローカルの代替環境として使用）
+#
+# ACCOUNT_USAGE.TABLES / COLUMNS を模した合成メタデータを作り、
+# 従来の相関サブクエリ版とセットベース版の取得元SELECTを実行して、
+# 結果が一致することと実行時間を比較する。
+#
+# 実行例:
+#   python benchmarks/table_info_refresh_benchmark.py --tables 20000 --columns 30
+# ###
+
+import argparse
+import os
+import sys
+import time
+
+import duckdb
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from table_info_refresh import build_params, legacy_source_sql, source_params, source_sql  # noqa: E402
+
+SOURCE = "ACCOUNT_USAGE"
+
+
+def create_metadata(connection, tables, columns_per_table, databases=8, deleted_rate=0.05,
+                    zero_column_every=97):
+    """合成メタデータ（一部は削除済み・一部はコメントなし）を作成する
+
+    zero_column_every 件に1件のテーブルは全カラムを削除済みにする（有効なカラムが0件のテーブル）。
+    """
+    connection.execute(f"CREATE SCHEMA {SOURCE}")
+    connection.execute(f"""
+        CREATE TABLE {SOURCE}.TABLES AS
+        SELECT
+            'DB_' || (i % {databases}) AS TABLE_CATALOG,
+            'SCHEMA_' || (i % 50) AS TABLE_SCHEMA,
+            'TABLE_' || i AS TABLE_NAME,
+            'BASE TABLE' AS TABLE_TYPE,
+            CASE WHEN i % 3 = 0 THEN NULL ELSE 'テーブル ' || i END AS COMMENT,
+            TIMESTAMP '2024-01-01' + INTERVAL (i % 1000) MINUTE AS CREATED,
+            TIMESTAMP '2025-01-01' + INTERVAL (i % 5000) MINUTE AS LAST_ALTERED,
+            CASE WHEN random() < {deleted_rate} THEN TIMESTAMP '2025-06-01' END AS DELETED
+        FROM range({tables}) r(i)
+    """)
+    connection.execute(f"""
+        CREATE TABLE {SOURCE}.COLUMNS AS
+        SELECT
+            t.TABLE_CATALOG,
+            t.TABLE_SCHEMA,
+            t.TABLE_NAME,
+            'COL_' || j AS COLUMN_NAME,
+            j + 1 AS ORDINAL_POSITION,
+            CASE
+                WHEN j % 7 = 0 THEN NULL
+                WHEN j % 11 = 0 THEN '  '
+                ELSE 'カラム"' || j || '"の説明'
+            END AS COMMENT,
+            CASE
+                WHEN CAST(SUBSTR(t.TABLE_NAME, 7) AS INTEGER) % {zero_column_every} = 0 THEN TIMESTAMP '2025-06-01'
+                WHEN random() < {deleted_rate} AND j > 0 THEN TIMESTAMP '2025-06-01'
+            END AS DELETED
+        FROM {SOURCE}.TABLES t, range({columns_per_table}) c(j)
+    """)
+
+
+def run(connection, query, params, repeat):
+    timings = []
+    rows = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = connection.execute(query, params).fetchall()
+        timings.append(time.perf_counter() - started)
+    return sorted(rows, key=lambda row: (row[1], row[0])), min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TABLE_INFO 更新SQLの比較（相関サブクエリ版 vs セットベース版）")
+    parser.add_argument("--tables", type=int, default=20000, help="テーブル数")
+    parser.add_argument("--columns", type=int, default=30, help="1テーブルあたりのカラム数")
+    parser.add_argument("--database", default=None, help="対象データベースを1つに絞る（例: DB_0）")
+    parser.add_argument("--repeat", type=int, default=3, help="計測回数（最小値を採用）")
+    args = parser.parse_args()
+
+    connection = duckdb.connect()
+    create_metadata(connection, args.tables, args.columns)
+
+    legacy_rows, legacy_seconds = run(
+        connection,
+        legacy_source_sql(SOURCE, args.database),
+        build_params(args.database),
+        args.repeat,
+    )
+    set_rows, set_seconds = run(
+        connection,
+        source_sql(SOURCE, args.database, dialect="duckdb"),
+        source_params(args.database),
+        args.repeat,
+    )
+
+    print(f"tables={args.tables} columns/table={args.columns} database={args.database or 'ALL'}")
+    print(f"相関サブクエリ版: {legacy_seconds:.3f}秒 ({len(legacy_rows)}行)")
+    print(f"セットベース版  : {set_seconds:.3f}秒 ({len(set_rows)}行)")
+    print(f"速度比: {legacy_seconds / set_seconds:.1f}倍" if set_seconds else "速度比: -")
+    # 有効なカラムが0件のテーブル: 従来版と同じく COLUMN_NUM = 0・COLUMN_COMMENT = NULL になること
+    zero_column_rows = [row for row in set_rows if row[4] == 0]
+    zero_column_ok = bool(zero_column_rows) and all(row[9] is None for row in zero_column_rows)
+    print(f"カラム0件のテーブル: {len(zero_column_rows)}行 (COLUMN_COMMENT が NULL: {'OK' if zero_column_ok else 'NG'})")
+    print(f"結果一致: {'OK' if legacy_rows == set_rows else 'NG'}")
+    return 0 if legacy_rows == set_rows and zero_column_ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,288 @@
+# ###
+# データカタログ共通モジュール
+#
+# TABLE_INFOを一度だけ読み込んでプロセス内スナップショットとして保持し、
+# 各Streamlitアプリのドロップダウン・詳細表示をメモリから返す。
+#
+# - スナップショットはTASK_UPDATE_TABLE_INFO（毎時0分実行）に合わせて失効する
+# - 編集アプリでUPDATEした後は invalidate_snapshot() で明示的に破棄する
+# - snapshot_stats() でヒット率とスナップショットの経過時間を確認できる
+# - データベース→スキーマ→テーブルの階層（件数・コメント充足率付き）はスナップショットごとに
+#   1回だけ構築し、各アプリのドロップダウンで共有する
+# ###
+
+import threading
+import time
+
+# TABLE_INFOの完全修飾名
+TABLE_INFO = "DIESELPJ_GEN.DATA_CATALOG.TABLE_INFO"
+
+# スナップショットの最大保持時間（秒）
+SNAPSHOT_TTL_SECONDS = 3600
+
+# TASK_UPDATE_TABLE_INFOの実行完了を待つ猶予（秒）
+# 毎時0分 + この秒数を過ぎたら、それ以前に読み込んだスナップショットは失効する
+TASK_GRACE_SECONDS = 300
+
+# スナップショットに読み込むカラム
+TABLE_INFO_COLUMNS = [
+    "TABLE_NAME",
+    "LOCATION",
+    "ACCOUNT",
+    "CLASSIFICATION",
+    "COLUMN_NUM",
+    "RECORD_NUM",
+    "BYTES",
+    "CREATION_DATE",
+    "UPDATE_DATE",
+    "OWNER",
+    "SUB_OWNER",
+    "TABLE_COMMENT",
+    "COLUMN_COMMENT",
+    "COLUMN_COMMENT_FLAG",
+    "PUBLISH",
+    "SCOPE",
+    "APPLICATION_PROJECT",
+    "COMMENT",
+]
+
+
+def next_task_deadline(loaded_at, grace_seconds=TASK_GRACE_SECONDS):
+    """loaded_at 以降で最初にタスク更新が反映される時刻（epoch秒）を返す"""
+    # JSTはUTCとの時差が整数時間なので、epoch秒の3600区切りがそのまま毎時0分になる
+    hour_start = int((loaded_at - grace_seconds) // 3600) * 3600
+    return hour_start + 3600 + grace_seconds
+
+
+class CatalogNode:
+    """データベース・スキーマ・テーブル階層の1ノード（配下のテーブル数とコメント充足状況）"""
+
+    def __init__(self, name, level):
+        self.name = name
+        self.level = level
+        self.children = {}
+        self.child_names = []
+        self.table_count = 0
+        self.column_count = 0
+        self.table_comment_count = 0
+        self.column_comment_complete_count = 0
+
+    def _add(self, row):
+        self.table_count += 1
+        self.column_count += row.get('COLUMN_NUM') or 0
+        if (row.get('TABLE_COMMENT') or "").strip():
+            self.table_comment_count += 1
+        if row.get('COLUMN_COMMENT_FLAG') == 1:
+            self.column_comment_complete_count += 1
+
+    def _finish(self):
+        self.child_names = sorted(self.children)
+        for child in self.children.values():
+            child._finish()
+
+    def child(self, name):
+        return self.children.get(name)
+
+    @property
+    def table_comment_rate(self):
+        return self.table_comment_count / self.table_count if self.table_count else 0.0
+
+    @property
+    def column_comment_rate(self):
+        return self.column_comment_complete_count / self.table_count if self.table_count else 0.0
+
+    def label(self):
+        """ドロップダウン表示用のラベル（例: SALES (120件・コメント 85%)）"""
+        if self.level == "table":
+            return self.name
+        return f"{self.name} ({self.table_count:,}件・コメント {self.table_comment_rate * 100:.0f}%)"
+
+
+def build_catalog_tree(rows):
+    """TABLE_INFOの行から データベース→スキーマ→テーブル の階層を構築してルートを返す"""
+    root = CatalogNode(None, "root")
+    for row in rows:
+        database, _, schema = row['LOCATION'].partition('.')
+        database_node = root.children.get(database)
+        if database_node is None:
+            database_node = root.children[database] = CatalogNode(database, "database")
+        schema_node = database_node.children.get(schema)
+        if schema_node is None:
+            schema_node = database_node.children[schema] = CatalogNode(schema, "schema")
+        table_node = schema_node.children[row['TABLE_NAME']] = CatalogNode(row['TABLE_NAME'], "table")
+        for node in (root, database_node, schema_node, table_node):
+            node._add(row)
+    root._finish()
+    return root
+
+
+class CatalogSnapshot:
+    """ある時点のTABLE_INFO全行（dictのリスト）"""
+
+    def __init__(self, rows, loaded_at, version):
+        self.rows = rows
+        self.loaded_at = loaded_at
+        self.version = version
+        self._by_key = {(row['LOCATION'], row['TABLE_NAME']): row for row in rows}
+        self._tables_by_location = {}
+        for row in rows:
+            self._tables_by_location.setdefault(row['LOCATION'], []).append(row['TABLE_NAME'])
+        for table_names in self._tables_by_location.values():
+            table_names.sort()
+        self.locations = sorted(self._tables_by_location)
+        self.tree = build_catalog_tree(rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def age_seconds(self, now=None):
+        return (now if now is not None else time.time()) - self.loaded_at
+
+    def get(self, location, table_name):
+        """(LOCATION, TABLE_NAME) の行を返す。存在しなければNone"""
+        return self._by_key.get((location, table_name))
+
+    def tables_in(self, location):
+        """LOCATIONに属するテーブル名一覧（ソート済み）"""
+        return list(self._tables_by_location.get(location, []))
+
+    def databases(self):
+        return list(self.tree.child_names)
+
+    def schemas_in(self, database):
+        database_node = self.tree.child(database)
+        return list(database_node.child_names) if database_node else []
+
+    def node(self, database=None, schema=None):
+        """階層のノード（引数なしはルート）。存在しなければNone"""
+        node = self.tree
+        for name in (database, schema):
+            if name is None or node is None:
+                break
+            node = node.child(name)
+        return node
+
+    def label(self, database, schema=None):
+        """ドロップダウン用に件数・コメント充足率を付けた表示名"""
+        node = self.node(database, schema)
+        return node.label() if node else (schema or database)
+
+    def filter(self, database=None, schema=None, table_name=None, limit=None):
+        """DB・スキーマ・テーブル名で絞り込んだ行をTABLE_NAME順で返す"""
+        if database and schema:
+            location = f"{database}.{schema}"
+            rows = [self._by_key[(location, name)] for name in self.tables_in(location)]
+            if table_name:
+                rows = [row for row in rows if row['TABLE_NAME'] == table_name]
+        elif database:
+            prefix = f"{database}."
+            rows = [row for row in self.rows if row['LOCATION'].startswith(prefix)]
+        else:
+            rows = list(self.rows)
+
+        rows.sort(key=lambda row: (row['TABLE_NAME'], row['LOCATION']))
+        return rows[:limit] if limit else rows
+
+
+class CatalogCache:
+    """TTL付きでCatalogSnapshotを保持し、ヒット率を集計する"""
+
+    def __init__(self, ttl_seconds=SNAPSHOT_TTL_SECONDS, grace_seconds=TASK_GRACE_SECONDS, clock=time.time):
+        self.ttl_seconds = ttl_seconds
+        self.grace_seconds = grace_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._expires_at = 0
+        self._version = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _load(self, session):
+        columns = ",\n                ".join(TABLE_INFO_COLUMNS)
+        result = session.sql(f"""
+            SELECT
+                {columns}
+            FROM {TABLE_INFO}
+            WHERE DELETED_DATE IS NULL
+            ORDER BY LOCATION, TABLE_NAME
+        """).collect()
+        return [row.as_dict() for row in result]
+
+    def get(self, session):
+        """有効なスナップショットを返す。失効していれば読み込み直す"""
+        with self._lock:
+            now = self._clock()
+            if self._snapshot is not None and now < self._expires_at:
+                self.hits += 1
+                return self._snapshot
+
+            self.misses += 1
+            rows = self._load(session)
+            self._version += 1
+            self._snapshot = CatalogSnapshot(rows, now, self._version)
+            self._expires_at = min(
+                now + self.ttl_seconds,
+                next_task_deadline(now, self.grace_seconds)
+            )
+            return self._snapshot
+
+    def invalidate(self):
+        """スナップショットを破棄する（TABLE_INFOをUPDATEした後に呼ぶ）"""
+        with self._lock:
+            self._snapshot = None
+            self._expires_at = 0
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            snapshot = self._snapshot
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_rate': self.hits / total if total else 0.0,
+                'age_seconds': snapshot.age_seconds(self._clock()) if snapshot else None,
+                'rows': len(snapshot) if snapshot else 0,
+                'version': snapshot.version if snapshot else None,
+            }
+
+
+# プロセス内で共有するキャッシュ（Streamlitの再実行ではモジュールは再importされない）
+_cache = CatalogCache()
+
+
+def get_snapshot(session):
+    return _cache.get(session)
+
+
+def invalidate_snapshot():
+    _cache.invalidate()
+
+
+def snapshot_stats():
+    return _cache.stats()
+
+
+def format_bytes(num_bytes):
+    """テーブルサイズの表示用文字列（例: 1.5 GB）"""
+    if num_bytes is None:
+        return "N/A"
+    size = float(num_bytes)
+    for unit in ["B", "KB", "MB", "GB", "TB"]:
+        if size < 1024 or unit == "TB":
+            return f"{size:,.0f} {unit}" if unit == "B" else f"{size:,.1f} {unit}"
+        size /= 1024
+
+
+def format_stats(stats):
+    """サイドバー表示用の1行サマリ"""
+    age = stats['age_seconds']
+    age_text = f"{int(age // 60)}分前" if age is not None else "未取得"
+    return (
+        f"カタログ: {stats['rows']:,}件 ({age_text}に取得) / "
+        f"キャッシュヒット率 {stats['hit_rate'] * 100:.0f}% "
+        f"({stats['hits']}/{stats['hits'] + stats['misses']})"
+    )
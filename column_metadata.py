@@ -0,0 +1,176 @@
+# ###
+# カラムメタデータキャッシュ
+#
+# 詳細表示やコメント生成のたびに "<db>".INFORMATION_SCHEMA.COLUMNS を1テーブルずつ
+# 問い合わせる代わりに、スキーマ単位で全カラムを1回のクエリで先読みし、
+# テーブルごとの参照はメモリから返す。
+#
+# - エントリはスキーマ単位でTTL付きで保持する
+# - コメント保存でカラムが変わったテーブルは invalidate_columns() で失効させ、
+#   次回参照時にそのテーブルだけを読み直す（スキーマ全体は読み直さない）
+# - INFORMATION_SCHEMA への問い合わせはモジュール全体のロックの外で行い、結果だけをロック内で登録する。
+#   同じスキーマの読み込みはスキーマごとのロックで1本にまとめ、他のスキーマの参照は待たせない
+# ###
+
+import threading
+import time
+
+# スキーマ単位のエントリの保持時間（秒）
+COLUMN_METADATA_TTL_SECONDS = 600
+
+# 保持するスキーマ数の上限（超えたら古いものから破棄する）
+MAX_SCHEMAS = 50
+
+COLUMN_METADATA_COLUMNS = ["COLUMN_NAME", "DATA_TYPE", "COMMENT", "ORDINAL_POSITION"]
+
+
+class _SchemaEntry:
+    def __init__(self, tables, loaded_at):
+        self.tables = tables
+        self.loaded_at = loaded_at
+        self.stale_tables = set()
+
+
+class ColumnMetadataCache:
+    """(データベース, スキーマ) 単位でカラム情報を先読みして保持する"""
+
+    def __init__(self, ttl_seconds=COLUMN_METADATA_TTL_SECONDS, max_schemas=MAX_SCHEMAS, clock=time.time):
+        self.ttl_seconds = ttl_seconds
+        self.max_schemas = max_schemas
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._schemas = {}
+        # (データベース, スキーマ) -> 読み込み用のロック
+        self._load_locks = {}
+        # invalidate() のたびに進める（読み込み中に失効した結果を登録しないため）
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.schema_loads = 0
+        self.table_loads = 0
+        self.invalidations = 0
+
+    def _query(self, session, database, schema, table=None):
+        table_filter = "AND TABLE_NAME = ?" if table else ""
+        params = [schema, table] if table else [schema]
+        result = session.sql(f"""
+            SELECT TABLE_NAME, {", ".join(COLUMN_METADATA_COLUMNS)}
+            FROM "{database.replace('"', '""')}".INFORMATION_SCHEMA.COLUMNS
+            WHERE TABLE_SCHEMA = ?
+              {table_filter}
+            ORDER BY TABLE_NAME, ORDINAL_POSITION
+        """, params=params).collect()
+
+        tables = {}
+        for row in result:
+            tables.setdefault(row['TABLE_NAME'], []).append(
+                {name: row[name] for name in COLUMN_METADATA_COLUMNS}
+            )
+        return tables
+
+    def _evict(self):
+        while len(self._schemas) > self.max_schemas:
+            oldest = min(self._schemas, key=lambda key: self._schemas[key].loaded_at)
+            del self._schemas[oldest]
+            self._load_locks.pop(oldest, None)
+
+    def _lookup(self, key, table):
+        """キャッシュにあればカラム情報、なければ読み込み方法（"schema" / "table"）を返す（self._lock 内で呼ぶ）"""
+        entry = self._schemas.get(key)
+        if entry is None or self._clock() - entry.loaded_at >= self.ttl_seconds:
+            return None, "schema"
+        if table in entry.stale_tables or table not in entry.tables:
+            return None, "table"
+        return entry.tables.get(table, []), None
+
+    def get_columns(self, session, database, schema, table):
+        """テーブルのカラム情報（ORDINAL_POSITION順のdictのリスト）を返す"""
+        key = (database, schema)
+        with self._lock:
+            columns, load = self._lookup(key, table)
+            if load is None:
+                self.hits += 1
+                return [dict(column) for column in columns]
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        with load_lock:
+            # 待っている間に他のスレッドが読み込んでいれば、それを使う
+            with self._lock:
+                columns, load = self._lookup(key, table)
+                if load is None:
+                    self.hits += 1
+                    return [dict(column) for column in columns]
+                generation = self._generation
+                self.misses += 1
+                if load == "schema":
+                    self.schema_loads += 1
+                else:
+                    self.table_loads += 1
+
+            if load == "schema":
+                # スキーマ全体を1回のクエリで先読みする
+                tables = self._query(session, database, schema)
+                columns = tables.get(table, [])
+            else:
+                # 失効したテーブル・先読み後に作成されたテーブルだけを読み直す
+                columns = self._query(session, database, schema, table).get(table, [])
+
+            with self._lock:
+                if generation == self._generation:
+                    if load == "schema":
+                        self._schemas[key] = _SchemaEntry(tables, self._clock())
+                        self._evict()
+                    elif key in self._schemas:
+                        entry = self._schemas[key]
+                        entry.tables[table] = columns
+                        entry.stale_tables.discard(table)
+            return [dict(column) for column in columns]
+
+    def invalidate(self, database=None, schema=None, table=None):
+        """キャッシュを失効させる
+
+        table を指定した場合はそのテーブルだけ、schema まではスキーマ全体、
+        何も指定しない場合はすべてを失効させる。
+        """
+        with self._lock:
+            self.invalidations += 1
+            self._generation += 1
+            if database is None:
+                self._schemas.clear()
+                return
+            for key in list(self._schemas):
+                if key[0] != database or (schema is not None and key[1] != schema):
+                    continue
+                if table is None:
+                    del self._schemas[key]
+                else:
+                    self._schemas[key].stale_tables.add(table)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'schema_loads': self.schema_loads,
+                'table_loads': self.table_loads,
+                'invalidations': self.invalidations,
+                'schemas': len(self._schemas),
+            }
+
+
+# プロセス内で共有するキャッシュ（Streamlitの再実行ではモジュールは再importされない）
+_cache = ColumnMetadataCache()
+
+
+def get_columns(session, database, schema, table):
+    return _cache.get_columns(session, database, schema, table)
+
+
+def invalidate_columns(database=None, schema=None, table=None):
+    _cache.invalidate(database, schema, table)
+
+
+def column_cache_stats():
+    return _cache.stats()
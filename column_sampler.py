@@ -0,0 +1,187 @@
+# ###
+# コメント生成用のカラムサンプラー
+#
+# カラムごとに SELECT TOP 100 "<col>" を発行する代わりに、サンプル行を1回だけ読み、
+# 全カラムの集計（NULL率・異なり数・数値の最小/最大・異なり値サンプル）をSQL側で
+# まとめて計算する。横に広いテーブルはカラムをチャンクに分けて処理し、メモリを抑える。
+# APPROX_COUNT_DISTINCT などを直接適用できない型（VARIANT・GEOGRAPHY など）は文字列にして集計し、
+# それでもチャンクの集計が失敗した場合は、そのチャンクだけ1カラムずつ集計し直す
+# （失敗したカラムはプロファイルなしとして扱い、テーブル全体は失敗させない）。
+# ###
+
+import json
+
+from sql_utils import quote_identifier, table_path
+
+# サンプルとして読む行数
+SAMPLE_ROWS = 1000
+
+# カラムごとに保持する異なり値の数と、1値あたりの最大文字数
+MAX_DISTINCT_SAMPLES = 20
+MAX_VALUE_CHARS = 100
+
+# 1文で集計するカラム数
+COLUMN_CHUNK_SIZE = 100
+
+NUMERIC_TYPES = {
+    "NUMBER", "DECIMAL", "NUMERIC", "INT", "INTEGER", "BIGINT", "SMALLINT", "TINYINT", "BYTEINT",
+    "FLOAT", "FLOAT4", "FLOAT8", "DOUBLE", "DOUBLE PRECISION", "REAL",
+}
+
+# 文字列に変換してから集計する型（半構造化・地理空間・バイナリ・ベクトル）
+STRING_CAST_TYPES = {
+    "VARIANT", "OBJECT", "ARRAY", "MAP", "GEOGRAPHY", "GEOMETRY", "BINARY", "VARBINARY", "VECTOR",
+}
+
+
+class ColumnProfile:
+    """1カラム分のサンプル値とプロファイル"""
+
+    def __init__(self, column_name, data_type, sampled_rows, non_null_count, distinct_count,
+                 min_value, max_value, samples, error=None):
+        self.column_name = column_name
+        self.data_type = data_type
+        self.sampled_rows = sampled_rows
+        self.non_null_count = non_null_count
+        self.distinct_count = distinct_count
+        self.min_value = min_value
+        self.max_value = max_value
+        self.samples = samples
+        self.error = error
+
+    @property
+    def null_rate(self):
+        if not self.sampled_rows:
+            return None
+        return 1 - self.non_null_count / self.sampled_rows
+
+    def summary(self):
+        """プロンプト用のプロファイル要約"""
+        if self.error:
+            return "不明"
+        if not self.sampled_rows:
+            return "データなし"
+        parts = [
+            f"NULL率 {self.null_rate * 100:.0f}%",
+            f"異なり数 約{self.distinct_count}（{self.sampled_rows}行中）",
+        ]
+        if self.min_value is not None and self.max_value is not None:
+            parts.append(f"範囲 {self.min_value}〜{self.max_value}")
+        return " / ".join(parts)
+
+
+def _base_type(data_type):
+    return (data_type or "").upper().split("(")[0].strip()
+
+
+def is_numeric(data_type):
+    return _base_type(data_type) in NUMERIC_TYPES
+
+
+def _value_expression(column):
+    """異なり数・サンプル値の集計に使う式（集計関数が扱えない型は文字列にする）"""
+    name = quote_identifier(column['COLUMN_NAME'])
+    if _base_type(column['DATA_TYPE']) in STRING_CAST_TYPES:
+        return f"TO_VARCHAR({name})"
+    return name
+
+
+def _profile_chunk_sql(path, columns, sample_rows, max_distinct, max_value_chars, method):
+    select_list = ", ".join(quote_identifier(column['COLUMN_NAME']) for column in columns)
+    if method == "sample":
+        source = f"SELECT {select_list} FROM {path} SAMPLE ROW ({int(sample_rows)} ROWS)"
+    else:
+        source = f"SELECT {select_list} FROM {path} LIMIT {int(sample_rows)}"
+
+    aggregates = ["COUNT(*) AS SAMPLED_ROWS"]
+    for i, column in enumerate(columns):
+        name = quote_identifier(column['COLUMN_NAME'])
+        value = _value_expression(column)
+        aggregates.append(f"COUNT({name}) AS NN_{i}")
+        aggregates.append(f"APPROX_COUNT_DISTINCT({value}) AS ND_{i}")
+        if is_numeric(column['DATA_TYPE']):
+            aggregates.append(f"MIN({name}) AS MIN_{i}")
+            aggregates.append(f"MAX({name}) AS MAX_{i}")
+        aggregates.append(
+            f"ARRAY_SLICE(ARRAY_AGG(DISTINCT LEFT(TO_VARCHAR({name}), {int(max_value_chars)})), 0, {int(max_distinct)}) AS S_{i}"
+        )
+    aggregate_list = ",\n            ".join(aggregates)
+    return f"""
+        WITH SAMPLED AS ({source})
+        SELECT
+            {aggregate_list}
+        FROM SAMPLED
+    """
+
+
+def _parse_array(value):
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return json.loads(value)
+    return list(value)
+
+
+def _profile_chunk(session, path, chunk, sample_rows, max_distinct, max_value_chars, method):
+    row = session.sql(
+        _profile_chunk_sql(path, chunk, sample_rows, max_distinct, max_value_chars, method)
+    ).collect()[0]
+    sampled_rows = row['SAMPLED_ROWS']
+    profiles = {}
+    for i, column in enumerate(chunk):
+        numeric = is_numeric(column['DATA_TYPE'])
+        profiles[column['COLUMN_NAME']] = ColumnProfile(
+            column_name=column['COLUMN_NAME'],
+            data_type=column['DATA_TYPE'],
+            sampled_rows=sampled_rows,
+            non_null_count=row[f'NN_{i}'],
+            distinct_count=row[f'ND_{i}'],
+            min_value=row[f'MIN_{i}'] if numeric else None,
+            max_value=row[f'MAX_{i}'] if numeric else None,
+            samples=[str(value) for value in _parse_array(row[f'S_{i}'])],
+        )
+    return profiles
+
+
+def _failed_profile(column, error):
+    return ColumnProfile(
+        column_name=column['COLUMN_NAME'],
+        data_type=column['DATA_TYPE'],
+        sampled_rows=None,
+        non_null_count=None,
+        distinct_count=None,
+        min_value=None,
+        max_value=None,
+        samples=[],
+        error=str(error),
+    )
+
+
+def profile_columns(session, db, schema, table, columns, sample_rows=SAMPLE_ROWS,
+                    max_distinct=MAX_DISTINCT_SAMPLES, max_value_chars=MAX_VALUE_CHARS,
+                    column_chunk_size=COLUMN_CHUNK_SIZE, method="limit"):
+    """全カラムのサンプルとプロファイルを {COLUMN_NAME: ColumnProfile} で返す
+
+    columns: COLUMN_NAME・DATA_TYPE を持つ行（INFORMATION_SCHEMA.COLUMNS の結果など）
+    method: "limit"（先頭から読む・最速）または "sample"（SAMPLE ROW でランダム抽出）
+    集計できなかったカラムは samples が空で error にエラー内容を持つ ColumnProfile になる。
+    """
+    path = table_path(db, schema, table)
+    profiles = {}
+    for start in range(0, len(columns), column_chunk_size):
+        chunk = columns[start:start + column_chunk_size]
+        try:
+            profiles.update(_profile_chunk(session, path, chunk, sample_rows, max_distinct, max_value_chars, method))
+        except Exception as e:
+            if len(chunk) == 1:
+                profiles[chunk[0]['COLUMN_NAME']] = _failed_profile(chunk[0], e)
+                continue
+            # 1カラムでも集計できない型があるとチャンク全体が失敗するため、1カラムずつ集計し直す
+            for column in chunk:
+                try:
+                    profiles.update(
+                        _profile_chunk(session, path, [column], sample_rows, max_distinct, max_value_chars, method)
+                    )
+                except Exception as column_error:
+                    profiles[column['COLUMN_NAME']] = _failed_profile(column, column_error)
+    return profiles
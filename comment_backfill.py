@@ -0,0 +1,523 @@
+# ###
+# AIコメントの一括バックフィル
+#
+# add_table_comment.sql / add_column_comment.sql は1テーブル固定で、アプリもクリックごとに
+# 1テーブルしか処理できないため、カタログ全体の COLUMN_COMMENT_FLAG を1にするのは手作業だった。ここでは
+# - TABLE_INFO から COLUMN_COMMENT_FLAG = 0 またはテーブルコメントなしのテーブルを対象に選び
+# - テーブルごとにコメントのないカラムだけをサンプリングしてプロンプトを作り、
+#   上限付きの並列数（= Cortex の同時実行数）とトークン予算の範囲で生成し
+# - 生成結果は ALTER せずに COMMENT_BACKFILL_STAGING に保存してレビューを待ち
+# - テーブルごとの処理結果を COMMENT_BACKFILL_STATE に記録する（チェックポイント）
+# 中断しても、次回の実行は STATE に完了が記録されていないテーブルから再開する。
+# レビューで APPROVED にした行は apply_reviewed_comments() で反映する（生成後にコメントが
+# 変わった行は上書きせず CONFLICT にする）。
+# Snowpark の Python プロシージャ（create_comment_backfill.sql）からは run() / apply() を呼び出す。
+# ###
+
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+from catalog import TABLE_INFO
+from column_sampler import profile_columns
+from comment_generation import build_column_prompt, build_table_prompt, generate_column_comments
+from comment_saver import save_column_comments, save_table_comment
+from cortex import DEFAULT_MODEL, complete, estimate_tokens
+from table_metadata import fetch_table_metadata
+
+# チェックポイント（テーブルごとの処理結果）と、レビュー待ちの生成結果（create_comment_backfill.sql で作成）
+BACKFILL_STATE_TABLE = "DIESELPJ_GEN.DATA_CATALOG.COMMENT_BACKFILL_STATE"
+BACKFILL_STAGING_TABLE = "DIESELPJ_GEN.DATA_CATALOG.COMMENT_BACKFILL_STAGING"
+
+# 1回の実行で処理するテーブル数
+MAX_TABLES = 100
+
+# 同時に処理するテーブル数（テーブル内の生成は直列のため、Cortex の同時実行数と同じになる）
+MAX_CONCURRENCY = 4
+
+# 1回の実行で使うトークン数の上限（プロンプトと出力の概算の合計）
+TOKEN_BUDGET = 1_000_000
+
+# 残りの予算がこれを下回ったら新しいテーブルを投入しない（小さいテーブル1つ分の見込み）
+MIN_TABLE_TOKENS = 500
+
+# 出力トークンの見込み（カラムは50文字以内、テーブルは100文字以内で生成させる）
+OUTPUT_TOKENS_PER_COLUMN = 60
+OUTPUT_TOKENS_PER_TABLE = 120
+
+# エラーになったテーブルを再試行する回数
+MAX_ATTEMPTS = 3
+
+# ステージングに1文でINSERTする行数
+STAGING_INSERT_BATCH_SIZE = 200
+
+STAGING_COLUMNS = [
+    "RUN_ID", "LOCATION", "TABLE_NAME", "COLUMN_NAME", "CURRENT_COMMENT", "GENERATED_COMMENT",
+    "MODEL", "ESTIMATED_TOKENS", "REVIEW_STATUS", "GENERATED_AT",
+]
+
+
+class TokenBudget:
+    """実行全体のトークン予算（ワーカースレッドから予約する）"""
+
+    def __init__(self, limit, minimum=MIN_TABLE_TOKENS):
+        self.limit = limit
+        self.minimum = minimum
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens):
+        """予算内なら tokens を確保して True を返す（超える場合は確保せず False）"""
+        with self._lock:
+            if self.used + tokens > self.limit:
+                return False
+            self.used += tokens
+            return True
+
+    def remaining(self):
+        with self._lock:
+            return max(self.limit - self.used, 0)
+
+    @property
+    def exhausted(self):
+        """残りが最小の見込み（minimum）を下回ったら True（以降のテーブルは投入しない）"""
+        return self.remaining() < self.minimum
+
+
+def new_run_id():
+    return datetime.now().strftime("%Y%m%d%H%M%S")
+
+
+def select_targets(session, databases=None, max_tables=MAX_TABLES, max_attempts=MAX_ATTEMPTS):
+    """バックフィル対象のテーブルを返す
+
+    STATE に完了（DONE / SKIPPED）が記録されたテーブルと、再試行回数を使い切ったテーブルは除く。
+    戻り値: [{'LOCATION', 'TABLE_NAME', 'DATABASE', 'SCHEMA'}]
+    """
+    params = [max_attempts]
+    database_filter = ""
+    if databases:
+        database_filter = f"AND SPLIT_PART(t.LOCATION, '.', 1) IN ({', '.join(['?'] * len(databases))})"
+        params.extend(databases)
+    params.append(int(max_tables))
+
+    result = session.sql(f"""
+        SELECT t.LOCATION, t.TABLE_NAME
+        FROM {TABLE_INFO} t
+        LEFT JOIN {BACKFILL_STATE_TABLE} s
+            ON s.LOCATION = t.LOCATION
+           AND s.TABLE_NAME = t.TABLE_NAME
+        WHERE t.CLASSIFICATION = 'SNOWFLAKE'
+          AND t.DELETED_DATE IS NULL
+          AND (t.COLUMN_COMMENT_FLAG = 0 OR t.TABLE_COMMENT IS NULL OR t.TABLE_COMMENT = '')
+          AND (s.STATUS IS NULL OR (s.STATUS = 'ERROR' AND s.ATTEMPTS < ?))
+          {database_filter}
+        ORDER BY t.LOCATION, t.TABLE_NAME
+        LIMIT ?
+    """, params=params).collect()
+
+    targets = []
+    for row in result:
+        db, _, schema = row['LOCATION'].partition('.')
+        targets.append({
+            'LOCATION': row['LOCATION'],
+            'TABLE_NAME': row['TABLE_NAME'],
+            'DATABASE': db,
+            'SCHEMA': schema,
+        })
+    return targets
+
+
+def _is_blank(comment):
+    return not (comment or "").strip()
+
+
+def _stage_results(session, run_id, target, rows):
+    """レビュー待ちの生成結果を保存する（同じテーブルの未レビューの行は置き換える）"""
+    session.sql(f"""
+        DELETE FROM {BACKFILL_STAGING_TABLE}
+        WHERE LOCATION = ?
+          AND TABLE_NAME = ?
+          AND REVIEW_STATUS = 'PENDING'
+    """, params=[target['LOCATION'], target['TABLE_NAME']]).collect()
+
+    generated_at = datetime.now().isoformat(sep=" ")
+    for start in range(0, len(rows), STAGING_INSERT_BATCH_SIZE):
+        batch = rows[start:start + STAGING_INSERT_BATCH_SIZE]
+        placeholders = ", ".join(["(" + ", ".join(["?"] * len(STAGING_COLUMNS)) + ")"] * len(batch))
+        params = []
+        for row in batch:
+            params.extend([
+                run_id, target['LOCATION'], target['TABLE_NAME'], row['COLUMN_NAME'], row['CURRENT_COMMENT'],
+                row['GENERATED_COMMENT'], row['MODEL'], row['ESTIMATED_TOKENS'], "PENDING", generated_at,
+            ])
+        session.sql(f"""
+            INSERT INTO {BACKFILL_STAGING_TABLE} ({", ".join(STAGING_COLUMNS)})
+            VALUES {placeholders}
+        """, params=params).collect()
+
+
+def _save_checkpoint(session, run_id, result):
+    session.sql(f"""
+        MERGE INTO {BACKFILL_STATE_TABLE} AS target
+        USING (
+            SELECT
+                ? AS LOCATION, ? AS TABLE_NAME, ? AS RUN_ID, ? AS STATUS,
+                ? AS COLUMNS_GENERATED, ? AS COLUMNS_FAILED, ? AS TABLE_COMMENT_GENERATED,
+                ? AS ESTIMATED_TOKENS, ? AS ERROR
+        ) AS source
+        ON target.LOCATION = source.LOCATION
+       AND target.TABLE_NAME = source.TABLE_NAME
+        WHEN MATCHED THEN
+            UPDATE SET
+                target.RUN_ID = source.RUN_ID,
+                target.STATUS = source.STATUS,
+                target.ATTEMPTS = target.ATTEMPTS + 1,
+                target.COLUMNS_GENERATED = source.COLUMNS_GENERATED,
+                target.COLUMNS_FAILED = source.COLUMNS_FAILED,
+                target.TABLE_COMMENT_GENERATED = source.TABLE_COMMENT_GENERATED,
+                target.ESTIMATED_TOKENS = source.ESTIMATED_TOKENS,
+                target.ERROR = source.ERROR,
+                target.UPDATED_AT = CURRENT_TIMESTAMP()::TIMESTAMP_NTZ
+        WHEN NOT MATCHED THEN
+            INSERT (LOCATION, TABLE_NAME, RUN_ID, STATUS, ATTEMPTS, COLUMNS_GENERATED, COLUMNS_FAILED,
+                    TABLE_COMMENT_GENERATED, ESTIMATED_TOKENS, ERROR, UPDATED_AT)
+            VALUES (source.LOCATION, source.TABLE_NAME, source.RUN_ID, source.STATUS, 1,
+                    source.COLUMNS_GENERATED, source.COLUMNS_FAILED, source.TABLE_COMMENT_GENERATED,
+                    source.ESTIMATED_TOKENS, source.ERROR, CURRENT_TIMESTAMP()::TIMESTAMP_NTZ)
+    """, params=[
+        result['LOCATION'], result['TABLE_NAME'], run_id, result['STATUS'],
+        result['COLUMNS_GENERATED'], result['COLUMNS_FAILED'], result['TABLE_COMMENT_GENERATED'],
+        result['ESTIMATED_TOKENS'], result['ERROR'],
+    ]).collect()
+
+
+def backfill_table(session, run_id, target, budget, model=DEFAULT_MODEL):
+    """1テーブル分のコメントを生成してステージングに保存し、結果を辞書で返す（例外は送出しない）
+
+    STATUS: 'DONE'（全件生成）/ 'ERROR'（一部または全部が失敗、再試行対象）/
+            'SKIPPED'（生成対象なし、または見込みが予算全体を超える）/
+            'BUDGET'（残りの予算が不足、チェックポイントは記録せず次回の実行で処理する）
+    """
+    started = time.perf_counter()
+    result = {
+        'LOCATION': target['LOCATION'],
+        'TABLE_NAME': target['TABLE_NAME'],
+        'STATUS': "ERROR",
+        'COLUMNS_GENERATED': 0,
+        'COLUMNS_FAILED': 0,
+        'TABLE_COMMENT_GENERATED': False,
+        'ESTIMATED_TOKENS': 0,
+        'ERROR': None,
+        'seconds': 0.0,
+    }
+    db, schema, table = target['DATABASE'], target['SCHEMA'], target['TABLE_NAME']
+    # Cortex の推定トークン数はテーブルの完全名ごとに記録する
+    usage_target = f"{target['LOCATION']}.{table}"
+
+    try:
+        # TABLE_INFO は最大1時間遅れるため、生成対象は現在のメタデータから決める
+        metadata = fetch_table_metadata(session, db, schema, table)
+        columns = metadata['columns']
+        missing = [column for column in columns if _is_blank(column['COMMENT'])]
+        need_table_comment = bool(columns) and _is_blank(metadata['table_comment'])
+
+        if not missing and not need_table_comment:
+            result['STATUS'] = "SKIPPED"
+            result['ERROR'] = "生成対象のコメントがありません" if columns else "テーブルが見つかりません"
+        else:
+            column_names = [column['COLUMN_NAME'] for column in columns]
+            table_prompt = build_table_prompt(table, column_names) if need_table_comment else None
+            profiles = profile_columns(session, db, schema, table, missing) if missing else {}
+
+            def column_prompts(table_comment):
+                return [
+                    (
+                        column['COLUMN_NAME'],
+                        build_column_prompt(
+                            table,
+                            table_comment,
+                            column['COLUMN_NAME'],
+                            column['DATA_TYPE'],
+                            profiles[column['COLUMN_NAME']].samples,
+                            profiles[column['COLUMN_NAME']].summary()
+                        )
+                    )
+                    for column in missing
+                ]
+
+            # テーブルコメントは生成後にカラムのプロンプトへ入るため、その分も見込んで予約する
+            prompts = column_prompts(metadata['table_comment'])
+            estimated = sum(estimate_tokens(prompt) + OUTPUT_TOKENS_PER_COLUMN for _, prompt in prompts)
+            if table_prompt:
+                estimated += estimate_tokens(table_prompt) + OUTPUT_TOKENS_PER_TABLE * (len(prompts) + 1)
+            result['ESTIMATED_TOKENS'] = estimated
+
+            if estimated > budget.limit:
+                # 予算全体を超えるテーブルは何度実行しても生成できないため、理由を記録して対象から外す
+                result['STATUS'] = "SKIPPED"
+                result['ERROR'] = f"見込みのトークン数（約{estimated}）がトークン予算（{budget.limit}）を超えています"
+            elif not budget.reserve(estimated):
+                # 残りに収まらないテーブルだけを見送り、小さいテーブルの投入は続ける
+                result['STATUS'] = "BUDGET"
+                result['ERROR'] = f"トークン予算が不足しています（必要: 約{estimated}、残り: {budget.remaining()}）"
+                result['seconds'] = time.perf_counter() - started
+                return result
+            else:
+                staged = []
+                table_comment = metadata['table_comment']
+                if table_prompt:
+                    generated = (complete(session, table_prompt, model, target=usage_target) or "").strip()
+                    if generated:
+                        table_comment = generated
+                        result['TABLE_COMMENT_GENERATED'] = True
+                        staged.append({
+                            'COLUMN_NAME': None,
+                            'CURRENT_COMMENT': metadata['table_comment'] or None,
+                            'GENERATED_COMMENT': generated,
+                            'MODEL': model,
+                            'ESTIMATED_TOKENS': estimate_tokens(table_prompt) + OUTPUT_TOKENS_PER_TABLE,
+                        })
+                        prompts = column_prompts(table_comment)
+
+                # 同時実行数はテーブル単位で制御するため、テーブル内のチャンクは直列に生成する
+                prompt_tokens = {column_name: estimate_tokens(prompt) for column_name, prompt in prompts}
+                for generated in generate_column_comments(session, prompts, model, max_parallel=1,
+                                                          target=usage_target):
+                    if generated['STATUS'] != 'OK':
+                        result['COLUMNS_FAILED'] += 1
+                        result['ERROR'] = generated['ERROR']
+                        continue
+                    result['COLUMNS_GENERATED'] += 1
+                    staged.append({
+                        'COLUMN_NAME': generated['COLUMN_NAME'],
+                        'CURRENT_COMMENT': None,
+                        'GENERATED_COMMENT': generated['COMMENT'],
+                        'MODEL': model,
+                        'ESTIMATED_TOKENS': prompt_tokens[generated['COLUMN_NAME']] + OUTPUT_TOKENS_PER_COLUMN,
+                    })
+
+                if staged:
+                    _stage_results(session, run_id, target, staged)
+                table_failed = need_table_comment and not result['TABLE_COMMENT_GENERATED']
+                if result['COLUMNS_FAILED'] or table_failed:
+                    result['STATUS'] = "ERROR"
+                    result['ERROR'] = result['ERROR'] or "テーブルコメントの生成結果が空です"
+                else:
+                    result['STATUS'] = "DONE"
+    except Exception as e:
+        result['STATUS'] = "ERROR"
+        result['ERROR'] = str(e)
+
+    try:
+        _save_checkpoint(session, run_id, result)
+    except Exception as e:
+        # チェックポイントを書けなかったテーブルは次回もう一度処理される
+        result['ERROR'] = f"{result['ERROR'] or ''} チェックポイントの保存に失敗: {e}".strip()
+
+    result['seconds'] = time.perf_counter() - started
+    return result
+
+
+def backfill_comments(session, databases=None, max_tables=MAX_TABLES, max_concurrency=MAX_CONCURRENCY,
+                      token_budget=TOKEN_BUDGET, model=DEFAULT_MODEL, run_id=None, on_result=None):
+    """対象テーブルを上限付きで並列に処理し、テーブル名順の結果リストを返す
+
+    残りに収まらないテーブルは見送って次のテーブルを投入し、残りの予算が MIN_TABLE_TOKENS を
+    下回ったら新しいテーブルの投入を止める（処理中のテーブルは最後まで処理する）。
+    on_result: on_result(結果) を1テーブル完了ごとに呼び出し元のスレッドで呼ぶ
+    """
+    run_id = run_id or new_run_id()
+    budget = TokenBudget(int(token_budget))
+    targets = select_targets(session, databases, max_tables)
+    results = []
+    if not targets:
+        return run_id, budget, results
+
+    pending = iter(targets)
+    with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(targets)))) as executor:
+        running = set()
+
+        def submit_next():
+            # 残りの予算が最小の見込みを下回ったら投入しない（残りは次回の実行で処理される）
+            if budget.exhausted:
+                return False
+            target = next(pending, None)
+            if target is None:
+                return False
+            running.add(executor.submit(backfill_table, session, run_id, target, budget, model))
+            return True
+
+        while len(running) < max_concurrency and submit_next():
+            pass
+        while running:
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                results.append(result)
+                if on_result:
+                    on_result(result)
+                submit_next()
+
+    return run_id, budget, sorted(results, key=lambda result: (result['LOCATION'], result['TABLE_NAME']))
+
+
+def summarize_results(results):
+    """テーブル別の結果を集計する"""
+    return {
+        'tables': len(results),
+        'done': sum(1 for result in results if result['STATUS'] == "DONE"),
+        'error': sum(1 for result in results if result['STATUS'] == "ERROR"),
+        'skipped': sum(1 for result in results if result['STATUS'] == "SKIPPED"),
+        'budget': sum(1 for result in results if result['STATUS'] == "BUDGET"),
+        'columns_generated': sum(result['COLUMNS_GENERATED'] for result in results),
+        'columns_failed': sum(result['COLUMNS_FAILED'] for result in results),
+        'table_comments_generated': sum(1 for result in results if result['TABLE_COMMENT_GENERATED']),
+    }
+
+
+def _mark_reviewed(session, location, table, column_names, status):
+    """APPROVED の行の REVIEW_STATUS を更新する（column_names の None はテーブルコメントの行）"""
+    named = [name for name in column_names if name is not None]
+    conditions = []
+    params = [status, location, table]
+    if None in column_names:
+        conditions.append("COLUMN_NAME IS NULL")
+    if named:
+        conditions.append(f"COLUMN_NAME IN ({', '.join(['?'] * len(named))})")
+        params.extend(named)
+    applied_at = "CURRENT_TIMESTAMP()::TIMESTAMP_NTZ" if status == 'APPLIED' else "NULL"
+    session.sql(f"""
+        UPDATE {BACKFILL_STAGING_TABLE}
+        SET REVIEW_STATUS = ?,
+            APPLIED_AT = {applied_at}
+        WHERE LOCATION = ?
+          AND TABLE_NAME = ?
+          AND REVIEW_STATUS = 'APPROVED'
+          AND ({" OR ".join(conditions)})
+    """, params=params).collect()
+
+
+def _find_conflicts(session, db, schema, table, table_rows):
+    """生成時（CURRENT_COMMENT）から現在のコメントが変わった行を {COLUMN_NAME: 理由} で返す
+
+    カラムは空欄のものだけを生成しているため、コメントが付いた・カラムがなくなった場合も競合とする。
+    """
+    metadata = fetch_table_metadata(session, db, schema, table)
+    live_columns = {column['COLUMN_NAME']: column['COMMENT'] for column in metadata['columns']}
+    conflicts = {}
+    for row in table_rows:
+        expected = row['CURRENT_COMMENT'] or ""
+        if row['COLUMN_NAME'] is None:
+            if (metadata['table_comment'] or "") != expected:
+                conflicts[None] = "生成後にテーブルコメントが変更されています"
+        elif row['COLUMN_NAME'] not in live_columns:
+            conflicts[row['COLUMN_NAME']] = "カラムが存在しません"
+        elif (live_columns[row['COLUMN_NAME']] or "") != expected:
+            conflicts[row['COLUMN_NAME']] = "生成後にカラムコメントが変更されています"
+    return conflicts
+
+
+def apply_reviewed_comments(session, run_id=None):
+    """レビューで APPROVED にした行を反映し、反映した行を APPLIED にする
+
+    REVIEWED_COMMENT があればそれを、なければ GENERATED_COMMENT を保存する。
+    生成時のコメント（CURRENT_COMMENT）から現在のコメントが変わっている行は上書きせず、
+    REVIEW_STATUS を CONFLICT にする（再生成するか、確認して APPROVED に戻す）。
+    戻り値: [{'LOCATION', 'TABLE_NAME', 'COLUMN_NAME', 'STATUS': 'OK' | 'CONFLICT' | 'ERROR', 'ERROR'}]
+    """
+    params = []
+    run_filter = ""
+    if run_id:
+        run_filter = "AND RUN_ID = ?"
+        params.append(run_id)
+    rows = session.sql(f"""
+        SELECT LOCATION, TABLE_NAME, COLUMN_NAME, CURRENT_COMMENT,
+               COALESCE(REVIEWED_COMMENT, GENERATED_COMMENT) AS COMMENT_TEXT
+        FROM {BACKFILL_STAGING_TABLE}
+        WHERE REVIEW_STATUS = 'APPROVED'
+          {run_filter}
+        ORDER BY LOCATION, TABLE_NAME, COLUMN_NAME
+    """, params=params).collect()
+
+    tables = {}
+    for row in rows:
+        tables.setdefault((row['LOCATION'], row['TABLE_NAME']), []).append(row)
+
+    results = []
+    for (location, table), table_rows in tables.items():
+        db, _, schema = location.partition('.')
+        try:
+            conflicts = _find_conflicts(session, db, schema, table, table_rows)
+        except Exception as e:
+            for row in table_rows:
+                results.append({'LOCATION': location, 'TABLE_NAME': table, 'COLUMN_NAME': row['COLUMN_NAME'],
+                                'STATUS': 'ERROR', 'ERROR': str(e)})
+            continue
+
+        outcomes = [
+            {'COLUMN_NAME': column_name, 'STATUS': 'CONFLICT', 'ERROR': reason}
+            for column_name, reason in conflicts.items()
+        ]
+        table_rows = [row for row in table_rows if row['COLUMN_NAME'] not in conflicts]
+        for row in table_rows:
+            if row['COLUMN_NAME'] is None:
+                try:
+                    save_table_comment(session, db, schema, table, row['COMMENT_TEXT'])
+                    outcomes.append({'COLUMN_NAME': None, 'STATUS': 'OK', 'ERROR': None})
+                except Exception as e:
+                    outcomes.append({'COLUMN_NAME': None, 'STATUS': 'ERROR', 'ERROR': str(e)})
+        changes = [(row['COLUMN_NAME'], row['COMMENT_TEXT']) for row in table_rows if row['COLUMN_NAME'] is not None]
+        outcomes.extend(save_column_comments(session, db, schema, table, changes))
+
+        if conflicts:
+            _mark_reviewed(session, location, table, list(conflicts), 'CONFLICT')
+        applied = [outcome['COLUMN_NAME'] for outcome in outcomes if outcome['STATUS'] == 'OK']
+        if applied:
+            _mark_reviewed(session, location, table, applied, 'APPLIED')
+
+        for outcome in outcomes:
+            results.append({'LOCATION': location, 'TABLE_NAME': table, **outcome})
+    return results
+
+
+def run(session, max_tables=MAX_TABLES, max_concurrency=MAX_CONCURRENCY, token_budget=TOKEN_BUDGET,
+        databases=None, model=DEFAULT_MODEL):
+    """Snowpark プロシージャのハンドラ（VARIANT として返せる辞書を返す）"""
+    started = time.perf_counter()
+    run_id, budget, results = backfill_comments(
+        session, databases or None, int(max_tables), int(max_concurrency), int(token_budget), model or DEFAULT_MODEL
+    )
+    summary = summarize_results(results)
+    summary['run_id'] = run_id
+    summary['estimated_tokens'] = budget.used
+    summary['budget_exhausted'] = budget.exhausted
+    summary['seconds'] = time.perf_counter() - started
+    return {
+        'summary': summary,
+        'results': results,
+    }
+
+
+def apply(session, run_id=None):
+    """レビュー済みの行を反映するプロシージャのハンドラ"""
+    results = apply_reviewed_comments(session, run_id or None)
+    return {
+        'applied': sum(1 for result in results if result['STATUS'] == 'OK'),
+        'conflict': sum(1 for result in results if result['STATUS'] == 'CONFLICT'),
+        'error': sum(1 for result in results if result['STATUS'] == 'ERROR'),
+        'results': results,
+    }
+
+
+if __name__ == "__main__":
+    # ローカル実行: connections.toml の既定接続で未処理のテーブルを処理する
+    from snowflake.snowpark import Session
+
+    local_session = Session.builder.getOrCreate()
+    local_summary = run(local_session)['summary']
+    print(
+        f"run {local_summary['run_id']}: {local_summary['done']}/{local_summary['tables']} テーブル完了, "
+        f"カラム {local_summary['columns_generated']} 件生成, 推定 {local_summary['estimated_tokens']} トークン"
+    )
@@ -0,0 +1,321 @@
+# ###
+# Cortex AIによるコメント一括生成
+#
+# カラムごとにプロシージャ内で SELECT TOP 100 と CORTEX.COMPLETE を直列に発行する代わりに、
+# 全カラムのプロンプトをまとめて作成し、チャンク単位の1文
+#   SELECT TRY_COMPLETE(...) FROM FLATTEN(<プロンプト配列>)
+# で生成する。チャンクは上限付きで並列実行し、チャンクごとに進捗を通知する。
+#
+# テーブルコメントは、以前はクリックのたびに CREATE OR REPLACE PROCEDURE gen_tbl_cmt_<テーブル>
+# を作成して CALL していた。現在はキャッシュ済みのカラム一覧からプロンプトを作り、
+# CORTEX.COMPLETE を1文で呼び出す（DDLは発行しない）。
+# 旧バージョンが残したプロシージャは find_legacy_procedures() / drop_legacy_procedures() で削除できる。
+#
+# 横に広いテーブルや長い文字列カラムでプロンプトが肥大化しないよう、
+# - サンプル値は重複を除き、1値ごとに切り詰めて件数を絞る
+# - 1プロンプトの推定トークン数に上限を設け、超える場合はサンプル・テーブル説明・データ概要から削り、
+#   それでも超える場合は名前を切り詰める（必須部分だけで超える場合は PromptTooLongError）
+# - テーブルコメント用のカラム一覧は代表的なカラムに絞る
+# - 1文（チャンク）のプロンプト合計にも上限を設ける
+# 呼び出しごとの推定トークン数は cortex.record_usage() でテーブル別に記録する。
+# ###
+
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from cortex import DEFAULT_MODEL, complete, estimate_tokens, record_usage
+from sql_utils import escape_literal, table_path
+
+# 1文で生成するカラム数
+COLUMN_CHUNK_SIZE = 50
+
+# 1文で生成するプロンプトの推定トークン数の合計の上限
+MAX_CHUNK_PROMPT_TOKENS = 40000
+
+# 同時に実行するチャンク数
+MAX_PARALLEL_CHUNKS = 4
+
+# 1プロンプトの推定トークン数の上限
+MAX_PROMPT_TOKENS = 1500
+
+# プロンプトに載せるサンプル値の件数と、1値あたりの最大文字数
+MAX_SAMPLE_VALUES = 10
+MAX_SAMPLE_CHARS = 50
+
+# カラムのプロンプトに載せるテーブル説明の最大文字数
+MAX_TABLE_COMMENT_CHARS = 200
+
+# テーブルコメントのプロンプトに載せるカラム数
+MAX_TABLE_PROMPT_COLUMNS = 60
+
+# 上限を超える場合に切り詰めるテーブル名・カラム名・データ型の最大文字数
+MAX_PROMPT_NAME_CHARS = 100
+
+COLUMN_PROMPT_TEMPLATE = """テーブル: {table_name}
+テーブル説明: {table_comment}
+カラム名: {column_name}
+データ型: {data_type}
+サンプルデータ: {sample_data}
+データ概要: {profile}
+
+【参考例】
+qmin: 最小流量。単位:[mm3/sec]
+
+KOHIN: 子品番。
+
+上記のテーブル名、テーブル説明、カラム名、サンプルデータとデータ概要を考慮して、このカラムの技術的な説明を日本語で50文字以内で簡潔に生成して。
+説明文のみを出力し、前置きや補足説明は不要。
+数値型の場合のみ単位を記載。"""
+
+
+TABLE_PROMPT_TEMPLATE = """テーブル名: {table_name}
+カラム一覧: {column_list}
+
+【参考例】
+TB_SALES_SUMMARY: 売上集計テーブル。日次・月次の売上データを格納
+
+上記を参考に、このテーブルの目的を日本語で100文字以内で説明して。説明文のみ出力。"""
+
+# 旧バージョンがテーブルごとに作成していたプロシージャ名（GEN_TBL_CMT_<テーブル> / GEN_COL_CMT_<テーブル>）
+LEGACY_PROCEDURE_PATTERN = re.compile(r"^GEN_(TBL|COL)_CMT_", re.IGNORECASE)
+
+
+class PromptTooLongError(ValueError):
+    """必須の部分だけでもプロンプトの推定トークン数が上限を超える"""
+
+
+def _truncate(text, max_chars):
+    text = text or ""
+    return text if len(text) <= max_chars else text[:max_chars - 1] + "…"
+
+
+def prepare_samples(samples, max_values=MAX_SAMPLE_VALUES, max_chars=MAX_SAMPLE_CHARS):
+    """空白を詰めて max_chars 文字に切り詰め、重複（大文字小文字を区別しない）を除いたサンプルを最大 max_values 件返す"""
+    prepared = []
+    seen = set()
+    for value in samples or []:
+        text = _truncate(re.sub(r"\s+", " ", str(value)).strip(), max_chars)
+        if not text or text.casefold() in seen:
+            continue
+        seen.add(text.casefold())
+        prepared.append(text)
+        if len(prepared) >= max_values:
+            break
+    return prepared
+
+
+def select_representative_columns(column_names, max_columns=MAX_TABLE_PROMPT_COLUMNS):
+    """テーブルコメントのプロンプトに載せるカラムを最大 max_columns 件、元の順序のまま選ぶ
+
+    連番だけが異なるカラム（VALUE_1, VALUE_2, ...）は最初の1件で代表させる。
+    それでも多い場合は、先頭（キー項目が多い）から半分、残りを後ろのカラムから等間隔に選ぶ。
+    """
+    column_names = list(column_names)
+    if len(column_names) <= max_columns:
+        return column_names
+
+    unique = []
+    patterns = set()
+    for name in column_names:
+        pattern = re.sub(r"\d+", "#", name.upper())
+        if pattern not in patterns:
+            patterns.add(pattern)
+            unique.append(name)
+    if len(unique) <= max_columns:
+        return unique
+
+    head = max_columns // 2
+    rest = unique[head:]
+    step = len(rest) / (max_columns - head)
+    return unique[:head] + [rest[int(i * step)] for i in range(max_columns - head)]
+
+
+def build_table_prompt(table_name, column_names, max_columns=MAX_TABLE_PROMPT_COLUMNS,
+                       max_tokens=MAX_PROMPT_TOKENS):
+    """テーブルコメント生成用のプロンプト（カラム一覧は代表的なカラムに絞る）"""
+    column_names = list(column_names)
+    while True:
+        selected = select_representative_columns(column_names, max_columns)
+        column_list = ", ".join(selected)
+        if len(selected) < len(column_names):
+            column_list += f"（ほか{len(column_names) - len(selected)}カラム）"
+        prompt = TABLE_PROMPT_TEMPLATE.format(table_name=table_name, column_list=column_list)
+        if estimate_tokens(prompt) <= max_tokens or max_columns <= 1:
+            return prompt
+        max_columns //= 2
+
+
+def generate_table_comment(session, table_name, column_names, model=DEFAULT_MODEL, target=None):
+    """テーブルコメントを1文の CORTEX.COMPLETE で生成する
+
+    target: 推定トークン数を記録する対象（省略時はテーブル名）
+    """
+    prompt = build_table_prompt(table_name, column_names)
+    return (complete(session, prompt, model, target=target or table_name) or "").strip()
+
+
+def find_legacy_procedures(session):
+    """現在のスキーマに残っている旧生成プロシージャを返す
+
+    戻り値: [{'name', 'database', 'schema', 'signature'}]（signature は "()" などの引数型）
+    """
+    result = session.sql("SHOW USER PROCEDURES LIKE 'GEN%CMT%'").collect()
+    procedures = []
+    for row in result:
+        row_dict = row.as_dict()
+        name = row_dict['name']
+        if not LEGACY_PROCEDURE_PATTERN.match(name):
+            continue
+        # arguments は "GEN_TBL_CMT_X() RETURN VARCHAR" の形式
+        arguments = re.search(r"\(([^)]*)\)", row_dict.get('arguments') or "")
+        procedures.append({
+            'name': name,
+            'database': row_dict['catalog_name'],
+            'schema': row_dict['schema_name'],
+            'signature': f"({arguments.group(1) if arguments else ''})",
+        })
+    return procedures
+
+
+def drop_legacy_procedures(session, procedures):
+    """旧生成プロシージャを削除し、プロシージャごとの結果を返す
+
+    戻り値: [{'name': ..., 'STATUS': 'OK' | 'ERROR', 'ERROR': ... or None}]
+    """
+    results = []
+    for procedure in procedures:
+        path = table_path(procedure['database'], procedure['schema'], procedure['name'])
+        try:
+            session.sql(f"DROP PROCEDURE IF EXISTS {path}{procedure['signature']}").collect()
+            results.append({'name': procedure['name'], 'STATUS': 'OK', 'ERROR': None})
+        except Exception as e:
+            results.append({'name': procedure['name'], 'STATUS': 'ERROR', 'ERROR': str(e)})
+    return results
+
+
+def build_column_prompt(table_name, table_comment, column_name, data_type, samples, profile=None,
+                        max_tokens=MAX_PROMPT_TOKENS):
+    """カラムコメント生成用のプロンプト（profile は ColumnProfile.summary() の文字列）
+
+    推定トークン数が max_tokens を超える場合は、サンプル値を後ろから減らし、テーブル説明を短くして外し、
+    データ概要を外し、最後にテーブル名・カラム名・データ型を切り詰める。
+    それでも超える場合は PromptTooLongError（上限を超えるプロンプトは返さない）。
+    """
+    samples = prepare_samples(samples)
+    table_comment = _truncate(table_comment, MAX_TABLE_COMMENT_CHARS)
+    names_truncated = False
+    while True:
+        prompt = COLUMN_PROMPT_TEMPLATE.format(
+            table_name=table_name,
+            table_comment=table_comment or "テーブル説明なし",
+            column_name=column_name,
+            data_type=data_type,
+            sample_data=", ".join(samples),
+            profile=profile or "不明",
+        )
+        tokens = estimate_tokens(prompt)
+        if tokens <= max_tokens:
+            return prompt
+        if samples:
+            samples = samples[:-1]
+        elif len(table_comment) > 20:
+            table_comment = _truncate(table_comment, len(table_comment) // 2)
+        elif table_comment:
+            table_comment = ""
+        elif profile:
+            profile = None
+        elif not names_truncated:
+            table_name = _truncate(table_name, MAX_PROMPT_NAME_CHARS)
+            column_name = _truncate(column_name, MAX_PROMPT_NAME_CHARS)
+            data_type = _truncate(data_type, MAX_PROMPT_NAME_CHARS)
+            names_truncated = True
+        else:
+            raise PromptTooLongError(
+                f"{column_name}: プロンプトの推定トークン数（{tokens}）が上限（{max_tokens}）を超えます"
+            )
+
+
+def chunk_prompts(prompts, chunk_size=COLUMN_CHUNK_SIZE, max_chunk_tokens=MAX_CHUNK_PROMPT_TOKENS):
+    """プロンプトを件数と推定トークン数の合計の上限でチャンクに分ける"""
+    chunks = []
+    current = []
+    current_tokens = 0
+    for column_name, prompt in prompts:
+        tokens = estimate_tokens(prompt)
+        if current and (len(current) >= chunk_size or current_tokens + tokens > max_chunk_tokens):
+            chunks.append(current)
+            current = []
+            current_tokens = 0
+        current.append((column_name, prompt))
+        current_tokens += tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _complete_chunk(session, prompts, model, target):
+    """プロンプトのチャンクを1文で生成し、{COLUMN_NAME: 応答 or None} を返す"""
+    payload = json.dumps(
+        [{"column": column_name, "prompt": prompt} for column_name, prompt in prompts],
+        ensure_ascii=False
+    )
+    result = session.sql(f"""
+        SELECT
+            f.VALUE:column::STRING AS COLUMN_NAME,
+            SNOWFLAKE.CORTEX.TRY_COMPLETE('{escape_literal(model)}', f.VALUE:prompt::STRING) AS COMMENT_TEXT
+        FROM TABLE(FLATTEN(INPUT => PARSE_JSON(?))) f
+    """, params=[payload]).collect()
+    comments = {row['COLUMN_NAME']: row['COMMENT_TEXT'] for row in result}
+    record_usage(
+        target,
+        "TRY_COMPLETE",
+        model,
+        sum(estimate_tokens(prompt) for _, prompt in prompts),
+        sum(estimate_tokens(comment) for comment in comments.values()),
+        prompts=len(prompts),
+        session=session,
+    )
+    return comments
+
+
+def generate_column_comments(session, prompts, model=DEFAULT_MODEL, chunk_size=COLUMN_CHUNK_SIZE,
+                             max_parallel=MAX_PARALLEL_CHUNKS, on_progress=None, target=None,
+                             max_chunk_tokens=MAX_CHUNK_PROMPT_TOKENS):
+    """カラムごとのプロンプトからコメントを一括生成する
+
+    prompts: [(COLUMN_NAME, プロンプト)] のリスト
+    on_progress: on_progress(完了チャンク数, 全チャンク数, 完了カラム数, 全カラム数)
+                 呼び出し元のスレッドから呼ばれるため、st.progress を直接更新してよい
+    target: 推定トークン数を記録する対象（"DB.SCHEMA.TABLE" など）
+
+    戻り値は入力順の結果リスト:
+    [{'COLUMN_NAME': ..., 'COMMENT': ... or None, 'STATUS': 'OK' | 'ERROR', 'ERROR': ... or None}]
+    """
+    chunks = chunk_prompts(prompts, chunk_size, max_chunk_tokens)
+    comments = {}
+    errors = {}
+    done_columns = 0
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_parallel, len(chunks) or 1))) as executor:
+        futures = {executor.submit(_complete_chunk, session, chunk, model, target): chunk for chunk in chunks}
+        for done_chunks, future in enumerate(as_completed(futures), start=1):
+            chunk = futures[future]
+            try:
+                comments.update(future.result())
+            except Exception as e:
+                for column_name, _ in chunk:
+                    errors[column_name] = str(e)
+            done_columns += len(chunk)
+            if on_progress:
+                on_progress(done_chunks, len(chunks), done_columns, len(prompts))
+
+    results = []
+    for column_name, _ in prompts:
+        comment = comments.get(column_name)
+        if comment:
+            results.append({'COLUMN_NAME': column_name, 'COMMENT': comment.strip(), 'STATUS': 'OK', 'ERROR': None})
+        else:
+            error = errors.get(column_name) or "生成結果が空です"
+            results.append({'COLUMN_NAME': column_name, 'COMMENT': None, 'STATUS': 'ERROR', 'ERROR': error})
+    return results
@@ -0,0 +1,87 @@
+# ###
+# カラムコメントの差分保存
+#
+# 読み込み時のコメントと編集後のコメントを比較し、変更のあったカラムだけを
+#   ALTER TABLE ... ALTER COLUMN "A" COMMENT '...', COLUMN "B" COMMENT '...'
+# の1文（横に広いテーブルはチャンクごとに1文）で保存する。
+# 1文のALTERはアトミックに反映される。Snowflakeでは DDL ごとに自動コミットされるため、
+# チャンクをまたいだトランザクションにはならない。チャンクが失敗した場合は、
+# どのカラムが原因かを特定するためにそのチャンクだけ1カラムずつ再実行する。
+# 保存後はカラムメタデータ・テーブルメタデータのキャッシュの該当テーブルを失効させる。
+# ###
+
+from column_metadata import invalidate_columns
+from sql_utils import escape_literal, quote_identifier, table_path
+from table_metadata import invalidate_table_metadata
+
+# 1文のALTERで変更するカラム数
+ALTER_CHUNK_SIZE = 100
+
+
+def _normalize_comment(comment):
+    if comment is None:
+        return ""
+    # pandasの欠損値（NaN）は自分自身と等しくならない
+    if comment != comment:
+        return ""
+    return str(comment)
+
+
+def diff_column_comments(original_comments, edited_comments):
+    """変更のあったカラムだけを [(COLUMN_NAME, 新コメント)] で返す
+
+    original_comments: {COLUMN_NAME: 読み込み時のコメント}
+    edited_comments: [(COLUMN_NAME, 編集後のコメント)]
+    """
+    changes = []
+    for column_name, comment in edited_comments:
+        new_comment = _normalize_comment(comment)
+        if new_comment != _normalize_comment(original_comments.get(column_name)):
+            changes.append((column_name, new_comment))
+    return changes
+
+
+def _alter_sql(path, changes):
+    column_clauses = ",\n            ".join(
+        f"COLUMN {quote_identifier(column_name)} COMMENT '{escape_literal(comment)}'"
+        for column_name, comment in changes
+    )
+    return f"""
+        ALTER TABLE {path} ALTER
+            {column_clauses}
+    """
+
+
+def save_column_comments(session, db, schema, table, changes, chunk_size=ALTER_CHUNK_SIZE):
+    """変更カラムのコメントをまとめて保存し、カラムごとの結果を返す
+
+    戻り値: [{'COLUMN_NAME': ..., 'STATUS': 'OK' | 'ERROR', 'ERROR': ... or None}]
+    """
+    path = table_path(db, schema, table)
+    results = []
+    for start in range(0, len(changes), chunk_size):
+        chunk = changes[start:start + chunk_size]
+        try:
+            session.sql(_alter_sql(path, chunk)).collect()
+            results.extend({'COLUMN_NAME': column_name, 'STATUS': 'OK', 'ERROR': None} for column_name, _ in chunk)
+        except Exception:
+            # 失敗したチャンクは1カラムずつ再実行して原因のカラムを特定する
+            for change in chunk:
+                try:
+                    session.sql(_alter_sql(path, [change])).collect()
+                    results.append({'COLUMN_NAME': change[0], 'STATUS': 'OK', 'ERROR': None})
+                except Exception as e:
+                    results.append({'COLUMN_NAME': change[0], 'STATUS': 'ERROR', 'ERROR': str(e)})
+    if changes:
+        invalidate_columns(db, schema, table)
+        invalidate_table_metadata(db, schema, table)
+    return results
+
+
+def save_table_comment(session, db, schema, table, comment):
+    """テーブルコメントを保存し、テーブルメタデータのキャッシュを失効させる"""
+    session.sql(f"""
+        ALTER TABLE {table_path(db, schema, table)}
+        SET COMMENT = '{escape_literal(comment)}'
+    """).collect()
+    invalidate_table_metadata(db, schema, table)
@@ -0,0 +1,177 @@
+# ###
+# Snowflake Cortex 呼び出しの共通処理
+#
+# Cortex の呼び出し（1文）ごとに、プロンプトと応答の推定トークン数を対象（テーブルなど）別に
+# 記録する。record_usage() / cortex_usage_by_target() でテーブルごとのコストを確認できる。
+# プロセス内の記録は再起動で消えるため、session を渡した記録は CORTEX_USAGE_LOG テーブル
+# （create_cortex_usage_log.sql）にも1件ずつ書き込む（アプリ・一括バックフィルの両方）。
+# 書き込みに失敗した場合（テーブル未作成・権限不足）は一定時間書き込みを止め、生成処理は止めない。
+# ###
+
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from sql_utils import escape_literal
+
+# 各アプリで使用するモデル
+DEFAULT_MODEL = "mistral-large2"
+
+# 保持する呼び出し記録の件数（超えたら古いものから破棄する。合計値は破棄後も累計する）
+MAX_USAGE_RECORDS = 1000
+
+# 推定トークン数の書き込み先（create_cortex_usage_log.sql で作成）
+CORTEX_USAGE_TABLE = "DIESELPJ_GEN.DATA_CATALOG.CORTEX_USAGE_LOG"
+
+CORTEX_USAGE_COLUMNS = [
+    "LOGGED_AT", "SOURCE", "TARGET", "KIND", "MODEL", "PROMPTS", "PROMPT_TOKENS", "OUTPUT_TOKENS",
+]
+
+# 書き込みに失敗した後、再び書き込みを試みるまでの時間（秒）
+USAGE_PERSIST_RETRY_SECONDS = 300
+
+# アプリ（instrument_session() で包んだ session）以外からの呼び出しの SOURCE
+BATCH_USAGE_SOURCE = "BATCH"
+
+
+def complete(session, prompt, model=DEFAULT_MODEL, target=None):
+    """SNOWFLAKE.CORTEX.COMPLETE を1回呼び出して応答テキストを返す
+
+    target: 推定トークン数を記録する対象（"DB.SCHEMA.TABLE" など。省略時は対象なし）
+    """
+    result = session.sql(f"""
+        SELECT SNOWFLAKE.CORTEX.COMPLETE(
+            '{escape_literal(model)}',
+            '{escape_literal(prompt)}'
+        ) AS RESPONSE
+    """).collect()
+    response = result[0]['RESPONSE'] if result else ""
+    record_usage(target, "COMPLETE", model, estimate_tokens(prompt), estimate_tokens(response), session=session)
+    return response
+
+
+def estimate_tokens(text):
+    """トークン数の概算（英数字は約4文字で1トークン、日本語などは1文字1トークン）"""
+    if not text:
+        return 0
+    text = str(text)
+    ascii_chars = sum(1 for ch in text if ch.isascii())
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+
+class CortexUsageLog:
+    """Cortex 呼び出しごとの推定トークン数"""
+
+    def __init__(self, max_records=MAX_USAGE_RECORDS, table=CORTEX_USAGE_TABLE,
+                 retry_seconds=USAGE_PERSIST_RETRY_SECONDS, clock=time.monotonic):
+        self._lock = threading.Lock()
+        self.records = deque(maxlen=max_records)
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.table = table
+        self.retry_seconds = retry_seconds
+        self._clock = clock
+        self._persist_retry_at = None
+        self.persisted = 0
+        self.persist_errors = 0
+
+    def record(self, target, kind, model, prompt_tokens, output_tokens, prompts=1, session=None):
+        """呼び出しを記録する（session を渡すと CORTEX_USAGE_LOG にも書き込む）"""
+        record = {
+            'LOGGED_AT': datetime.now(),
+            'SOURCE': _usage_source(session),
+            'TARGET': target,
+            'KIND': kind,
+            'MODEL': model,
+            'PROMPTS': prompts,
+            'PROMPT_TOKENS': prompt_tokens,
+            'OUTPUT_TOKENS': output_tokens,
+        }
+        with self._lock:
+            self.records.append(record)
+            self.requests += 1
+            self.prompt_tokens += prompt_tokens
+            self.output_tokens += output_tokens
+        if session is not None:
+            self.persist(session, record)
+        return record
+
+    def persist(self, session, record):
+        """1件を CORTEX_USAGE_LOG に書き込む（失敗しても例外は送出しない）"""
+        with self._lock:
+            if self._persist_retry_at is not None and self._clock() < self._persist_retry_at:
+                return False
+        params = [
+            record['LOGGED_AT'].isoformat(sep=" ") if column == 'LOGGED_AT' else record[column]
+            for column in CORTEX_USAGE_COLUMNS
+        ]
+        try:
+            # 計測対象にならないよう、包む前の session で書き込む
+            getattr(session, "unwrapped", session).sql(f"""
+                INSERT INTO {self.table} ({", ".join(CORTEX_USAGE_COLUMNS)})
+                VALUES ({", ".join(["?"] * len(CORTEX_USAGE_COLUMNS))})
+            """, params=params).collect()
+        except Exception:
+            # テーブル未作成・権限不足でも生成処理は止めない（一定時間後に再試行する）
+            with self._lock:
+                self.persist_errors += 1
+                self._persist_retry_at = self._clock() + self.retry_seconds
+            return False
+        with self._lock:
+            self.persisted += 1
+            self._persist_retry_at = None
+        return True
+
+    def by_target(self):
+        """対象ごとの呼び出し数・推定トークン数（多い順）"""
+        groups = {}
+        with self._lock:
+            for record in self.records:
+                group = groups.setdefault(record['TARGET'], {
+                    'TARGET': record['TARGET'],
+                    'REQUESTS': 0,
+                    'PROMPTS': 0,
+                    'PROMPT_TOKENS': 0,
+                    'OUTPUT_TOKENS': 0,
+                })
+                group['REQUESTS'] += 1
+                group['PROMPTS'] += record['PROMPTS']
+                group['PROMPT_TOKENS'] += record['PROMPT_TOKENS']
+                group['OUTPUT_TOKENS'] += record['OUTPUT_TOKENS']
+        return sorted(groups.values(), key=lambda group: group['PROMPT_TOKENS'] + group['OUTPUT_TOKENS'],
+                      reverse=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'prompt_tokens': self.prompt_tokens,
+                'output_tokens': self.output_tokens,
+                'total_tokens': self.prompt_tokens + self.output_tokens,
+                'persisted': self.persisted,
+                'persist_errors': self.persist_errors,
+            }
+
+
+# プロセス内で共有する記録
+_usage = CortexUsageLog()
+
+
+def _usage_source(session):
+    """アプリから呼ばれた場合はページ名、それ以外は BATCH"""
+    recorder = getattr(session, "recorder", None)
+    return getattr(recorder, "page", None) or BATCH_USAGE_SOURCE
+
+
+def record_usage(target, kind, model, prompt_tokens, output_tokens, prompts=1, session=None):
+    return _usage.record(target, kind, model, prompt_tokens, output_tokens, prompts, session)
+
+
+def cortex_usage_by_target():
+    return _usage.by_target()
+
+
+def cortex_usage_stats():
+    return _usage.stats()
@@ -0,0 +1,131 @@
+-- AIコメントの一括バックフィル（comment_backfill.py）
+-- COLUMN_COMMENT_FLAG = 0 またはテーブルコメントなしのテーブルについてコメントを生成し、
+-- ALTER せずに COMMENT_BACKFILL_STAGING に保存する。レビュー後に APPLY_REVIEWED_COMMENTS で反映する。
+
+-- ============================================
+-- チェックポイント（テーブルごとの処理結果）
+-- STATUS: DONE（生成済み）/ ERROR（ATTEMPTS が上限未満なら次回再試行）/
+--         SKIPPED（生成対象なし、または見込みのトークン数が TOKEN_BUDGET を超える。理由は ERROR）
+-- 状態の行を削除すると、そのテーブルは次回の実行で再び対象になる
+-- ============================================
+CREATE TABLE IF NOT EXISTS DIESELPJ_GEN.DATA_CATALOG.COMMENT_BACKFILL_STATE (
+    LOCATION VARCHAR(500),
+    TABLE_NAME VARCHAR(255),
+    RUN_ID VARCHAR(50),
+    STATUS VARCHAR(20),
+    ATTEMPTS NUMBER,
+    COLUMNS_GENERATED NUMBER,
+    COLUMNS_FAILED NUMBER,
+    TABLE_COMMENT_GENERATED BOOLEAN,
+    ESTIMATED_TOKENS NUMBER,
+    ERROR VARCHAR,
+    UPDATED_AT TIMESTAMP_NTZ
+);
+
+-- ============================================
+-- レビュー待ちの生成結果
+-- COLUMN_NAME が NULL の行はテーブルコメント
+-- REVIEW_STATUS: PENDING（未レビュー）/ APPROVED（反映する）/ REJECTED（反映しない）/ APPLIED（反映済み）
+--                / CONFLICT（生成後に現在のコメントが CURRENT_COMMENT から変わったため反映しなかった）
+-- CURRENT_COMMENT: 生成時のコメント（反映時に現在のコメントと比較する）
+-- REVIEWED_COMMENT: レビューで修正したコメント（NULLの場合は GENERATED_COMMENT を反映する）
+-- ============================================
+CREATE TABLE IF NOT EXISTS DIESELPJ_GEN.DATA_CATALOG.COMMENT_BACKFILL_STAGING (
+    RUN_ID VARCHAR(50),
+    LOCATION VARCHAR(500),
+    TABLE_NAME VARCHAR(255),
+    COLUMN_NAME VARCHAR(255),
+    CURRENT_COMMENT VARCHAR,
+    GENERATED_COMMENT VARCHAR,
+    REVIEWED_COMMENT VARCHAR,
+    MODEL VARCHAR(255),
+    ESTIMATED_TOKENS NUMBER,
+    REVIEW_STATUS VARCHAR(20),
+    GENERATED_AT TIMESTAMP_NTZ,
+    APPLIED_AT TIMESTAMP_NTZ
+);
+
+-- ============================================
+-- バックフィル実行プロシージャ
+-- CATALOG_CODE ステージに各 .py をアップロードしてから作成する（create_table_info.sql 参照）
+-- ============================================
+CREATE OR REPLACE PROCEDURE DIESELPJ_GEN.DATA_CATALOG.BACKFILL_COMMENTS(
+    MAX_TABLES NUMBER DEFAULT 100, -- 1回の実行で処理するテーブル数
+    MAX_CONCURRENCY NUMBER DEFAULT 4, -- 同時に処理するテーブル数（Cortex の同時実行数）
+    TOKEN_BUDGET NUMBER DEFAULT 1000000, -- 1回の実行で使う推定トークン数の上限
+    DATABASES ARRAY DEFAULT ARRAY_CONSTRUCT(), -- 空の場合は全データベース
+    MODEL VARCHAR DEFAULT 'mistral-large2'
+)
+RETURNS VARIANT
+LANGUAGE PYTHON
+RUNTIME_VERSION = '3.11'
+PACKAGES = ('snowflake-snowpark-python')
+IMPORTS = (
+    '@DIESELPJ_GEN.DATA_CATALOG.CATALOG_CODE/catalog.py',
+    '@DIESELPJ_GEN.DATA_CATALOG.CATALOG_CODE/comment_backfill.py',
+    '@DIESELPJ_GEN.DATA_CATALOG.CATALOG_CODE/comment_generation.py',
+    '@DIESELPJ_GEN.DATA_CATALOG.CATALOG_CODE/comment_saver.py',
+    '@DIESELPJ_GEN.DATA_CATALOG.CATALOG_CODE/column_metadata.py',
+    '@DIESELPJ_GEN.DATA_CATALOG.CATALOG_CODE/column_sampler.py',
+    '@DIESELPJ_GEN.DATA_CATALOG.CATALOG_CODE/cortex.py',
+    '@DIESELPJ_GEN.DATA_CATALOG.CATALOG_CODE/sql_utils.py',
+    '@DIESELPJ_GEN.DATA_CATALOG.CATALOG_CODE/table_metadata.py'
+)
+HANDLER = 'comment_backfill.run'
+EXECUTE AS CALLER;
+
+-- レビューで APPROVED にした行を反映するプロシージャ（RUN_ID を省略すると全実行分）
+CREATE OR REPLACE PROCEDURE DIESELPJ_GEN.DATA_CATALOG.APPLY_REVIEWED_COMMENTS(
+    RUN_ID VARCHAR DEFAULT NULL
+)
+RETURNS VARIANT
+LANGUAGE PYTHON
+RUNTIME_VERSION = '3.11'
+PACKAGES = ('snowflake-snowpark-python')
+IMPORTS = (
+    '@DIESELPJ_GEN.DATA_CATALOG.CATALOG_CODE/catalog.py',
+    '@DIESELPJ_GEN.DATA_CATALOG.CATALOG_CODE/comment_backfill.py',
+    '@DIESELPJ_GEN.DATA_CATALOG.CATALOG_CODE/comment_generation.py',
+    '@DIESELPJ_GEN.DATA_CATALOG.CATALOG_CODE/comment_saver.py',
+    '@DIESELPJ_GEN.DATA_CATALOG.CATALOG_CODE/column_metadata.py',
+    '@DIESELPJ_GEN.DATA_CATALOG.CATALOG_CODE/column_sampler.py',
+    '@DIESELPJ_GEN.DATA_CATALOG.CATALOG_CODE/cortex.py',
+    '@DIESELPJ_GEN.DATA_CATALOG.CATALOG_CODE/sql_utils.py',
+    '@DIESELPJ_GEN.DATA_CATALOG.CATALOG_CODE/table_metadata.py'
+)
+HANDLER = 'comment_backfill.apply'
+EXECUTE AS CALLER;
+
+-- 実行例（中断した場合も同じ CALL で未処理のテーブルから再開する）
+-- CALL DIESELPJ_GEN.DATA_CATALOG.BACKFILL_COMMENTS();
+-- CALL DIESELPJ_GEN.DATA_CATALOG.BACKFILL_COMMENTS(500, 8, 5000000, ARRAY_CONSTRUCT('DIESELPJ_GEN'));
+
+-- 確認用クエリ: 状態ごとのテーブル数と推定トークン数
+SELECT STATUS, COUNT(*) AS TABLES, SUM(COLUMNS_GENERATED) AS COLUMNS_GENERATED, SUM(ESTIMATED_TOKENS) AS ESTIMATED_TOKENS
+FROM DIESELPJ_GEN.DATA_CATALOG.COMMENT_BACKFILL_STATE
+GROUP BY STATUS;
+
+-- レビュー: 未レビューの生成結果
+SELECT LOCATION, TABLE_NAME, COLUMN_NAME, GENERATED_COMMENT
+FROM DIESELPJ_GEN.DATA_CATALOG.COMMENT_BACKFILL_STAGING
+WHERE REVIEW_STATUS = 'PENDING'
+ORDER BY LOCATION, TABLE_NAME, COLUMN_NAME NULLS FIRST;
+
+-- レビュー例: テーブル単位で承認（修正する場合は REVIEWED_COMMENT を設定）し、反映する
+-- UPDATE DIESELPJ_GEN.DATA_CATALOG.COMMENT_BACKFILL_STAGING
+-- SET REVIEW_STATUS = 'APPROVED'
+-- WHERE LOCATION = 'DIESELPJ_GEN.SA122_POWERSYS_CDAP_SHARE'
+--   AND TABLE_NAME = 'TB_DXEEP_FORWARD_B5_3_POWERTRAIN_HAIZUHANTEI'
+--   AND REVIEW_STATUS = 'PENDING';
+-- CALL DIESELPJ_GEN.DATA_CATALOG.APPLY_REVIEWED_COMMENTS();
+
+-- 反映しなかった行（生成後にコメントが変更された）: 確認して APPROVED に戻すか、状態を削除して再生成する
+SELECT s.LOCATION, s.TABLE_NAME, s.COLUMN_NAME, s.CURRENT_COMMENT, s.GENERATED_COMMENT
+FROM DIESELPJ_GEN.DATA_CATALOG.COMMENT_BACKFILL_STAGING s
+WHERE s.REVIEW_STATUS = 'CONFLICT'
+ORDER BY s.LOCATION, s.TABLE_NAME, s.COLUMN_NAME NULLS FIRST;
+
+-- テーブルを再生成の対象に戻す
+-- DELETE FROM DIESELPJ_GEN.DATA_CATALOG.COMMENT_BACKFILL_STATE
+-- WHERE LOCATION = 'DIESELPJ_GEN.SA122_POWERSYS_CDAP_SHARE'
+--   AND TABLE_NAME = 'TB_DXEEP_FORWARD_B5_3_POWERTRAIN_HAIZUHANTEI';
@@ -0,0 +1,44 @@
+-- Cortex 呼び出しの推定トークン数ログ
+-- コメント生成アプリと一括バックフィル（BACKFILL_COMMENTS）が呼び出しごとに cortex.py から書き込む
+-- テーブルがない場合や権限がない場合は書き込まずに処理を続ける
+
+-- SOURCE: アプリのページ名（例: コメント生成）、プロシージャ・ローカル実行は BATCH
+-- TARGET: 対象テーブルの完全名（DB.SCHEMA.TABLE）。対象のない呼び出しは NULL
+-- KIND: COMPLETE（1プロンプト）/ TRY_COMPLETE（チャンク単位の一括生成）
+-- PROMPTS: 1文で生成したプロンプト数
+-- PROMPT_TOKENS / OUTPUT_TOKENS: cortex.estimate_tokens() による推定値（請求額そのものではない）
+
+CREATE TABLE IF NOT EXISTS DIESELPJ_GEN.DATA_CATALOG.CORTEX_USAGE_LOG (
+    LOGGED_AT TIMESTAMP_NTZ,
+    SOURCE VARCHAR(255),
+    TARGET VARCHAR(1000),
+    KIND VARCHAR(20),
+    MODEL VARCHAR(255),
+    PROMPTS NUMBER,
+    PROMPT_TOKENS NUMBER,
+    OUTPUT_TOKENS NUMBER
+);
+
+-- 確認用クエリ: テーブルごとの推定トークン数（直近30日、多い順）
+SELECT
+    TARGET,
+    SOURCE,
+    COUNT(*) AS REQUESTS,
+    SUM(PROMPTS) AS PROMPTS,
+    SUM(PROMPT_TOKENS) AS PROMPT_TOKENS,
+    SUM(OUTPUT_TOKENS) AS OUTPUT_TOKENS,
+    SUM(PROMPT_TOKENS + OUTPUT_TOKENS) AS TOTAL_TOKENS
+FROM DIESELPJ_GEN.DATA_CATALOG.CORTEX_USAGE_LOG
+WHERE LOGGED_AT >= DATEADD(DAY, -30, CURRENT_TIMESTAMP()::TIMESTAMP_NTZ)
+GROUP BY TARGET, SOURCE
+ORDER BY TOTAL_TOKENS DESC;
+
+-- 日ごとの推定トークン数
+-- SELECT DATE_TRUNC(DAY, LOGGED_AT) AS DAY, SOURCE, SUM(PROMPT_TOKENS + OUTPUT_TOKENS) AS TOTAL_TOKENS
+-- FROM DIESELPJ_GEN.DATA_CATALOG.CORTEX_USAGE_LOG
+-- GROUP BY DAY, SOURCE
+-- ORDER BY DAY DESC, SOURCE;
+
+-- 古い記録（180日以上前）を削除
+-- DELETE FROM DIESELPJ_GEN.DATA_CATALOG.CORTEX_USAGE_LOG
+-- WHERE LOGGED_AT < DATEADD(DAY, -180, CURRENT_TIMESTAMP()::TIMESTAMP_NTZ);
@@ -0,0 +1,23 @@
+-- Cortex LLM応答キャッシュ（永続層）
+-- テーブル検索アプリのAI検索で、同じ質問へのキーワード抽出結果を再利用する
+
+-- CACHE_KEY: 正規化したクエリ文・モデル名・プロンプトバージョンのSHA-256
+-- CREATED_AT: 作成（更新）日時。アプリ側のTTLを過ぎた行は参照されない
+
+CREATE TABLE IF NOT EXISTS DIESELPJ_GEN.DATA_CATALOG.LLM_CACHE (
+    CACHE_KEY VARCHAR(64),
+    MODEL VARCHAR(255),
+    PROMPT_VERSION VARCHAR(50),
+    QUERY_TEXT VARCHAR,
+    RESPONSE VARCHAR,
+    CREATED_AT TIMESTAMP_NTZ
+);
+
+-- 確認用クエリ
+SELECT MODEL, PROMPT_VERSION, COUNT(*) AS ENTRIES, MAX(CREATED_AT) AS LAST_CREATED
+FROM DIESELPJ_GEN.DATA_CATALOG.LLM_CACHE
+GROUP BY MODEL, PROMPT_VERSION;
+
+-- 期限切れ（7日以上前）のエントリを削除
+-- DELETE FROM DIESELPJ_GEN.DATA_CATALOG.LLM_CACHE
+-- WHERE CREATED_AT < DATEADD(DAY, -7, CURRENT_TIMESTAMP()::TIMESTAMP_NTZ);
@@ -0,0 +1,45 @@
+-- クエリ計測ログ（任意）
+-- 環境変数 CATALOG_QUERY_LOG=1 のとき、各アプリが発行したクエリを query_log.py が書き込む
+
+-- PAGE: アプリ名 / SECTION: 画面上の区画
+-- STATEMENT_HASH: 空白を正規化したSQL文のSHA-256先頭16桁（同じ文の集計キー）
+-- QUERY_ID: Snowflakeのクエリ ID（QUERY_HISTORY と結合して消費クレジットを確認できる）
+-- ELAPSED_MS: アプリ側で計測した所要時間（ミリ秒）
+
+CREATE TABLE IF NOT EXISTS DIESELPJ_GEN.DATA_CATALOG.QUERY_LOG (
+    LOGGED_AT TIMESTAMP_NTZ,
+    PAGE VARCHAR(255),
+    SECTION VARCHAR(255),
+    STATEMENT_HASH VARCHAR(16),
+    STATEMENT_TEXT VARCHAR,
+    QUERY_ID VARCHAR(255),
+    ROW_COUNT NUMBER,
+    ELAPSED_MS FLOAT,
+    ERROR VARCHAR
+);
+
+-- 確認用クエリ: 画面・区画・文ごとの回数と所要時間（直近7日）
+SELECT
+    PAGE,
+    SECTION,
+    STATEMENT_HASH,
+    ANY_VALUE(LEFT(STATEMENT_TEXT, 200)) AS STATEMENT_TEXT,
+    COUNT(*) AS CALLS,
+    SUM(ELAPSED_MS) AS TOTAL_MS,
+    AVG(ELAPSED_MS) AS AVG_MS,
+    SUM(ROW_COUNT) AS TOTAL_ROWS
+FROM DIESELPJ_GEN.DATA_CATALOG.QUERY_LOG
+WHERE LOGGED_AT >= DATEADD(DAY, -7, CURRENT_TIMESTAMP()::TIMESTAMP_NTZ)
+GROUP BY PAGE, SECTION, STATEMENT_HASH
+ORDER BY TOTAL_MS DESC;
+
+-- ウェアハウス負荷との突き合わせ（QUERY_HISTORY は最大45分程度遅れて反映される）
+-- SELECT l.PAGE, l.SECTION, SUM(h.TOTAL_ELAPSED_TIME) AS WAREHOUSE_MS, SUM(h.BYTES_SCANNED) AS BYTES_SCANNED
+-- FROM DIESELPJ_GEN.DATA_CATALOG.QUERY_LOG l
+-- JOIN SNOWFLAKE.ACCOUNT_USAGE.QUERY_HISTORY h ON h.QUERY_ID = l.QUERY_ID
+-- GROUP BY l.PAGE, l.SECTION
+-- ORDER BY WAREHOUSE_MS DESC;
+
+-- 古い記録（30日以上前）を削除
+-- DELETE FROM DIESELPJ_GEN.DATA_CATALOG.QUERY_LOG
+-- WHERE LOGGED_AT < DATEADD(DAY, -30, CURRENT_TIMESTAMP()::TIMESTAMP_NTZ);
@@ -1,13 +1,15 @@
 -- 自動取得される項目：
 
 -- DATABASE, SCHEMA, TABLE_NAME: INFORMATION_SCHEMA.TABLESから取得
--- COLUMN_NUM: サブクエリでカラム数をカウント
+-- COLUMN_NUM: ACCOUNT_USAGE.COLUMNSをテーブル単位で1回だけ集計してカウント
 -- RECORD_NUM: ROW_COUNTから取得（概算値）
+-- BYTES: テーブルサイズ（バイト）。RECORD_NUMと同じくINFORMATION_SCHEMA.TABLESから取得
 -- CREATION_DATE: テーブル作成日時
 -- UPDATE_DATE: 最終更新日時
 -- TABLE_COMMENT: テーブルコメント
 -- COLUMN_COMMENT_FLAG: 全カラムにコメントがあるか（1/0）
 -- COLUMN_COMMENT: 全カラムのコメントをJSON形式で格納
+-- DELETED_DATE: 削除されたテーブルを検出した日時（差分同期で設定、存在するテーブルはNULL）
 -- 手動で後から追加する項目：
 
 -- OWNER, SUB_OWNER, PUBLISH, SCOPE, APPLICATION_PROJECT, COMMENT: 初期値NULL
@@ -21,6 +23,7 @@ CREATE OR REPLACE TABLE DIESELPJ_GEN.DATA_CATALOG.TABLE_INFO (
     CLASSIFICATION VARCHAR(255),
     COLUMN_NUM NUMBER,
     RECORD_NUM NUMBER,
+    BYTES NUMBER, -- テーブルサイズ（バイト）
     CREATION_DATE TIMESTAMP_NTZ,
     UPDATE_DATE TIMESTAMP_NTZ,
     OWNER VARCHAR(255),
@@ -31,9 +34,15 @@ CREATE OR REPLACE TABLE DIESELPJ_GEN.DATA_CATALOG.TABLE_INFO (
     PUBLISH VARCHAR(255),
     SCOPE VARCHAR(255),
     APPLICATION_PROJECT VARCHAR(255),
-    COMMENT VARCHAR(1000)
+    COMMENT VARCHAR(1000),
+    DELETED_DATE TIMESTAMP_NTZ -- 削除検出日時（NULL = 存在するテーブル）
 );
 
+-- 既存のTABLE_INFOに削除検出日時カラムを追加する場合
+-- ALTER TABLE DIESELPJ_GEN.DATA_CATALOG.TABLE_INFO ADD COLUMN IF NOT EXISTS DELETED_DATE TIMESTAMP_NTZ;
+-- 既存のTABLE_INFOにテーブルサイズカラムを追加する場合
+-- ALTER TABLE DIESELPJ_GEN.DATA_CATALOG.TABLE_INFO ADD COLUMN IF NOT EXISTS BYTES NUMBER;
+
 -- Snowflakeのメタデータから情報を取得して挿入
 -- ACCOUNT_USAGEを使用してアカウント内の全データベースの情報を取得
 INSERT INTO DIESELPJ_GEN.DATA_CATALOG.TABLE_INFO (
@@ -55,18 +64,30 @@ INSERT INTO DIESELPJ_GEN.DATA_CATALOG.TABLE_INFO (
     APPLICATION_PROJECT,
     COMMENT
 )
+WITH COLUMN_STATS AS (
+    -- ACCOUNT_USAGE.COLUMNSを(データベース, スキーマ, テーブル)単位で1回だけ集計
+    SELECT
+        c.TABLE_CATALOG,
+        c.TABLE_SCHEMA,
+        c.TABLE_NAME,
+        COUNT(*) AS COLUMN_NUM,
+        -- カラムコメントをJSON形式で取得（手動でJSONを構築）
+        '[' || LISTAGG(
+            '{"column":"' || c.COLUMN_NAME || '","comment":"' || REPLACE(IFNULL(c.COMMENT, ''), '"', '\\"') || '"}',
+            ','
+        ) WITHIN GROUP (ORDER BY c.ORDINAL_POSITION) || ']' AS COLUMN_COMMENT,
+        -- コメントのないカラム数
+        COUNT_IF(c.COMMENT IS NULL OR LENGTH(TRIM(c.COMMENT)) = 0) AS NO_COMMENT_NUM
+    FROM SNOWFLAKE.ACCOUNT_USAGE.COLUMNS c
+    WHERE c.DELETED IS NULL
+    GROUP BY c.TABLE_CATALOG, c.TABLE_SCHEMA, c.TABLE_NAME
+)
 SELECT 
     t.TABLE_NAME,
     CONCAT(t.TABLE_CATALOG, '.', t.TABLE_SCHEMA) AS LOCATION,
     'DIESELPJ' AS ACCOUNT,
     'SNOWFLAKE' AS CLASSIFICATION,
-    -- カラム数を取得
-    (SELECT COUNT(*) 
-     FROM SNOWFLAKE.ACCOUNT_USAGE.COLUMNS c 
-     WHERE c.TABLE_CATALOG = t.TABLE_CATALOG 
-       AND c.TABLE_SCHEMA = t.TABLE_SCHEMA 
-       AND c.TABLE_NAME = t.TABLE_NAME
-       AND c.DELETED IS NULL) AS COLUMN_NUM,
+    COALESCE(cs.COLUMN_NUM, 0) AS COLUMN_NUM,
     -- レコード数を取得（注: ACCOUNT_USAGEではROW_COUNTは利用できないため、別途取得が必要）
     NULL AS RECORD_NUM,
     t.CREATED AS CREATION_DATE,
@@ -75,39 +96,20 @@ SELECT
     NULL AS SUB_OWNER,
     -- テーブルコメントを取得
     t.COMMENT AS TABLE_COMMENT,
-    -- カラムコメントをJSON形式で取得（手動でJSONを構築）
-    (SELECT '[' || LISTAGG(
-         '{"column":"' || c.COLUMN_NAME || '","comment":"' || REPLACE(IFNULL(c.COMMENT, ''), '"', '\\"') || '"}',
-         ','
-     ) || ']'
-     FROM (
-         SELECT c.COLUMN_NAME, c.COMMENT
-         FROM SNOWFLAKE.ACCOUNT_USAGE.COLUMNS c
-         WHERE c.TABLE_CATALOG = t.TABLE_CATALOG
-           AND c.TABLE_SCHEMA = t.TABLE_SCHEMA
-           AND c.TABLE_NAME = t.TABLE_NAME
-           AND c.DELETED IS NULL
-         ORDER BY c.ORDINAL_POSITION
-     ) c
-    ) AS COLUMN_COMMENT,
+    -- 有効なカラムが1つもないテーブルは従来どおり NULL
+    cs.COLUMN_COMMENT AS COLUMN_COMMENT,
     -- カラムコメントフラグ（全カラムにコメントがあれば1、なければ0）
-    CASE 
-        WHEN (SELECT COUNT(*) 
-              FROM SNOWFLAKE.ACCOUNT_USAGE.COLUMNS c 
-              WHERE c.TABLE_CATALOG = t.TABLE_CATALOG 
-                AND c.TABLE_SCHEMA = t.TABLE_SCHEMA 
-                AND c.TABLE_NAME = t.TABLE_NAME 
-                AND c.DELETED IS NULL
-                AND (c.COMMENT IS NULL OR LENGTH(TRIM(c.COMMENT)) = 0)) = 0 
-        THEN 1 
-        ELSE 0 
-    END AS COLUMN_COMMENT_FLAG,
+    CASE WHEN COALESCE(cs.NO_COMMENT_NUM, 0) = 0 THEN 1 ELSE 0 END AS COLUMN_COMMENT_FLAG,
     NULL AS PUBLISH,
     NULL AS SCOPE,
     NULL AS APPLICATION_PROJECT,
     NULL AS COMMENT
 FROM 
     SNOWFLAKE.ACCOUNT_USAGE.TABLES t
+    LEFT JOIN COLUMN_STATS cs
+      ON cs.TABLE_CATALOG = t.TABLE_CATALOG
+     AND cs.TABLE_SCHEMA = t.TABLE_SCHEMA
+     AND cs.TABLE_NAME = t.TABLE_NAME
 WHERE 
     t.TABLE_TYPE = 'BASE TABLE'
     AND t.DELETED IS NULL
@@ -121,55 +123,47 @@ SELECT * FROM DIESELPJ_GEN.DATA_CATALOG.TABLE_INFO WHERE TABLE_NAME='BILLING_CLE
 
 -- ============================================
 -- 既存データを更新するクエリ（自動取得項目のみ更新）
+-- Pythonからは table_info_refresh.refresh_table_info(session) で同じMERGEを実行できる
 -- ============================================
 MERGE INTO DIESELPJ_GEN.DATA_CATALOG.TABLE_INFO AS target
 USING (
+    WITH COLUMN_STATS AS (
+        -- ACCOUNT_USAGE.COLUMNSをテーブル単位で1回だけ集計（相関サブクエリを使わない）
+        SELECT
+            c.TABLE_CATALOG,
+            c.TABLE_SCHEMA,
+            c.TABLE_NAME,
+            COUNT(*) AS COLUMN_NUM,
+            '[' || LISTAGG(
+                '{"column":"' || c.COLUMN_NAME || '","comment":"' || REPLACE(IFNULL(c.COMMENT, ''), '"', '\\"') || '"}',
+                ','
+            ) WITHIN GROUP (ORDER BY c.ORDINAL_POSITION) || ']' AS COLUMN_COMMENT,
+            COUNT_IF(c.COMMENT IS NULL OR LENGTH(TRIM(c.COMMENT)) = 0) AS NO_COMMENT_NUM
+        FROM SNOWFLAKE.ACCOUNT_USAGE.COLUMNS c
+        WHERE c.DELETED IS NULL
+        GROUP BY c.TABLE_CATALOG, c.TABLE_SCHEMA, c.TABLE_NAME
+    )
     SELECT 
         t.TABLE_NAME,
         CONCAT(t.TABLE_CATALOG, '.', t.TABLE_SCHEMA) AS LOCATION,
         'DIESELPJ' AS ACCOUNT,
         'SNOWFLAKE' AS CLASSIFICATION,
-        -- カラム数を取得
-        (SELECT COUNT(*) 
-         FROM SNOWFLAKE.ACCOUNT_USAGE.COLUMNS c 
-         WHERE c.TABLE_CATALOG = t.TABLE_CATALOG 
-           AND c.TABLE_SCHEMA = t.TABLE_SCHEMA 
-           AND c.TABLE_NAME = t.TABLE_NAME
-           AND c.DELETED IS NULL) AS COLUMN_NUM,
+        COALESCE(cs.COLUMN_NUM, 0) AS COLUMN_NUM,
         NULL AS RECORD_NUM,
         t.CREATED AS CREATION_DATE,
         t.LAST_ALTERED AS UPDATE_DATE,
         -- テーブルコメントを取得
         t.COMMENT AS TABLE_COMMENT,
-        -- カラムコメントをJSON形式で取得
-        (SELECT '[' || LISTAGG(
-             '{"column":"' || c.COLUMN_NAME || '","comment":"' || REPLACE(IFNULL(c.COMMENT, ''), '"', '\\"') || '"}',
-             ','
-         ) || ']'
-         FROM (
-             SELECT c.COLUMN_NAME, c.COMMENT
-             FROM SNOWFLAKE.ACCOUNT_USAGE.COLUMNS c
-             WHERE c.TABLE_CATALOG = t.TABLE_CATALOG
-               AND c.TABLE_SCHEMA = t.TABLE_SCHEMA
-               AND c.TABLE_NAME = t.TABLE_NAME
-               AND c.DELETED IS NULL
-             ORDER BY c.ORDINAL_POSITION
-         ) c
-        ) AS COLUMN_COMMENT,
+        -- 有効なカラムが1つもないテーブルは従来どおり NULL
+        cs.COLUMN_COMMENT AS COLUMN_COMMENT,
         -- カラムコメントフラグ
-        CASE 
-            WHEN (SELECT COUNT(*) 
-                  FROM SNOWFLAKE.ACCOUNT_USAGE.COLUMNS c 
-                  WHERE c.TABLE_CATALOG = t.TABLE_CATALOG 
-                    AND c.TABLE_SCHEMA = t.TABLE_SCHEMA 
-                    AND c.TABLE_NAME = t.TABLE_NAME 
-                    AND c.DELETED IS NULL
-                    AND (c.COMMENT IS NULL OR LENGTH(TRIM(c.COMMENT)) = 0)) = 0 
-            THEN 1 
-            ELSE 0 
-        END AS COLUMN_COMMENT_FLAG
+        CASE WHEN COALESCE(cs.NO_COMMENT_NUM, 0) = 0 THEN 1 ELSE 0 END AS COLUMN_COMMENT_FLAG
     FROM 
         SNOWFLAKE.ACCOUNT_USAGE.TABLES t
+        LEFT JOIN COLUMN_STATS cs
+          ON cs.TABLE_CATALOG = t.TABLE_CATALOG
+         AND cs.TABLE_SCHEMA = t.TABLE_SCHEMA
+         AND cs.TABLE_NAME = t.TABLE_NAME
     WHERE 
         t.TABLE_TYPE = 'BASE TABLE'
         AND t.DELETED IS NULL
@@ -187,7 +181,8 @@ WHEN MATCHED THEN
         target.UPDATE_DATE = source.UPDATE_DATE,
         target.TABLE_COMMENT = source.TABLE_COMMENT,
         target.COLUMN_COMMENT = source.COLUMN_COMMENT,
-        target.COLUMN_COMMENT_FLAG = source.COLUMN_COMMENT_FLAG
+        target.COLUMN_COMMENT_FLAG = source.COLUMN_COMMENT_FLAG,
+        target.DELETED_DATE = NULL
         -- OWNER, SUB_OWNER, PUBLISH, SCOPE, APPLICATION_PROJECT, COMMENTは更新しない
 WHEN NOT MATCHED THEN
     INSERT (
@@ -229,6 +224,25 @@ WHEN NOT MATCHED THEN
         NULL  -- COMMENT
     );
 
+-- ============================================
+-- 差分同期の状態テーブル
+-- table_info_refresh.sync_table_info() がデータベースごとに LAST_ALTERED の最高水位を保持し、
+-- 次回はそれ以降に変更されたテーブルだけを再計算する。削除されたテーブルの行は
+-- 物理削除せず DELETED_DATE を設定する（アプリはDELETED_DATEがNULLの行のみ表示）。
+-- ============================================
+CREATE TABLE IF NOT EXISTS DIESELPJ_GEN.DATA_CATALOG.TABLE_INFO_SYNC_STATE (
+    DATABASE_NAME VARCHAR(255), -- データベース名（'*' = 全データベース）
+    HIGH_WATER_MARK TIMESTAMP_LTZ, -- 同期済みの最新LAST_ALTERED
+    LAST_RUN_AT TIMESTAMP_LTZ, -- 最終実行日時
+    MODE VARCHAR(20), -- full / incremental
+    ROWS_EXAMINED NUMBER, -- 確認したテーブル数
+    ROWS_CHANGED NUMBER, -- 新規・更新されたテーブル数
+    ROWS_DELETED NUMBER -- 削除フラグを付けたテーブル数
+);
+
+-- 同期状況の確認
+-- SELECT * FROM DIESELPJ_GEN.DATA_CATALOG.TABLE_INFO_SYNC_STATE ORDER BY DATABASE_NAME;
+
 -- ============================================
 -- 複数データベース対応: すべての対象データベースを更新
 -- ============================================
@@ -295,73 +309,137 @@ $$;
 -- CALL DIESELPJ_GEN.DATA_CATALOG.UPDATE_TABLE_INFO_ALL_DATABASES();
 
 -- ============================================
--- レコード数を更新するストアドプロシージャ
+-- 並列更新プロシージャ（Python / Snowpark）
+-- 対象データベースを引数または SHOW DATABASES から決め、上限付きの並列数で
+-- データベースごとに更新する（期限・リトライ付き、結果はデータベース別のVARIANT）
+-- SOURCE:
+--   'REALTIME'（既定）: データベースごとに UPDATE_TABLE_INFO_REALTIME を並列に呼ぶ。
+--                       INFORMATION_SCHEMA を読むため反映遅延がなく、共有データベースも更新できる。
+--                       呼び出し後に INFORMATION_SCHEMA.TABLES にないテーブルの行へ DELETED_DATE を付ける
+--   'ACCOUNT_USAGE'   : ACCOUNT_USAGE から差分同期する。反映が最大数時間遅れ、
+--                       共有（IMPORTED DATABASE）データベースは ACCOUNT_USAGE にないため SKIPPED になる
+-- 事前に以下のファイルをステージに配置する:
+--   PUT file://refresh_orchestrator.py @DIESELPJ_GEN.DATA_CATALOG.CATALOG_CODE AUTO_COMPRESS=FALSE OVERWRITE=TRUE;
+--   PUT file://table_info_refresh.py @DIESELPJ_GEN.DATA_CATALOG.CATALOG_CODE AUTO_COMPRESS=FALSE OVERWRITE=TRUE;
+--   PUT file://catalog.py @DIESELPJ_GEN.DATA_CATALOG.CATALOG_CODE AUTO_COMPRESS=FALSE OVERWRITE=TRUE;
+--   PUT file://sql_utils.py @DIESELPJ_GEN.DATA_CATALOG.CATALOG_CODE AUTO_COMPRESS=FALSE OVERWRITE=TRUE;
+-- ============================================
+CREATE STAGE IF NOT EXISTS DIESELPJ_GEN.DATA_CATALOG.CATALOG_CODE;
+
+CREATE OR REPLACE PROCEDURE DIESELPJ_GEN.DATA_CATALOG.REFRESH_TABLE_INFO_PARALLEL(
+    DATABASES ARRAY DEFAULT ARRAY_CONSTRUCT(), -- 空の場合は SHOW DATABASES から取得
+    MAX_WORKERS NUMBER DEFAULT 4, -- 同時に更新するデータベース数
+    FULL_REFRESH BOOLEAN DEFAULT FALSE, -- TRUEの場合は最高水位を無視して全件同期（ACCOUNT_USAGE のみ）
+    SOURCE VARCHAR DEFAULT 'REALTIME', -- 'REALTIME' または 'ACCOUNT_USAGE'
+    DATABASE_TIMEOUT_SECONDS NUMBER DEFAULT 1800 -- 1データベースあたりの期限（再試行を含む）
+)
+RETURNS VARIANT
+LANGUAGE PYTHON
+RUNTIME_VERSION = '3.11'
+PACKAGES = ('snowflake-snowpark-python')
+IMPORTS = (
+    '@DIESELPJ_GEN.DATA_CATALOG.CATALOG_CODE/refresh_orchestrator.py',
+    '@DIESELPJ_GEN.DATA_CATALOG.CATALOG_CODE/table_info_refresh.py',
+    '@DIESELPJ_GEN.DATA_CATALOG.CATALOG_CODE/catalog.py',
+    '@DIESELPJ_GEN.DATA_CATALOG.CATALOG_CODE/sql_utils.py'
+)
+HANDLER = 'refresh_orchestrator.run'
+EXECUTE AS CALLER;
+
+-- 実行例
+-- CALL DIESELPJ_GEN.DATA_CATALOG.REFRESH_TABLE_INFO_PARALLEL();
+-- CALL DIESELPJ_GEN.DATA_CATALOG.REFRESH_TABLE_INFO_PARALLEL(ARRAY_CONSTRUCT('DIESELPJ_GEN', 'DIESELPJ_QA'), 8);
+-- CALL DIESELPJ_GEN.DATA_CATALOG.REFRESH_TABLE_INFO_PARALLEL(ARRAY_CONSTRUCT(), 8, TRUE, 'ACCOUNT_USAGE');
+
+-- ============================================
+-- レコード数・テーブルサイズを更新するストアドプロシージャ
+-- データベースごとに INFORMATION_SCHEMA.TABLES を1回だけ読み（ROW_COUNT・BYTES）、
+-- 一時テーブルに集めてから1回の MERGE でまとめて反映する。
+-- NULL・0の行だけでなく、値が変わったすべての行（件数が古くなった行）を更新する。
 -- ============================================
 CREATE OR REPLACE PROCEDURE DIESELPJ_GEN.DATA_CATALOG.UPDATE_RECORD_NUM()
 RETURNS VARCHAR
 LANGUAGE JAVASCRIPT
 AS
 $$
-    var update_count = 0;
+    var database_count = 0;
     var error_count = 0;
+    var errors = [];
     
-    // TABLE_INFOから全テーブル情報を取得
-    var get_tables_sql = `
-        SELECT TABLE_NAME, LOCATION
+    // TABLE_INFOに登録されているデータベースを取得
+    var get_databases_sql = `
+        SELECT DISTINCT SPLIT_PART(LOCATION, '.', 1) AS DATABASE_NAME
         FROM DIESELPJ_GEN.DATA_CATALOG.TABLE_INFO
-        WHERE RECORD_NUM IS NULL OR RECORD_NUM = 0
+        WHERE CLASSIFICATION = 'SNOWFLAKE'
+          AND DELETED_DATE IS NULL
+        ORDER BY DATABASE_NAME
     `;
+    var databases = [];
+    var db_result = snowflake.createStatement({sqlText: get_databases_sql}).execute();
+    while (db_result.next()) {
+        databases.push(db_result.getColumnValue(1));
+    }
     
-    var stmt = snowflake.createStatement({sqlText: get_tables_sql});
-    var result = stmt.execute();
+    // データベースごとのROW_COUNT・BYTESを集める一時テーブル
+    snowflake.createStatement({sqlText: `
+        CREATE OR REPLACE TEMPORARY TABLE DIESELPJ_GEN.DATA_CATALOG.TMP_TABLE_SIZE (
+            LOCATION VARCHAR(500),
+            TABLE_NAME VARCHAR(255),
+            ROW_COUNT NUMBER,
+            BYTES NUMBER
+        )
+    `}).execute();
     
-    while (result.next()) {
-        var table_name = result.getColumnValue(1);
-        var location = result.getColumnValue(2);
-        
-        // LOCATIONを分解（DATABASE.SCHEMA）
-        var parts = location.split('.');
-        var db = parts[0];
-        var schema = parts[1];
-        
+    for (var i = 0; i < databases.length; i++) {
+        var db = databases[i];
         try {
-            // 各データベースのINFORMATION_SCHEMAからROW_COUNTを取得
-            var get_row_count_sql = `
-                SELECT ROW_COUNT
-                FROM ${db}.INFORMATION_SCHEMA.TABLES
-                WHERE TABLE_SCHEMA = '${schema}'
-                  AND TABLE_NAME = '${table_name}'
+            // 1データベースにつき1クエリ
+            var collect_sql = `
+                INSERT INTO DIESELPJ_GEN.DATA_CATALOG.TMP_TABLE_SIZE
+                SELECT
+                    CONCAT(TABLE_CATALOG, '.', TABLE_SCHEMA),
+                    TABLE_NAME,
+                    ROW_COUNT,
+                    BYTES
+                FROM "${db.replace(/"/g, '""')}".INFORMATION_SCHEMA.TABLES
+                WHERE TABLE_TYPE = 'BASE TABLE'
+                  AND TABLE_SCHEMA <> 'INFORMATION_SCHEMA'
             `;
-            
-            var row_stmt = snowflake.createStatement({sqlText: get_row_count_sql});
-            var row_result = row_stmt.execute();
-            
-            if (row_result.next()) {
-                var row_count = row_result.getColumnValue(1);
-                
-                // TABLE_INFOを更新
-                var update_sql = `
-                    UPDATE DIESELPJ_GEN.DATA_CATALOG.TABLE_INFO
-                    SET RECORD_NUM = ${row_count}
-                    WHERE TABLE_NAME = '${table_name}'
-                      AND LOCATION = '${location}'
-                `;
-                
-                var update_stmt = snowflake.createStatement({sqlText: update_sql});
-                update_stmt.execute();
-                update_count++;
-            }
+            snowflake.createStatement({sqlText: collect_sql}).execute();
+            database_count++;
         } catch (err) {
             error_count++;
-            // エラーは無視して続行
+            errors.push(db + ': ' + err.message);
         }
     }
     
-    return '更新完了: ' + update_count + '件, エラー: ' + error_count + '件';
+    // 値が変わった行だけを1回のMERGEで更新
+    var merge_sql = `
+        MERGE INTO DIESELPJ_GEN.DATA_CATALOG.TABLE_INFO AS target
+        USING DIESELPJ_GEN.DATA_CATALOG.TMP_TABLE_SIZE AS source
+        ON target.TABLE_NAME = source.TABLE_NAME
+           AND target.LOCATION = source.LOCATION
+        WHEN MATCHED AND (
+              target.RECORD_NUM IS DISTINCT FROM source.ROW_COUNT
+              OR target.BYTES IS DISTINCT FROM source.BYTES
+        ) THEN UPDATE SET
+            target.RECORD_NUM = source.ROW_COUNT,
+            target.BYTES = source.BYTES
+    `;
+    var merge_result = snowflake.createStatement({sqlText: merge_sql}).execute();
+    merge_result.next();
+    var update_count = merge_result.getColumnValue(1);
+    
+    snowflake.createStatement({sqlText: 'DROP TABLE IF EXISTS DIESELPJ_GEN.DATA_CATALOG.TMP_TABLE_SIZE'}).execute();
+    
+    var summary = '更新完了: ' + update_count + '件, 対象DB: ' + database_count + '件, エラー: ' + error_count + '件';
+    if (errors.length > 0) {
+        summary += '\n' + errors.join('\n');
+    }
+    return summary;
 $$;
 
 -- レコード数更新プロシージャを実行
--- 注意: テーブル数が多い場合は時間がかかります
 CALL DIESELPJ_GEN.DATA_CATALOG.UPDATE_RECORD_NUM();
 
 -- ============================================
@@ -369,14 +447,16 @@ CALL DIESELPJ_GEN.DATA_CATALOG.UPDATE_RECORD_NUM();
 -- ============================================
 
 -- タスク1: TABLE_INFOの自動取得項目を更新（全データベース対象）
--- UPDATE_TABLE_INFO_ALL_DATABASESプロシージャで全対象データベースを更新
+-- REFRESH_TABLE_INFO_PARALLELプロシージャでデータベースごとの UPDATE_TABLE_INFO_REALTIME を並列に実行
+-- （削除されたテーブルにはデータベースごとに DELETED_DATE を付ける）
+-- （従来の逐次処理に戻す場合は CALL UPDATE_TABLE_INFO_ALL_DATABASES() に置き換える）
 CREATE OR REPLACE TASK DIESELPJ_GEN.DATA_CATALOG.TASK_UPDATE_TABLE_INFO
     WAREHOUSE = COMPUTE_WH  -- 使用するウェアハウスを指定
     SCHEDULE = 'USING CRON 0 * * * * Asia/Tokyo'  -- 毎時0分に実行
 AS
-CALL DIESELPJ_GEN.DATA_CATALOG.UPDATE_TABLE_INFO_ALL_DATABASES();
+CALL DIESELPJ_GEN.DATA_CATALOG.REFRESH_TABLE_INFO_PARALLEL();
 
--- タスク2: レコード数を更新（タスク1の後に実行）
+-- タスク2: レコード数・テーブルサイズを更新（タスク1の後に実行）
 CREATE OR REPLACE TASK DIESELPJ_GEN.DATA_CATALOG.TASK_UPDATE_RECORD_NUM
     WAREHOUSE = COMPUTE_WH  -- 使用するウェアハウスを指定
     AFTER DIESELPJ_GEN.DATA_CATALOG.TASK_UPDATE_TABLE_INFO  -- タスク1の後に実行
@@ -0,0 +1,90 @@
+# ###
+# データプレビューの取得とキャッシュ
+#
+# - プレビューはユーザーが要求したときだけ取得する（テーブル選択時には取得しない）
+# - Row ごとの as_dict() ではなく Snowpark の to_pandas()（Arrow転送）でDataFrameにする
+# - 結果は (テーブル, UPDATE_DATE, 表示カラム, 件数) ごとにLRUで保持し、
+#   テーブルが更新されるまで同じプレビューを再利用する
+# - 横に広いテーブルは表示カラムを指定して SELECT 対象を絞れる
+# ###
+
+import threading
+from collections import OrderedDict
+
+from sql_utils import quote_identifier, table_path
+
+# プレビューの件数
+PREVIEW_ROWS = 100
+
+# 保持するプレビュー数の上限
+MAX_PREVIEWS = 32
+
+
+def preview_sql(db, schema, table, columns=None, limit=PREVIEW_ROWS):
+    """プレビュー用のSELECT文（columns を指定した場合はそのカラムだけを取得）"""
+    select_list = ", ".join(quote_identifier(column) for column in columns) if columns else "*"
+    return f"SELECT {select_list} FROM {table_path(db, schema, table)} LIMIT {int(limit)}"
+
+
+class PreviewCache:
+    """プレビュー結果（DataFrame）をLRUで保持する"""
+
+    def __init__(self, max_entries=MAX_PREVIEWS):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, session, db, schema, table, update_date=None, columns=None, limit=PREVIEW_ROWS):
+        """プレビューのDataFrameを返す（呼び出し側で変更してもキャッシュに影響しないようコピーを返す）"""
+        key = (db, schema, table, str(update_date), tuple(columns or ()), int(limit))
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key].copy()
+
+        df = session.sql(preview_sql(db, schema, table, columns, limit)).to_pandas()
+
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = df
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return df.copy()
+
+    def invalidate(self, db=None, schema=None, table=None):
+        """指定したテーブル（省略時はすべて）のプレビューを破棄する"""
+        with self._lock:
+            for key in list(self._entries):
+                if (db is None or key[0] == db) and (schema is None or key[1] == schema) \
+                        and (table is None or key[2] == table):
+                    del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'entries': len(self._entries),
+            }
+
+
+# プロセス内で共有するキャッシュ（Streamlitの再実行ではモジュールは再importされない）
+_cache = PreviewCache()
+
+
+def get_preview(session, db, schema, table, update_date=None, columns=None, limit=PREVIEW_ROWS):
+    return _cache.get(session, db, schema, table, update_date, columns, limit)
+
+
+def invalidate_preview(db=None, schema=None, table=None):
+    _cache.invalidate(db, schema, table)
+
+
+def preview_stats():
+    return _cache.stats()
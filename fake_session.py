@@ -0,0 +1,187 @@
+# ###
+# ローカル確認用の Snowpark セッション代替
+#
+# Snowflakeに接続せずにヘルパーモジュールやクエリ計測を動かすためのもの。
+# 登録した (正規表現, 結果) の組み合わせ、または handler(query, params) で結果を返し、
+# 実行したクエリを executed に記録する。
+# 結果の行は Snowpark の Row と同じく row['COL'] / row.COL / row[0] / as_dict() で参照できる。
+#
+# - duckdb_handler(): Snowflake向けのSQLを最小限書き換えてDuckDBで実行する handler
+# - patch_active_session(): get_active_session() が FakeSession を返すようにする
+#   （アプリはimport時にセッションを取得するため、AppTest で動かす前に呼ぶ）
+# ###
+
+import itertools
+import re
+import sys
+import threading
+import types
+
+
+class FakeRow:
+    def __init__(self, values):
+        self._values = dict(values)
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return list(self._values.values())[key]
+        return self._values[key]
+
+    def __getattr__(self, name):
+        try:
+            return self._values[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __len__(self):
+        return len(self._values)
+
+    def __iter__(self):
+        return iter(self._values.values())
+
+    def __repr__(self):
+        return f"Row({', '.join(f'{key}={value!r}' for key, value in self._values.items())})"
+
+    def as_dict(self):
+        return dict(self._values)
+
+
+class FakeQueryRecord:
+    def __init__(self, query_id, sql_text):
+        self.query_id = query_id
+        self.sql_text = sql_text
+
+
+class FakeQueryHistory:
+    """session.query_history() と同じく、with の中で実行したクエリを queries に集める"""
+
+    def __init__(self, session):
+        self._session = session
+        self.queries = []
+
+    def __enter__(self):
+        with self._session._lock:
+            self._session._listeners.append(self)
+        return self
+
+    def __exit__(self, *exc):
+        with self._session._lock:
+            self._session._listeners.remove(self)
+        return False
+
+
+class FakeDataFrame:
+    def __init__(self, session, query, params):
+        self._session = session
+        self._query = query
+        self._params = params
+
+    def _rows(self):
+        return [row if isinstance(row, FakeRow) else FakeRow(row)
+                for row in self._session._execute(self._query, self._params)]
+
+    def collect(self, statement_params=None):
+        return self._rows()
+
+    def to_pandas(self, statement_params=None):
+        import pandas as pd
+
+        rows = self._rows()
+        return pd.DataFrame([row.as_dict() for row in rows])
+
+    def to_pandas_batches(self, statement_params=None, batch_size=10000):
+        import pandas as pd
+
+        rows = self._rows()
+        for start in range(0, len(rows), batch_size):
+            yield pd.DataFrame([row.as_dict() for row in rows[start:start + batch_size]])
+
+
+class FakeSession:
+    """Snowpark の Session の代わりに使う（sql / query_history / session_id のみ）
+
+    responses: [(正規表現, 行のリスト または callable(query, params))] 先に一致したものを使う
+    handler: どれにも一致しなかったときに handler(query, params) を呼ぶ（省略時は空の結果）
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, responses=None, handler=None):
+        self.session_id = next(self._ids)
+        self.responses = [(re.compile(pattern, re.IGNORECASE | re.DOTALL), result)
+                          for pattern, result in (responses or [])]
+        self.handler = handler
+        self.executed = []
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._query_ids = itertools.count(1)
+
+    def sql(self, query, params=None):
+        return FakeDataFrame(self, query, params)
+
+    def query_history(self):
+        return FakeQueryHistory(self)
+
+    def _execute(self, query, params):
+        with self._lock:
+            query_id = f"fake-{self.session_id}-{next(self._query_ids)}"
+            self.executed.append((query, params))
+            for listener in self._listeners:
+                listener.queries.append(FakeQueryRecord(query_id, query))
+
+        for pattern, result in self.responses:
+            if pattern.search(query):
+                return result(query, params) if callable(result) else result
+        if self.handler is not None:
+            return self.handler(query, params)
+        return []
+
+
+def to_duckdb_sql(query):
+    """Snowflake固有の構文をDuckDBで実行できる形に書き換える（このリポジトリで使う範囲のみ）"""
+    # FROM VALUES (...), (...) → FROM (VALUES (...), (...))、column1 → col0
+    query = re.sub(r"FROM VALUES\s+((?:\([^()]*\)\s*,?\s*)+)", r"FROM (VALUES \1) ", query)
+    query = re.sub(r"\bcolumn(\d+)\b", lambda m: f"col{int(m.group(1)) - 1}", query)
+    # Snowflake の文字列リテラルではバックスラッシュを重ねる（DuckDBは1文字のまま扱う）
+    query = query.replace("ESCAPE '\\\\'", "ESCAPE '\\'")
+    # MERGE の UPDATE SET では更新先カラムを修飾できない
+    query = re.sub(
+        r"(UPDATE SET)(.*)$",
+        lambda m: m.group(1) + re.sub(r"\btarget\.", "", m.group(2)),
+        query,
+        flags=re.DOTALL,
+    )
+    return query
+
+
+def duckdb_handler(connection):
+    """FakeSession の handler として使う。結果はカラム名をキーにした dict のリストで返す"""
+    lock = threading.Lock()
+
+    def handler(query, params):
+        with lock:
+            cursor = connection.execute(to_duckdb_sql(query), params or [])
+            if cursor.description is None:
+                return []
+            names = [column[0] for column in cursor.description]
+            return [dict(zip(names, values)) for values in cursor.fetchall()]
+
+    return handler
+
+
+def patch_active_session(session):
+    """snowflake.snowpark.context.get_active_session() が session を返すようにする
+
+    Snowpark が入っていない環境では、get_active_session だけを持つモジュールを登録する。
+    """
+    try:
+        import snowflake.snowpark.context as context
+    except ImportError:
+        context = types.ModuleType("snowflake.snowpark.context")
+        for name in ("snowflake", "snowflake.snowpark"):
+            sys.modules.setdefault(name, types.ModuleType(name))
+        sys.modules["snowflake.snowpark.context"] = context
+        sys.modules["snowflake.snowpark"].context = context
+        sys.modules["snowflake"].snowpark = sys.modules["snowflake.snowpark"]
+    context.get_active_session = lambda: session
+    return session
@@ -0,0 +1,220 @@
+# ###
+# Cortex LLM応答キャッシュ
+#
+# - キー: 正規化したクエリ文・モデル名・プロンプトバージョン
+# - メモリ層: LRU + TTL
+# - 永続層（任意）: Snowflakeテーブル LLM_CACHE（アプリ再起動後も有効）
+#   セッションは呼び出しごとに渡す（共有キャッシュに特定のセッションを保持しない）。
+#   永続層でエラーが起きた場合は一定時間メモリ層のみで動作し、その後また永続層を試す
+# - ヒット/ミス件数と、節約できたCortex呼び出し回数・推定トークン数を集計する
+# ###
+
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from cortex import estimate_tokens
+from sql_utils import escape_literal
+
+# 永続層のテーブル（create_llm_cache.sql で作成）
+LLM_CACHE_TABLE = "DIESELPJ_GEN.DATA_CATALOG.LLM_CACHE"
+
+# キャッシュの有効期限（秒）
+LLM_CACHE_TTL_SECONDS = 7 * 24 * 3600
+
+# メモリ層の最大件数
+LLM_CACHE_MAX_ENTRIES = 1000
+
+# 永続層でエラーが起きたときに、永続層を使わずに待つ時間（秒）
+PERSISTENT_RETRY_SECONDS = 300
+
+
+def normalize_query(text):
+    """全角半角・大文字小文字・空白の違いを吸収したクエリ文"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def cache_key(query, model, prompt_version):
+    payload = "\x1f".join([model, prompt_version, normalize_query(query)])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SnowflakeCacheTier:
+    """LLM_CACHEテーブルを使う永続層（セッションは呼び出しごとに受け取る）"""
+
+    def __init__(self, table=LLM_CACHE_TABLE):
+        self.table = table
+
+    def get(self, session, key, ttl_seconds):
+        result = session.sql(f"""
+            SELECT RESPONSE
+            FROM {self.table}
+            WHERE CACHE_KEY = '{key}'
+              AND CREATED_AT >= DATEADD(SECOND, -{int(ttl_seconds)}, CURRENT_TIMESTAMP()::TIMESTAMP_NTZ)
+        """).collect()
+        return result[0]['RESPONSE'] if result else None
+
+    def put(self, session, key, query, model, prompt_version, response):
+        session.sql(f"""
+            MERGE INTO {self.table} AS target
+            USING (
+                SELECT
+                    '{key}' AS CACHE_KEY,
+                    '{escape_literal(model)}' AS MODEL,
+                    '{escape_literal(prompt_version)}' AS PROMPT_VERSION,
+                    '{escape_literal(normalize_query(query))}' AS QUERY_TEXT,
+                    '{escape_literal(response)}' AS RESPONSE
+            ) AS source
+            ON target.CACHE_KEY = source.CACHE_KEY
+            WHEN MATCHED THEN
+                UPDATE SET
+                    target.RESPONSE = source.RESPONSE,
+                    target.CREATED_AT = CURRENT_TIMESTAMP()::TIMESTAMP_NTZ
+            WHEN NOT MATCHED THEN
+                INSERT (CACHE_KEY, MODEL, PROMPT_VERSION, QUERY_TEXT, RESPONSE, CREATED_AT)
+                VALUES (source.CACHE_KEY, source.MODEL, source.PROMPT_VERSION, source.QUERY_TEXT,
+                        source.RESPONSE, CURRENT_TIMESTAMP()::TIMESTAMP_NTZ)
+        """).collect()
+
+
+class LLMCache:
+    """LRU + TTL のメモリ層と任意の永続層からなるLLM応答キャッシュ"""
+
+    def __init__(self, ttl_seconds=LLM_CACHE_TTL_SECONDS, max_entries=LLM_CACHE_MAX_ENTRIES,
+                 persistent=None, retry_seconds=PERSISTENT_RETRY_SECONDS, clock=time.time):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.persistent = persistent
+        self.retry_seconds = retry_seconds
+        # 永続層を再び試す時刻（エラー後の待機中のみ設定）
+        self._persistent_retry_at = None
+        self._clock = clock
+        self._lock = threading.Lock()
+        # key -> (作成時刻, 応答, 推定トークン数)
+        self._entries = OrderedDict()
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.saved_tokens = 0
+        self.persistent_errors = 0
+
+    def _get_memory(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self._clock() - entry[0] > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def _put_memory(self, key, response, tokens):
+        with self._lock:
+            self._entries[key] = (self._clock(), response, tokens)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _persistent_tier(self, session):
+        """今回の呼び出しで使う永続層（セッションがない・エラー後の待機中は None）"""
+        if self.persistent is None or session is None:
+            return None
+        with self._lock:
+            if self._persistent_retry_at is not None and self._clock() < self._persistent_retry_at:
+                return None
+            return self.persistent
+
+    def _persistent_failed(self):
+        # ウェアハウスの停止・タイムアウト・テーブル未作成などの場合は、一定時間メモリ層のみで動作する
+        with self._lock:
+            self.persistent_errors += 1
+            self._persistent_retry_at = self._clock() + self.retry_seconds
+
+    def get_or_compute(self, query, model, prompt_version, compute, prompt=None, session=None):
+        """キャッシュにあればそれを返し、なければ compute() を呼んで結果を保存する
+
+        session: 永続層の読み書きに使うセッション（省略時はメモリ層のみ）
+        """
+        key = cache_key(query, model, prompt_version)
+
+        entry = self._get_memory(key)
+        if entry is not None:
+            with self._lock:
+                self.memory_hits += 1
+                self.saved_tokens += entry[2]
+            return entry[1]
+
+        persistent = self._persistent_tier(session)
+        if persistent is not None:
+            try:
+                response = persistent.get(session, key, self.ttl_seconds)
+            except Exception:
+                response = None
+                persistent = None
+                self._persistent_failed()
+            if response is not None:
+                tokens = estimate_tokens(prompt or query) + estimate_tokens(response)
+                self._put_memory(key, response, tokens)
+                with self._lock:
+                    self.persistent_hits += 1
+                    self.saved_tokens += tokens
+                return response
+
+        response = compute()
+        with self._lock:
+            self.misses += 1
+        self._put_memory(key, response, estimate_tokens(prompt or query) + estimate_tokens(response))
+        persistent = self._persistent_tier(session)
+        if persistent is not None:
+            try:
+                persistent.put(session, key, query, model, prompt_version, response)
+            except Exception:
+                self._persistent_failed()
+        return response
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            hits = self.memory_hits + self.persistent_hits
+            total = hits + self.misses
+            return {
+                'memory_hits': self.memory_hits,
+                'persistent_hits': self.persistent_hits,
+                'misses': self.misses,
+                'hit_rate': hits / total if total else 0.0,
+                'saved_calls': hits,
+                'saved_tokens': self.saved_tokens,
+                'entries': len(self._entries),
+                'persistent_errors': self.persistent_errors,
+            }
+
+
+# プロセス内で共有するキャッシュ
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache(persistent=True):
+    """共有キャッシュを返す（永続層は get_or_compute() に session を渡したときに使う）"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache(persistent=SnowflakeCacheTier() if persistent else None)
+        return _cache
+
+
+def format_stats(stats):
+    """画面表示用の1行サマリ"""
+    return (
+        f"Cortexキャッシュ: ヒット率 {stats['hit_rate'] * 100:.0f}% "
+        f"(メモリ {stats['memory_hits']} / 永続 {stats['persistent_hits']} / ミス {stats['misses']}) ・ "
+        f"節約 {stats['saved_calls']}回・約{stats['saved_tokens']:,}トークン"
+    )
@@ -0,0 +1,317 @@
+# ###
+# クエリ計測
+#
+# 各アプリは session.sql(...).collect() を直接呼んでいるため、どの操作がウェアハウスの
+# 負荷になっているかが分からなかった。get_active_session() の戻り値を instrument_session() で
+# 包むと、以降の session.sql(...) の collect() / to_pandas() / to_pandas_batches() ごとに
+# - 文のハッシュ（空白を正規化したSQLのSHA-256先頭16桁）
+# - ページ（アプリ）とセクション（session.set_section() で指定）
+# - 所要時間・件数・クエリID・エラー
+# を記録する。ヘルパーモジュールには包んだ session をそのまま渡せばよい。
+#
+# - 記録は再実行（rerun）ごとの QueryRecorder に溜め、デバッグ時は render_debug_panel() で
+#   サイドバーに一覧表示する（4つのアプリ共通）
+# - 環境変数 CATALOG_QUERY_LOG=1 のときは QUERY_LOG テーブル（create_query_log.sql）にも書き込む
+# - fake_session.FakeSession を包めばSnowflakeなしで動作を確認できる
+# ###
+
+import hashlib
+import os
+import re
+import threading
+import time
+from datetime import datetime
+
+# 書き込み先のテーブル（create_query_log.sql で作成）
+QUERY_LOG_TABLE = "DIESELPJ_GEN.DATA_CATALOG.QUERY_LOG"
+
+# QUERY_LOG への書き込みを有効にする環境変数
+QUERY_LOG_ENV = "CATALOG_QUERY_LOG"
+
+# 計測パネルを常に表示する環境変数（URLの ?debug=1 でも表示する）
+QUERY_DEBUG_ENV = "CATALOG_QUERY_DEBUG"
+
+# QUERY_LOG へまとめて書き込む件数
+QUERY_LOG_BATCH_SIZE = 50
+
+QUERY_LOG_COLUMNS = [
+    "LOGGED_AT", "PAGE", "SECTION", "STATEMENT_HASH", "STATEMENT_TEXT",
+    "QUERY_ID", "ROW_COUNT", "ELAPSED_MS", "ERROR",
+]
+
+# QUERY_LOG に保存するSQLの最大長
+STATEMENT_TEXT_MAX_LENGTH = 2000
+
+
+def statement_hash(query):
+    """空白の違いを無視したSQL文のハッシュ（同じ文を集計するためのキー）"""
+    normalized = re.sub(r"\s+", " ", query or "").strip()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+def _flag_enabled(value):
+    return str(value or "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def query_debug_enabled(query_param=None):
+    """計測パネルを表示するか（URLパラメータ debug または環境変数）"""
+    return _flag_enabled(query_param) or _flag_enabled(os.environ.get(QUERY_DEBUG_ENV))
+
+
+def query_log_enabled():
+    return _flag_enabled(os.environ.get(QUERY_LOG_ENV))
+
+
+class QueryRecorder:
+    """1回の再実行で発行したクエリの記録"""
+
+    def __init__(self, page, sink=None):
+        self.page = page
+        self.section = None
+        self.sink = sink
+        self._lock = threading.Lock()
+        self.records = []
+
+    def record(self, query, seconds, rows, query_id=None, error=None):
+        record = {
+            'LOGGED_AT': datetime.now(),
+            'PAGE': self.page,
+            'SECTION': self.section,
+            'STATEMENT_HASH': statement_hash(query),
+            'STATEMENT_TEXT': re.sub(r"\s+", " ", query or "").strip(),
+            'QUERY_ID': query_id,
+            'ROW_COUNT': rows,
+            'ELAPSED_MS': round(seconds * 1000, 1),
+            'ERROR': error,
+        }
+        with self._lock:
+            self.records.append(record)
+        if self.sink is not None:
+            self.sink.add(record)
+        return record
+
+    def summary(self):
+        with self._lock:
+            return {
+                'queries': len(self.records),
+                'seconds': sum(record['ELAPSED_MS'] for record in self.records) / 1000,
+                'rows': sum(record['ROW_COUNT'] or 0 for record in self.records),
+                'errors': sum(1 for record in self.records if record['ERROR']),
+            }
+
+    def by_statement(self):
+        """文のハッシュごとの回数・合計時間（時間の長い順）"""
+        groups = {}
+        with self._lock:
+            for record in self.records:
+                group = groups.setdefault(record['STATEMENT_HASH'], {
+                    'STATEMENT_HASH': record['STATEMENT_HASH'],
+                    'SECTION': record['SECTION'],
+                    'STATEMENT_TEXT': record['STATEMENT_TEXT'][:200],
+                    'CALLS': 0,
+                    'ELAPSED_MS': 0.0,
+                    'ROW_COUNT': 0,
+                })
+                group['CALLS'] += 1
+                group['ELAPSED_MS'] += record['ELAPSED_MS']
+                group['ROW_COUNT'] += record['ROW_COUNT'] or 0
+        return sorted(groups.values(), key=lambda group: group['ELAPSED_MS'], reverse=True)
+
+    def finish(self):
+        """再実行の終わりに呼ぶ（書き込み待ちの記録を QUERY_LOG へ送る）"""
+        if self.sink is not None:
+            self.sink.flush()
+
+
+class QueryLogSink:
+    """記録をバッファし、まとめて QUERY_LOG に INSERT する
+
+    st.rerun() / st.stop() で finish() まで到達しなかった記録も、次回以降の書き込みで送られる。
+    """
+
+    def __init__(self, session, table=QUERY_LOG_TABLE, batch_size=QUERY_LOG_BATCH_SIZE):
+        # 計測対象にならないよう、包む前の session で書き込む
+        self.session = session
+        self.table = table
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._pending = []
+        self.written = 0
+        self.errors = 0
+
+    def add(self, record):
+        with self._lock:
+            self._pending.append(record)
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            records, self._pending = self._pending, []
+        if not records:
+            return
+        placeholders = ", ".join(["(" + ", ".join(["?"] * len(QUERY_LOG_COLUMNS)) + ")"] * len(records))
+        params = []
+        for record in records:
+            for column in QUERY_LOG_COLUMNS:
+                value = record[column]
+                if column == 'LOGGED_AT':
+                    value = value.isoformat(sep=" ")
+                elif column == 'STATEMENT_TEXT':
+                    value = value[:STATEMENT_TEXT_MAX_LENGTH]
+                params.append(value)
+        try:
+            self.session.sql(f"""
+                INSERT INTO {self.table} ({", ".join(QUERY_LOG_COLUMNS)})
+                VALUES {placeholders}
+            """, params=params).collect()
+            self.written += len(records)
+        except Exception:
+            # テーブル未作成・権限不足でも画面の処理は止めない
+            self.errors += 1
+
+
+# プロセス内で共有する書き込みバッファ
+_sink = None
+_sink_lock = threading.Lock()
+
+
+def get_query_log_sink(session):
+    global _sink
+    with _sink_lock:
+        if _sink is None:
+            _sink = QueryLogSink(session)
+        else:
+            _sink.session = session
+        return _sink
+
+
+def _last_query_id(history, query):
+    # 並行実行で他のクエリが混ざることがあるため、SQL文が一致する最後のクエリを探す
+    if history is None:
+        return None
+    queries = list(getattr(history, "queries", []) or [])
+    for record in reversed(queries):
+        if getattr(record, "sql_text", None) == query:
+            return record.query_id
+    return queries[-1].query_id if queries else None
+
+
+class InstrumentedDataFrame:
+    """session.sql() の結果。実行系のメソッドだけを計測し、それ以外は元のDataFrameに委ねる"""
+
+    def __init__(self, dataframe, session, recorder, query):
+        self._dataframe = dataframe
+        self._session = session
+        self._recorder = recorder
+        self._query = query
+
+    def __getattr__(self, name):
+        return getattr(self._dataframe, name)
+
+    def _history(self):
+        query_history = getattr(self._session, "query_history", None)
+        return query_history() if query_history else None
+
+    def _run(self, method, count, *args, **kwargs):
+        history = self._history()
+        started = time.perf_counter()
+        try:
+            if history is not None:
+                with history:
+                    result = getattr(self._dataframe, method)(*args, **kwargs)
+            else:
+                result = getattr(self._dataframe, method)(*args, **kwargs)
+        except Exception as e:
+            self._recorder.record(self._query, time.perf_counter() - started, None,
+                                  _last_query_id(history, self._query), str(e))
+            raise
+        self._recorder.record(self._query, time.perf_counter() - started, count(result),
+                              _last_query_id(history, self._query))
+        return result
+
+    def collect(self, *args, **kwargs):
+        return self._run("collect", len, *args, **kwargs)
+
+    def to_pandas(self, *args, **kwargs):
+        return self._run("to_pandas", len, *args, **kwargs)
+
+    def to_pandas_batches(self, *args, **kwargs):
+        """バッチを読み終えた時点で1件として記録する（所要時間は呼び出し側の処理時間を含む）"""
+        started = time.perf_counter()
+        rows = 0
+        try:
+            for batch in self._dataframe.to_pandas_batches(*args, **kwargs):
+                rows += len(batch)
+                yield batch
+        except Exception as e:
+            self._recorder.record(self._query, time.perf_counter() - started, rows, None, str(e))
+            raise
+        self._recorder.record(self._query, time.perf_counter() - started, rows)
+
+
+class InstrumentedSession:
+    """Snowpark の Session を包み、session.sql() の実行を QueryRecorder に記録する"""
+
+    def __init__(self, session, recorder):
+        self._session = session
+        self.recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+    @property
+    def unwrapped(self):
+        return self._session
+
+    def sql(self, query, *args, **kwargs):
+        return InstrumentedDataFrame(self._session.sql(query, *args, **kwargs), self._session, self.recorder, query)
+
+    def set_section(self, section):
+        """以降のクエリを記録するセクション名（画面上の区画）"""
+        self.recorder.section = section
+
+
+def instrument_session(session, page, log_to_table=None):
+    """session を計測用に包む。再実行ごとに呼び、新しい QueryRecorder で記録する
+
+    log_to_table: QUERY_LOG に書き込むか（省略時は環境変数 CATALOG_QUERY_LOG）
+    """
+    if isinstance(session, InstrumentedSession):
+        session = session.unwrapped
+    if log_to_table is None:
+        log_to_table = query_log_enabled()
+    sink = get_query_log_sink(session) if log_to_table else None
+    return InstrumentedSession(session, QueryRecorder(page, sink))
+
+
+def render_debug_panel(session, extra=None):
+    """クエリ計測パネルをサイドバーに表示する（URLに ?debug=1 を付けるか、環境変数 CATALOG_QUERY_DEBUG=1 のとき）
+
+    session は instrument_session() で包んだもの。extra() を渡すとパネルの末尾で呼ぶ（アプリ固有の表示用）。
+    """
+    import pandas as pd
+    import streamlit as st
+
+    if not query_debug_enabled(st.query_params.get("debug")):
+        return
+    query_summary = session.recorder.summary()
+    with st.sidebar.expander(
+        f"🛠 クエリ計測: {query_summary['queries']}件 / {query_summary['seconds']:.2f}秒",
+        expanded=True
+    ):
+        st.caption(f"取得行数: {query_summary['rows']:,} / エラー: {query_summary['errors']}件")
+        if session.recorder.records:
+            st.markdown("**文ごとの集計**")
+            st.dataframe(pd.DataFrame(session.recorder.by_statement()), use_container_width=True, hide_index=True)
+            st.markdown("**実行順**")
+            st.dataframe(
+                pd.DataFrame(session.recorder.records)[
+                    ["SECTION", "STATEMENT_HASH", "ELAPSED_MS", "ROW_COUNT", "QUERY_ID", "ERROR"]
+                ],
+                use_container_width=True,
+                hide_index=True
+            )
+        if extra is not None:
+            extra()
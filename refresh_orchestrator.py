@@ -0,0 +1,326 @@
+# ###
+# TABLE_INFO のデータベース別並列更新
+#
+# UPDATE_TABLE_INFO_ALL_DATABASES() はハードコードした16データベースを順番に処理し、
+# 結果を「更新: N件」の文字列から正規表現で集計していた。ここでは
+# - 対象データベースを設定（引数・環境変数）または SHOW DATABASES から取得し
+# - 上限付きのスレッドプールでデータベースごとの更新を並列実行し
+# - データベースごとの期限（再試行を含む）とリトライを適用して
+# - 結果をデータベース別の辞書で返す
+# 更新元（source）は2種類:
+# - REALTIME（既定）: 従来どおり UPDATE_TABLE_INFO_REALTIME(データベース名) を呼ぶ。
+#   データベースごとの INFORMATION_SCHEMA を読むため反映遅延がなく、共有（IMPORTED DATABASE）も更新できる。
+#   プロシージャは削除を反映しないため、呼び出しが成功したら INFORMATION_SCHEMA.TABLES にない
+#   テーブルの行に DELETED_DATE を付ける
+# - ACCOUNT_USAGE: table_info_refresh.sync_table_info() で差分同期する。
+#   ACCOUNT_USAGE は反映が最大数時間遅れ、共有データベースを含まないため、
+#   IMPORTED DATABASE は更新せず STATUS = SKIPPED として返す
+# TABLE_INFO への MERGE 自体は Snowflake のテーブルロックにより順に適用されるが、
+# メタデータの集計はデータベースごとに並行して進む。
+# Snowpark の Python プロシージャ（create_table_info.sql の REFRESH_TABLE_INFO_PARALLEL）
+# からは run() をハンドラとして呼び出す。
+# ###
+
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from table_info_refresh import (
+    DeadlineExceeded,
+    flag_deleted_realtime_sql,
+    format_sync_report,
+    statement_params_until,
+    sync_table_info,
+)
+
+# 更新元
+SOURCE_REALTIME = "REALTIME"
+SOURCE_ACCOUNT_USAGE = "ACCOUNT_USAGE"
+SOURCES = [SOURCE_REALTIME, SOURCE_ACCOUNT_USAGE]
+
+# データベース1つ分を INFORMATION_SCHEMA から更新するプロシージャ（戻り値は「更新: N件, 新規挿入: N件, エラー: N件」）
+REALTIME_PROCEDURE = "DIESELPJ_GEN.DATA_CATALOG.UPDATE_TABLE_INFO_REALTIME"
+REALTIME_RESULT_PATTERN = re.compile(r"更新: (\d+)件, 新規挿入: (\d+)件, エラー: (\d+)件")
+
+# 対象データベースを固定する場合の環境変数（カンマ区切り）
+DATABASES_ENV = "CATALOG_REFRESH_DATABASES"
+
+# SHOW DATABASES から取得したときに対象外にするデータベース
+EXCLUDED_DATABASES = ["SNOWFLAKE_SAMPLE_DATA"]
+
+# 対象にするデータベースの種類（アプリケーションデータベースなどは除く）
+TARGET_DATABASE_KINDS = ["STANDARD", "IMPORTED DATABASE"]
+
+# ACCOUNT_USAGE に現れないデータベースの種類（共有から作成したデータベース）
+IMPORTED_DATABASE_KIND = "IMPORTED DATABASE"
+
+# 同時に更新するデータベース数
+MAX_WORKERS = 4
+
+# 1クエリあたりのタイムアウト（秒）
+STATEMENT_TIMEOUT_SECONDS = 900
+
+# 1データベースあたりの期限（秒）。再試行と待ち時間を含め、この時間を過ぎたら打ち切る
+DATABASE_TIMEOUT_SECONDS = 1800
+
+# 失敗時の再試行回数と待ち時間（秒、試行ごとに倍にする）
+MAX_RETRIES = 2
+RETRY_BACKOFF_SECONDS = 5
+
+# ステートメントタイムアウトのエラーコード
+TIMEOUT_ERROR_CODE = "000630"
+
+
+def database_kinds(session):
+    """SHOW DATABASES の {データベース名: 種類}"""
+    kinds = {}
+    for row in session.sql("SHOW DATABASES").collect():
+        row_dict = row.as_dict()
+        kinds[row_dict['name']] = (row_dict.get('kind') or "STANDARD").upper()
+    return kinds
+
+
+def discover_databases(session, databases=None, kinds=None):
+    """更新対象のデータベース名のリストを返す
+
+    databases（引数）→ 環境変数 CATALOG_REFRESH_DATABASES → SHOW DATABASES の順に決める。
+    kinds（database_kinds() の結果）を渡すと SHOW DATABASES を再実行しない。
+    """
+    if databases:
+        return [name.strip() for name in databases if name and name.strip()]
+
+    configured = os.environ.get(DATABASES_ENV, "")
+    if configured.strip():
+        return [name.strip() for name in configured.split(",") if name.strip()]
+
+    if kinds is None:
+        kinds = database_kinds(session)
+    return sorted(
+        name for name, kind in kinds.items()
+        if kind in TARGET_DATABASE_KINDS and name not in EXCLUDED_DATABASES
+    )
+
+
+def _is_timeout(error):
+    message = str(error)
+    return (isinstance(error, (DeadlineExceeded, TimeoutError))
+            or TIMEOUT_ERROR_CODE in message or "timeout" in message.lower())
+
+
+def parse_realtime_result(message):
+    """UPDATE_TABLE_INFO_REALTIME の戻り値から (更新, 新規挿入, エラー) の件数を取り出す"""
+    match = REALTIME_RESULT_PATTERN.search(message or "")
+    if not match:
+        return None
+    return tuple(int(value) for value in match.groups())
+
+
+def _refresh_realtime(session, database, statement_params):
+    """UPDATE_TABLE_INFO_REALTIME で1データベースを更新し、sync_table_info と同じ形の件数を返す
+
+    statement_params はクエリごとに呼び出して期限までの残り時間を反映する関数。
+    """
+    rows = session.sql(f"CALL {REALTIME_PROCEDURE}(?)", params=[database]).collect(
+        statement_params=statement_params()
+    )
+    message = str(rows[0][0]) if rows else ""
+    counts = parse_realtime_result(message)
+    if counts is None:
+        raise RuntimeError(f"{REALTIME_PROCEDURE} の戻り値を解釈できません: {message}")
+    updated, inserted, errors = counts
+
+    # プロシージャは削除されたテーブルの行を残すため、ここで DELETED_DATE を付ける
+    rows = session.sql(flag_deleted_realtime_sql(database), params=[database]).collect(
+        statement_params=statement_params()
+    )
+    deleted = rows[0][0] if rows else 0
+    return {
+        'mode': "realtime",
+        'examined': updated + inserted + errors,
+        'changed': updated + inserted,
+        'inserted': inserted,
+        'updated': updated,
+        'deleted': deleted,
+        'errors': errors,
+        'message': f"{database}: {message} / 削除フラグ {deleted}件",
+    }
+
+
+def _skipped_result(database, message):
+    return {
+        'database': database,
+        'status': "SKIPPED",
+        'attempts': 0,
+        'seconds': 0.0,
+        'mode': None,
+        'examined': 0,
+        'changed': 0,
+        'inserted': 0,
+        'updated': 0,
+        'deleted': 0,
+        'message': message,
+        'error': None,
+    }
+
+
+def refresh_database(session, database, full=False, timeout_seconds=STATEMENT_TIMEOUT_SECONDS,
+                     max_retries=MAX_RETRIES, backoff_seconds=RETRY_BACKOFF_SECONDS, sleep=time.sleep,
+                     source=SOURCE_REALTIME, database_timeout_seconds=DATABASE_TIMEOUT_SECONDS,
+                     clock=time.monotonic):
+    """1データベースを更新し、結果を辞書で返す（例外は送出せず STATUS に記録する）
+
+    timeout_seconds は1クエリあたり、database_timeout_seconds は再試行を含めたデータベース全体の期限。
+    各クエリのタイムアウトは期限までの残り時間に縮め、期限を過ぎたら再試行せず TIMEOUT にする。
+    full は ACCOUNT_USAGE の差分同期にだけ効く（REALTIME は常に全件）。
+    戻り値: {'database', 'status': 'OK' | 'TIMEOUT' | 'ERROR', 'attempts', 'seconds',
+             'mode', 'examined', 'changed', 'inserted', 'updated', 'deleted', 'message', 'error'}
+    """
+    statement_params = {"STATEMENT_TIMEOUT_IN_SECONDS": int(timeout_seconds)} if timeout_seconds else None
+    deadline = clock() + database_timeout_seconds if database_timeout_seconds else None
+    started = time.perf_counter()
+    result = {
+        'database': database,
+        'status': "ERROR",
+        'attempts': 0,
+        'seconds': 0.0,
+        'mode': None,
+        'examined': 0,
+        'changed': 0,
+        'inserted': 0,
+        'updated': 0,
+        'deleted': 0,
+        'message': None,
+        'error': None,
+    }
+
+    for attempt in range(max_retries + 1):
+        result['attempts'] = attempt + 1
+        try:
+            if source == SOURCE_REALTIME:
+                report = _refresh_realtime(
+                    session, database, lambda: statement_params_until(deadline, statement_params, clock)
+                )
+                message = report['message']
+            else:
+                report = sync_table_info(
+                    session, database, full=full, statement_params=statement_params,
+                    deadline=deadline, clock=clock
+                )
+                message = format_sync_report(report)
+            for key in ('mode', 'examined', 'changed', 'inserted', 'updated', 'deleted'):
+                result[key] = report[key]
+            result['message'] = message
+            if report.get('errors'):
+                # プロシージャ内でテーブル単位のエラーがあった（再実行しても同じになるため再試行しない）
+                result['status'] = "ERROR"
+                result['error'] = f"テーブル単位のエラー: {report['errors']}件"
+            else:
+                result['status'] = "OK"
+                result['error'] = None
+            break
+        except Exception as e:
+            result['status'] = "TIMEOUT" if _is_timeout(e) else "ERROR"
+            result['error'] = str(e)
+            if attempt == max_retries:
+                break
+            wait_seconds = backoff_seconds * (2 ** attempt)
+            if deadline is not None and clock() + wait_seconds >= deadline:
+                # 待っている間に期限を過ぎるので再試行しない
+                result['status'] = "TIMEOUT"
+                result['error'] = f"データベースごとの期限（{database_timeout_seconds}秒）を超過しました: {e}"
+                break
+            sleep(wait_seconds)
+
+    result['seconds'] = time.perf_counter() - started
+    return result
+
+
+def refresh_all_databases(session, databases=None, max_workers=MAX_WORKERS, full=False,
+                          timeout_seconds=STATEMENT_TIMEOUT_SECONDS, max_retries=MAX_RETRIES,
+                          backoff_seconds=RETRY_BACKOFF_SECONDS, on_result=None,
+                          source=SOURCE_REALTIME, database_timeout_seconds=DATABASE_TIMEOUT_SECONDS):
+    """対象データベースを上限付きで並列に更新し、データベース名順の結果リストを返す
+
+    source=ACCOUNT_USAGE のときは IMPORTED DATABASE を更新せず SKIPPED の結果にする。
+    on_result: on_result(結果) を1データベース完了ごとに呼び出し元のスレッドで呼ぶ
+    """
+    source = (source or SOURCE_REALTIME).upper()
+    if source not in SOURCES:
+        raise ValueError(f"source は {', '.join(SOURCES)} のいずれかです: {source}")
+
+    kinds = database_kinds(session) if source == SOURCE_ACCOUNT_USAGE else None
+    targets = discover_databases(session, databases, kinds)
+    results = []
+    if not targets:
+        return results
+
+    if kinds is not None:
+        imported = [database for database in targets if kinds.get(database) == IMPORTED_DATABASE_KIND]
+        for database in imported:
+            result = _skipped_result(
+                database, f"{database}: 共有データベースは ACCOUNT_USAGE に含まれないため更新していません"
+                          f"（SOURCE => '{SOURCE_REALTIME}' で更新してください）"
+            )
+            results.append(result)
+            if on_result:
+                on_result(result)
+        targets = [database for database in targets if database not in imported]
+
+    if targets:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(targets)))) as executor:
+            futures = [
+                executor.submit(
+                    refresh_database, session, database, full, timeout_seconds, max_retries, backoff_seconds,
+                    time.sleep, source, database_timeout_seconds
+                )
+                for database in targets
+            ]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                if on_result:
+                    on_result(result)
+
+    return sorted(results, key=lambda result: result['database'])
+
+
+def summarize_results(results):
+    """データベース別の結果を集計する"""
+    return {
+        'databases': len(results),
+        'ok': sum(1 for result in results if result['status'] == "OK"),
+        'skipped': sum(1 for result in results if result['status'] == "SKIPPED"),
+        'timeout': sum(1 for result in results if result['status'] == "TIMEOUT"),
+        'error': sum(1 for result in results if result['status'] == "ERROR"),
+        'examined': sum(result['examined'] for result in results),
+        'changed': sum(result['changed'] for result in results),
+        'deleted': sum(result['deleted'] for result in results),
+        'slowest_seconds': max((result['seconds'] for result in results), default=0.0),
+    }
+
+
+def run(session, databases=None, max_workers=MAX_WORKERS, full=False, source=SOURCE_REALTIME,
+        database_timeout_seconds=DATABASE_TIMEOUT_SECONDS):
+    """Snowpark プロシージャのハンドラ（VARIANT として返せる辞書を返す）"""
+    started = time.perf_counter()
+    results = refresh_all_databases(
+        session, databases or None, int(max_workers), bool(full), source=source,
+        database_timeout_seconds=int(database_timeout_seconds)
+    )
+    summary = summarize_results(results)
+    summary['source'] = (source or SOURCE_REALTIME).upper()
+    summary['seconds'] = time.perf_counter() - started
+    return {
+        'summary': summary,
+        'results': results,
+    }
+
+
+if __name__ == "__main__":
+    # ローカル実行: connections.toml の既定接続で全対象データベースを更新する
+    from snowflake.snowpark import Session
+
+    local_session = Session.builder.getOrCreate()
+    for database_result in refresh_all_databases(local_session):
+        print(database_result['message'] or f"{database_result['database']}: {database_result['status']} - {database_result['error']}")
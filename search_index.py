@@ -0,0 +1,347 @@
+# ###
+# TABLE_INFO用のインメモリ転置インデックス
+#
+# - 英数字は小文字化し、アンダースコアで分割（TB_SALES_SUMMARY → tb_sales_summary, tb, sales, summary）
+# - 日本語（かな・漢字）は文字bigramで分割（1文字のクエリはその文字を含むbigramに展開する）
+# - COLUMN_COMMENTはJSONをパースしてカラム名・コメントを索引する
+# - BM25をフィールドごとに計算し、フィールド重みを掛けて合算する
+# - カタログのスナップショットが変わった行だけを差分で再索引する
+# - 複数キーワード検索では、一致したキーワード数と一致フィールドでランキングする
+# ###
+
+import bisect
+import json
+import math
+import re
+import threading
+import unicodedata
+
+# フィールド重み（TABLE_NAME > TABLE_COMMENT > COLUMN_COMMENT）
+FIELD_BOOSTS = {
+    "TABLE_NAME": 3.0,
+    "TABLE_COMMENT": 2.0,
+    "APPLICATION_PROJECT": 1.5,
+    "LOCATION": 1.2,
+    "COLUMN_COMMENT": 1.0,
+    "SCOPE": 1.0,
+    "COMMENT": 1.0,
+}
+
+# BM25パラメータ
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# 索引に完全一致する語がない場合に前方一致で展開する際の重みと上限
+PREFIX_WEIGHT = 0.7
+PREFIX_MIN_LENGTH = 3
+PREFIX_MAX_EXPANSIONS = 20
+
+# 1文字の日本語クエリ（車・売など）をその文字を含むbigramに展開する際の重みと上限（出現行数の多い順）
+CJK_CHAR_WEIGHT = 0.8
+CJK_CHAR_MAX_EXPANSIONS = 100
+
+_WORD_RE = re.compile(r"[0-9a-z_]+|[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+")
+
+
+def _is_ascii_word(text):
+    return text[0].isascii()
+
+
+def _is_cjk_bigram(token):
+    return len(token) == 2 and _WORD_RE.fullmatch(token) is not None and not _is_ascii_word(token)
+
+
+def tokenize(text):
+    """検索用トークン列に分割する（索引・クエリ共通）"""
+    if not text:
+        return []
+    text = unicodedata.normalize("NFKC", str(text)).lower()
+    tokens = []
+    for word in _WORD_RE.findall(text):
+        if _is_ascii_word(word):
+            parts = [part for part in word.split("_") if part]
+            if len(parts) > 1:
+                tokens.append(word.strip("_"))
+            tokens.extend(parts)
+        elif len(word) == 1:
+            tokens.append(word)
+        else:
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+    return tokens
+
+
+def column_comment_text(column_comment):
+    """COLUMN_COMMENT(JSON)からカラム名とコメントを取り出す。壊れたJSONは文字列のまま使う"""
+    if not column_comment:
+        return ""
+    try:
+        items = json.loads(column_comment)
+    except (TypeError, ValueError):
+        return str(column_comment)
+    if not isinstance(items, list):
+        return str(column_comment)
+    parts = []
+    for item in items:
+        if isinstance(item, dict):
+            parts.append(str(item.get("column") or ""))
+            parts.append(str(item.get("comment") or ""))
+    return " ".join(parts)
+
+
+def _field_text(row, field):
+    if field == "COLUMN_COMMENT":
+        return column_comment_text(row.get(field))
+    return row.get(field) or ""
+
+
+def _row_signature(row):
+    return tuple(row.get(field) for field in FIELD_BOOSTS)
+
+
+class SearchHit:
+    """検索結果1件"""
+
+    def __init__(self, row, score, matched_terms, matched_fields):
+        self.row = row
+        self.score = score
+        self.matched_terms = matched_terms
+        self.matched_fields = matched_fields
+
+    def as_result(self):
+        """検索結果表示用に行dictのコピーへSCOREを付与して返す"""
+        result = dict(self.row)
+        result["SCORE"] = round(self.score, 3)
+        result["MATCHED_FIELDS"] = sorted(self.matched_fields, key=list(FIELD_BOOSTS).index)
+        result["MATCHED_KEYWORDS"] = list(self.matched_terms)
+        return result
+
+
+class SearchIndex:
+    """(LOCATION, TABLE_NAME) をキーとするBM25転置インデックス"""
+
+    def __init__(self, field_boosts=None):
+        self.field_boosts = dict(field_boosts or FIELD_BOOSTS)
+        self._lock = threading.Lock()
+        # token -> {key: {field: tf}}
+        self._postings = {}
+        self._vocabulary = []
+        self._vocabulary_dirty = False
+        # 日本語の1文字 -> その文字を含むbigram（語彙の更新時に作り直す）
+        self._cjk_chars = {}
+        # key -> {field: 長さ}
+        self._lengths = {}
+        self._total_lengths = {field: 0 for field in self.field_boosts}
+        # key -> {field: BM25の長さ正規化項}（同期のたびに作り直す）
+        self._norms = None
+        self._rows = {}
+        self._signatures = {}
+        self.version = None
+
+    def __len__(self):
+        return len(self._rows)
+
+    # ----- 索引の更新 -----
+
+    def _add(self, key, row):
+        lengths = {}
+        for field in self.field_boosts:
+            tokens = tokenize(_field_text(row, field))
+            lengths[field] = len(tokens)
+            self._total_lengths[field] += len(tokens)
+            for token in tokens:
+                postings = self._postings.get(token)
+                if postings is None:
+                    postings = self._postings[token] = {}
+                    self._vocabulary_dirty = True
+                field_tf = postings.setdefault(key, {})
+                field_tf[field] = field_tf.get(field, 0) + 1
+        self._lengths[key] = lengths
+        self._rows[key] = row
+        self._signatures[key] = _row_signature(row)
+
+    def _remove(self, key):
+        row = self._rows.pop(key)
+        del self._signatures[key]
+        for field, length in self._lengths.pop(key).items():
+            self._total_lengths[field] -= length
+        for token in set(
+            token
+            for field in self.field_boosts
+            for token in tokenize(_field_text(row, field))
+        ):
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(key, None)
+            if not postings:
+                del self._postings[token]
+                self._vocabulary_dirty = True
+
+    def sync(self, rows, version=None):
+        """行リストと索引を突き合わせ、追加・変更・削除された行だけを再索引する"""
+        with self._lock:
+            current = {(row["LOCATION"], row["TABLE_NAME"]): row for row in rows}
+            removed = [key for key in self._rows if key not in current]
+            changed = [
+                key for key, row in current.items()
+                if key in self._signatures and self._signatures[key] != _row_signature(row)
+            ]
+            added = [key for key in current if key not in self._rows]
+
+            for key in removed + changed:
+                self._remove(key)
+            for key in changed + added:
+                self._add(key, current[key])
+            # 変更のない行もスナップショット側のdictに差し替える（表示用の最新値）
+            for key, row in current.items():
+                self._rows[key] = row
+
+            self._norms = None
+            self.version = version
+            return {
+                "added": len(added),
+                "changed": len(changed),
+                "removed": len(removed),
+                "unchanged": len(current) - len(added) - len(changed),
+            }
+
+    # ----- 検索 -----
+
+    def _refresh_vocabulary(self):
+        if not self._vocabulary_dirty:
+            return
+        self._vocabulary = sorted(self._postings)
+        cjk_chars = {}
+        for term in self._vocabulary:
+            if _is_cjk_bigram(term):
+                for char in set(term):
+                    cjk_chars.setdefault(char, []).append(term)
+        self._cjk_chars = cjk_chars
+        self._vocabulary_dirty = False
+
+    def _expand(self, token):
+        """クエリ語に対応する索引語と重みのリスト"""
+        if len(token) == 1 and not token.isascii():
+            # 2文字以上の日本語はbigramでしか索引されないため、1文字のクエリは
+            # その文字で始まる・終わるbigram（車 → 車両, 自動車の動車 など）に展開する
+            self._refresh_vocabulary()
+            terms = sorted(self._cjk_chars.get(token, []), key=lambda term: -len(self._postings[term]))
+            expansions = [(term, CJK_CHAR_WEIGHT) for term in terms[:CJK_CHAR_MAX_EXPANSIONS]]
+            if token in self._postings:
+                expansions.insert(0, (token, 1.0))
+            return expansions
+        if token in self._postings:
+            return [(token, 1.0)]
+        if len(token) < PREFIX_MIN_LENGTH or not token.isascii():
+            return []
+        self._refresh_vocabulary()
+        start = bisect.bisect_left(self._vocabulary, token)
+        expansions = []
+        for candidate in self._vocabulary[start:start + PREFIX_MAX_EXPANSIONS]:
+            if not candidate.startswith(token):
+                break
+            expansions.append((candidate, PREFIX_WEIGHT))
+        return expansions
+
+    def _build_norms(self):
+        n_docs = len(self._rows)
+        avg_lengths = {
+            field: (total / n_docs if n_docs else 0) or 1
+            for field, total in self._total_lengths.items()
+        }
+        self._norms = {
+            key: {
+                field: BM25_K1 * (1 - BM25_B + BM25_B * length / avg_lengths[field])
+                for field, length in lengths.items()
+            }
+            for key, lengths in self._lengths.items()
+        }
+
+    def _score_token(self, token, weight, scores, matched):
+        postings = self._postings[token]
+        n_docs = len(self._rows)
+        idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+        boosts = self.field_boosts
+        for key, field_tf in postings.items():
+            norms = self._norms[key]
+            score = 0.0
+            for field, tf in field_tf.items():
+                score += boosts[field] * tf * (BM25_K1 + 1) / (tf + norms[field])
+            scores[key] = scores.get(key, 0.0) + weight * idf * score
+            matched.setdefault(key, set()).update(field_tf)
+        return postings.keys()
+
+    def score_terms(self, query):
+        """クエリを索引語に展開してスコアリングする
+
+        {key: (score, matched_fields, coverage)} を返す。
+        coverage はクエリのトークンのうち、その行に含まれていた割合。
+        """
+        with self._lock:
+            scores = {}
+            matched = {}
+            token_hits = {}
+            if not self._rows:
+                return {}
+            if self._norms is None:
+                self._build_norms()
+            tokens = list(dict.fromkeys(tokenize(query)))
+            for token in tokens:
+                token_keys = set()
+                for term, weight in self._expand(token):
+                    token_keys.update(self._score_token(term, weight, scores, matched))
+                for key in token_keys:
+                    token_hits[key] = token_hits.get(key, 0) + 1
+            return {
+                key: (score, matched[key], token_hits[key] / len(tokens))
+                for key, score in scores.items()
+            }
+
+    def search(self, query, limit=50):
+        """BM25スコアの高い順にSearchHitのリストを返す"""
+        scored = self.score_terms(query)
+        ranked = sorted(scored.items(), key=lambda item: (-item[1][0], item[0][1], item[0][0]))
+        return [
+            SearchHit(self._rows[key], score, [query] if coverage >= 1.0 else [], fields)
+            for key, (score, fields, coverage) in ranked[:limit]
+        ]
+
+    def search_keywords(self, keywords, limit=50):
+        """複数キーワードでの関連度順検索
+
+        キーワードごとに索引を引き、「全トークンが一致したキーワードの数」を第1キー、
+        一致度で重み付けしたBM25スコアの合計を第2キーとして上位limit件を返す。
+        どのキーワードも完全一致しない場合は部分一致の行をスコア順に返す。
+        """
+        keywords = list(dict.fromkeys(kw.strip() for kw in keywords if tokenize(kw)))
+        # key -> [一致キーワード数, スコア, 一致キーワード, 一致フィールド]
+        totals = {}
+        for keyword in keywords:
+            for key, (score, fields, coverage) in self.score_terms(keyword).items():
+                entry = totals.setdefault(key, [0, 0.0, [], set()])
+                entry[1] += score * coverage
+                entry[3].update(fields)
+                if coverage >= 1.0:
+                    entry[0] += 1
+                    entry[2].append(keyword)
+
+        candidates = {key: entry for key, entry in totals.items() if entry[0]} or totals
+        ranked = sorted(
+            candidates.items(),
+            key=lambda item: (-item[1][0], -item[1][1], item[0][1], item[0][0])
+        )
+        return [
+            SearchHit(self._rows[key], score, matched_keywords, fields)
+            for key, (_, score, matched_keywords, fields) in ranked[:limit]
+        ]
+
+
+# プロセス内で共有する索引（カタログのスナップショット更新時に差分同期する）
+_index = SearchIndex()
+
+
+def get_search_index(snapshot):
+    """スナップショットに同期済みの共有索引を返す"""
+    if _index.version != snapshot.version:
+        _index.sync(snapshot.rows, snapshot.version)
+    return _index
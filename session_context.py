@@ -0,0 +1,131 @@
+# ###
+# セッション接続情報（アカウント・リージョン・ウェアハウス・ロール）
+#
+# Power BI 接続パネルはテーブルを表示するたびに CURRENT_ACCOUNT() / CURRENT_REGION() と
+# CURRENT_WAREHOUSE() を別々に問い合わせていた。これらはセッション中は変わらないため、
+# 1回のクエリでまとめて取得し、Snowpark セッションごとに保持する。
+# ODBC接続文字列・Power Query (M) のスニペットは保持した値から組み立てる（追加クエリなし）。
+# ###
+
+import threading
+
+CONTEXT_SQL = """
+    SELECT
+        CURRENT_ACCOUNT() AS ACCOUNT,
+        CURRENT_REGION() AS REGION,
+        CURRENT_WAREHOUSE() AS WAREHOUSE,
+        CURRENT_ROLE() AS ROLE
+"""
+
+ODBC_DRIVER = "SnowflakeDSIIDriver"
+
+
+def _session_key(session):
+    # Snowpark の Session は session_id を持つ（持たない場合はオブジェクトで区別する）
+    return getattr(session, "session_id", None) or id(session)
+
+
+class SessionContextCache:
+    """セッションごとの接続情報を保持する"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._contexts = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, session):
+        """{'ACCOUNT', 'REGION', 'WAREHOUSE', 'ROLE', 'SERVER'} を返す"""
+        key = _session_key(session)
+        with self._lock:
+            if key in self._contexts:
+                self.hits += 1
+                return dict(self._contexts[key])
+
+        row = session.sql(CONTEXT_SQL).collect()[0]
+        context = {
+            'ACCOUNT': row['ACCOUNT'],
+            'REGION': row['REGION'],
+            'WAREHOUSE': row['WAREHOUSE'] or 'N/A',
+            'ROLE': row['ROLE'],
+            'SERVER': f"{row['ACCOUNT']}.{row['REGION']}.snowflakecomputing.com",
+        }
+
+        with self._lock:
+            self.misses += 1
+            self._contexts[key] = context
+        return dict(context)
+
+    def invalidate(self, session=None):
+        """指定したセッション（省略時はすべて）の接続情報を破棄する（USE WAREHOUSE 後など）"""
+        with self._lock:
+            if session is None:
+                self._contexts.clear()
+            else:
+                self._contexts.pop(_session_key(session), None)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'sessions': len(self._contexts),
+            }
+
+
+# プロセス内で共有するキャッシュ（Streamlitの再実行ではモジュールは再importされない）
+_cache = SessionContextCache()
+
+
+def get_session_context(session):
+    return _cache.get(session)
+
+
+def invalidate_session_context(session=None):
+    _cache.invalidate(session)
+
+
+def session_context_stats():
+    return _cache.stats()
+
+
+def connection_text(context, database, schema, table):
+    """接続情報（テキストエリア表示用）"""
+    return f"""サーバー: {context['SERVER']}
+データベース: {database}
+スキーマ: {schema}
+テーブル: {table}
+ウェアハウス: {context['WAREHOUSE']}"""
+
+
+def odbc_connection_string(context, database, schema):
+    """ODBC接続文字列（Snowflake ODBC ドライバー）"""
+    parts = [
+        f"Driver={{{ODBC_DRIVER}}}",
+        f"Server={context['SERVER']}",
+        f"Database={database}",
+        f"Schema={schema}",
+        f"Warehouse={context['WAREHOUSE']}",
+    ]
+    if context.get('ROLE'):
+        parts.append(f"Role={context['ROLE']}")
+    return ";".join(parts)
+
+
+def _m_string(value):
+    # Power Query (M) の文字列リテラル（ダブルクォートは2つ重ねる）
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def power_query_m(context, database, schema, table):
+    """Power BI の詳細エディターに貼り付ける Power Query (M) スクリプト"""
+    options = f", [Role={_m_string(context['ROLE'])}]" if context.get('ROLE') else ""
+    return f"""let
+    Source = Snowflake.Databases({_m_string(context['SERVER'])}, {_m_string(context['WAREHOUSE'])}{options}),
+    Database = Source{{[Name={_m_string(database)}, Kind="Database"]}}[Data],
+    Schema = Database{{[Name={_m_string(schema)}, Kind="Schema"]}}[Data],
+    Table = Schema{{[Name={_m_string(table)}, Kind="Table"]}}[Data]
+in
+    Table"""
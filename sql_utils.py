@@ -0,0 +1,18 @@
+# ###
+# SQL文字列の組み立てに使う共通処理
+# ###
+
+
+def escape_literal(text):
+    """SQLの文字列リテラル用にバックスラッシュとシングルクォートをエスケープする"""
+    return str(text).replace("\\", "\\\\").replace("'", "''")
+
+
+def quote_identifier(name):
+    """ダブルクォートで囲んだ識別子"""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def table_path(db, schema, table):
+    """"DB"."SCHEMA"."TABLE" 形式の完全修飾名"""
+    return f"{quote_identifier(db)}.{quote_identifier(schema)}.{quote_identifier(table)}"
@@ -0,0 +1,343 @@
+# ###
+# テーブルの全件エクスポート（CSV / Parquet）
+#
+# プレビューの100行をメモリ上でCSV化する代わりに、Snowpark の to_pandas_batches() で
+# バッチごとに受け取り、一時ファイルへ順に書き出す。メモリに載るのは1バッチ分だけで、
+# 行数・ファイルサイズの上限に達したところで打ち切る。
+# 絞り込みはカラムの選択と「カラム = 値」の条件（バインド変数）だけを受け付ける。
+# st.download_button はファイル全体をメモリに読み込んでから送るため、アプリ内でダウンロードする
+# ファイルのサイズは EXPORT_MAX_BYTES で抑える。一時ファイルは新しいエクスポートの開始時に、
+# 一定時間を過ぎたもの（セッションが切れて削除されなかったもの）を削除する。
+# render_export_panel() は表示アプリと検索アプリのエクスポートUI。
+# ###
+
+import os
+import re
+import tempfile
+import time
+
+from catalog import format_bytes
+from sql_utils import quote_identifier, table_path
+
+# エクスポートの上限（行数・バイト数）。バイト数はダウンロード時にメモリへ載る大きさの上限でもある
+EXPORT_MAX_ROWS = 1_000_000
+EXPORT_MAX_BYTES = 50 * 1024 * 1024
+
+# 一時ファイル名の接頭辞（古いファイルの削除対象を見分ける）
+EXPORT_FILE_PREFIX = "catalog_export_"
+
+# この時間（秒）を過ぎた一時ファイルは、次のエクスポートの開始時に削除する
+EXPORT_FILE_MAX_AGE_SECONDS = 3600
+
+EXPORT_FORMATS = ["csv", "parquet"]
+
+MIME_TYPES = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def safe_file_name(name):
+    """ファイル名に使えない文字（パス区切りなど）を "_" に置き換える"""
+    return re.sub(r"[^\w.-]", "_", name) or "_"
+
+
+def export_sql(db, schema, table, columns=None, filters=None, limit=None):
+    """エクスポート用のSELECT文とバインド変数を返す
+
+    filters: [(カラム名, 値)] の等価条件（AND で結合）
+    """
+    select_list = ", ".join(quote_identifier(column) for column in columns) if columns else "*"
+    clauses = []
+    params = []
+    for column, value in filters or []:
+        clauses.append(f"{quote_identifier(column)} = ?")
+        params.append(value)
+    where_clause = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    limit_clause = f"LIMIT {int(limit)}" if limit else ""
+    return f"SELECT {select_list} FROM {table_path(db, schema, table)} {where_clause} {limit_clause}", params
+
+
+class _CsvWriter:
+    def __init__(self, path):
+        # Excelで開けるようBOM付きUTF-8で書き出す
+        self._file = open(path, "w", encoding="utf-8-sig", newline="")
+        self._header = True
+
+    def write(self, df):
+        df.to_csv(self._file, index=False, header=self._header)
+        self._header = False
+        self._file.flush()
+
+    def size(self):
+        return self._file.tell()
+
+    def close(self):
+        self._file.close()
+
+
+def _promote_schema(current, incoming):
+    """2つのバッチのスキーマを両方を表せる型にそろえる（null → 実際の型、int64 + float64 → float64 など）
+
+    数値の拡張などで表せない組み合わせ（文字列と日時など）は文字列にする。
+    """
+    import pyarrow as pa
+
+    try:
+        return pa.unify_schemas([current, incoming], promote_options="permissive")
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        fields = []
+        for field in current:
+            other = incoming.field(field.name).type
+            if field.type == other or pa.types.is_null(other):
+                fields.append(field)
+            elif pa.types.is_null(field.type):
+                fields.append(pa.field(field.name, other))
+            else:
+                fields.append(pa.field(field.name, pa.large_string()))
+        return pa.schema(fields, metadata=current.metadata)
+
+
+class _ParquetWriter:
+    """バッチごとに Parquet へ書き出す
+
+    to_pandas_batches() のバッチは dtype が一定ではない（全件 NULL のカラムは null 型、
+    NULL を含む整数は float64 になる）。既存のスキーマで表せないバッチが来たら型を拡張し、
+    書き出し済みの行グループを1つずつ新しいスキーマで書き直してから続ける。
+    """
+
+    def __init__(self, path):
+        import pyarrow  # noqa: F401  Snowpark の依存パッケージとして導入済み
+        self._path = path
+        self._writer = None
+        self._schema = None
+        self.rewrites = 0
+
+    def _open(self, schema):
+        import pyarrow.parquet as pq
+
+        self._schema = schema
+        self._writer = pq.ParquetWriter(self._path, schema)
+
+    def _rewrite(self, schema):
+        """書き出し済みのファイルを schema で書き直す（メモリに載るのは1行グループ分だけ）"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._writer.close()
+        previous = f"{self._path}.previous"
+        os.replace(self._path, previous)
+        try:
+            self._open(schema)
+            source = pq.ParquetFile(previous)
+            for index in range(source.num_row_groups):
+                self._writer.write_table(source.read_row_group(index).cast(schema))
+        finally:
+            os.remove(previous)
+        self.rewrites += 1
+
+    def write(self, df):
+        import pyarrow as pa
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self._writer is None:
+            self._open(table.schema)
+        elif not table.schema.equals(self._schema):
+            schema = _promote_schema(self._schema, table.schema)
+            if not schema.equals(self._schema):
+                self._rewrite(schema)
+        self._writer.write_table(table.cast(self._schema))
+
+    def size(self):
+        return os.path.getsize(self._path) if os.path.exists(self._path) else 0
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def export_table(session, db, schema, table, fmt="csv", columns=None, filters=None,
+                 max_rows=EXPORT_MAX_ROWS, max_bytes=EXPORT_MAX_BYTES, directory=None, on_progress=None):
+    """テーブル（またはカラム・条件で絞り込んだ結果）をバッチごとにファイルへ書き出す
+
+    on_progress: on_progress(書き出した行数, ファイルサイズ) をバッチごとに呼ぶ
+    戻り値: {'path', 'format', 'file_name', 'mime', 'rows', 'bytes', 'truncated', 'reason'}
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"未対応の形式です: {fmt}")
+
+    # 上限を1行超えて取得し、打ち切りが発生したかを判定する
+    query, params = export_sql(db, schema, table, columns, filters, max_rows + 1 if max_rows else None)
+
+    remove_stale_exports(directory)
+    # 引用符付きの識別子には "/" なども使えるため、一時ファイル名には置き換えた名前を使う
+    # （ダウンロード時のファイル名 file_name には元のテーブル名を使う）
+    handle, path = tempfile.mkstemp(
+        prefix=f"{EXPORT_FILE_PREFIX}{safe_file_name(table)}_", suffix=f".{fmt}", dir=directory
+    )
+    os.close(handle)
+    writer = _CsvWriter(path) if fmt == "csv" else _ParquetWriter(path)
+
+    rows = 0
+    truncated = False
+    reason = None
+    try:
+        for batch in session.sql(query, params=params).to_pandas_batches():
+            if max_rows and rows + len(batch) > max_rows:
+                batch = batch.iloc[:max_rows - rows]
+                truncated = True
+                reason = f"行数の上限（{max_rows:,}行）に達しました"
+            if len(batch):
+                writer.write(batch)
+                rows += len(batch)
+            size = writer.size()
+            if on_progress:
+                on_progress(rows, size)
+            if truncated:
+                break
+            if max_bytes and size >= max_bytes:
+                truncated = True
+                reason = f"ファイルサイズの上限（{max_bytes / 1024 / 1024:,.0f}MB）に達しました"
+                break
+    except Exception:
+        writer.close()
+        os.remove(path)
+        raise
+    writer.close()
+
+    return {
+        'path': path,
+        'format': fmt,
+        'file_name': f"{table}.{fmt}",
+        'mime': MIME_TYPES[fmt],
+        'rows': rows,
+        'bytes': os.path.getsize(path),
+        'truncated': truncated,
+        'reason': reason,
+    }
+
+
+def export_exists(result):
+    return bool(result and result.get('path') and os.path.exists(result['path']))
+
+
+def remove_export(result):
+    """エクスポートした一時ファイルを削除する"""
+    if export_exists(result):
+        os.remove(result['path'])
+
+
+def remove_stale_exports(directory=None, max_age_seconds=EXPORT_FILE_MAX_AGE_SECONDS, clock=time.time):
+    """作成から max_age_seconds を過ぎたエクスポートの一時ファイルを削除し、削除した件数を返す"""
+    directory = directory or tempfile.gettempdir()
+    removed = 0
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return removed
+    now = clock()
+    for name in names:
+        if not name.startswith(EXPORT_FILE_PREFIX):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            if now - os.path.getmtime(path) >= max_age_seconds:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            # 他のセッションが同時に削除した場合など
+            continue
+    return removed
+
+
+def render_export_panel(session, db, schema, table, column_names, record_num=None):
+    """エクスポートの設定・実行・ダウンロードのUI（表示アプリ・検索アプリ共通）
+
+    結果は st.session_state.export_result に保持し、テーブルを切り替えたら表示しない。
+    """
+    import streamlit as st
+
+    export_key = f"{db}.{schema}.{table}"
+    export_col1, export_col2 = st.columns(2)
+    with export_col1:
+        export_format = st.radio(
+            "形式",
+            EXPORT_FORMATS,
+            format_func=str.upper,
+            horizontal=True,
+            key=f"export_format_{export_key}"
+        )
+    with export_col2:
+        export_max_rows = st.number_input(
+            "最大行数",
+            min_value=1,
+            max_value=EXPORT_MAX_ROWS,
+            value=min(EXPORT_MAX_ROWS, 100000),
+            step=10000,
+            key=f"export_max_rows_{export_key}"
+        )
+
+    export_columns = st.multiselect(
+        "出力するカラム（未選択の場合は全カラム）",
+        column_names,
+        key=f"export_columns_{export_key}"
+    )
+
+    export_filter_col1, export_filter_col2 = st.columns(2)
+    with export_filter_col1:
+        export_filter_column = st.selectbox(
+            "絞り込みカラム（任意）",
+            ["なし"] + list(column_names),
+            key=f"export_filter_column_{export_key}"
+        )
+    with export_filter_col2:
+        export_filter_value = st.text_input(
+            "値（完全一致）",
+            disabled=export_filter_column == "なし",
+            key=f"export_filter_value_{export_key}"
+        )
+
+    st.caption(f"ファイルサイズの上限: {format_bytes(EXPORT_MAX_BYTES)}")
+
+    if st.button("📤 エクスポート開始", key=f"export_btn_{export_key}"):
+        # 前回のエクスポートファイルは削除する
+        remove_export(st.session_state.get('export_result'))
+        st.session_state.export_result = None
+
+        expected_rows = min(record_num or export_max_rows, export_max_rows)
+        export_progress = st.progress(0.0, text="エクスポート中...")
+
+        def update_export_progress(rows, size):
+            export_progress.progress(
+                min(rows / expected_rows, 1.0) if expected_rows else 0.0,
+                text=f"エクスポート中... {rows:,}行 / {format_bytes(size)}"
+            )
+
+        try:
+            export_result = export_table(
+                session, db, schema, table,
+                fmt=export_format,
+                columns=export_columns,
+                filters=[(export_filter_column, export_filter_value)] if export_filter_column != "なし" else None,
+                max_rows=int(export_max_rows),
+                on_progress=update_export_progress
+            )
+            export_result['key'] = export_key
+            st.session_state.export_result = export_result
+            export_progress.progress(1.0, text="エクスポート完了")
+        except Exception as e:
+            st.error(f"❌ エクスポートエラー: {str(e)}")
+
+    export_result = st.session_state.get('export_result')
+    if export_exists(export_result) and export_result['key'] == export_key:
+        st.caption(f"{export_result['rows']:,}行 / {format_bytes(export_result['bytes'])}")
+        if export_result['truncated']:
+            st.warning(f"⚠️ {export_result['reason']}。全件が必要な場合は条件で絞り込んでください")
+        with open(export_result['path'], "rb") as export_file:
+            st.download_button(
+                label=f"📥 {export_result['file_name']} をダウンロード",
+                data=export_file,
+                file_name=export_result['file_name'],
+                mime=export_result['mime'],
+                key=f"export_download_{export_key}"
+            )
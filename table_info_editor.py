@@ -0,0 +1,181 @@
+# ###
+# TABLE_INFO編集アプリの保存処理
+#
+# - 編集前後のDataFrameをpandasでまとめて比較し、変更行だけの変更セットを作る
+#   （NULL同士・NULLと空文字は「変更なし」として扱う）
+# - 変更セットはバインド変数付きの MERGE INTO TABLE_INFO ... USING (VALUES ...) で
+#   1トランザクションにまとめて反映する
+# - 一覧は (LOCATION, TABLE_NAME) のキーセットページングで1ページ分だけ取得する
+#   （OFFSET を使わないため、後ろのページでも読み飛ばしが発生しない）
+# ###
+
+import pandas as pd
+
+from catalog import TABLE_INFO, TABLE_INFO_COLUMNS
+
+# 編集可能カラム
+EDITABLE_COLUMNS = [
+    "OWNER",
+    "SUB_OWNER",
+    "PUBLISH",
+    "SCOPE",
+    "APPLICATION_PROJECT",
+    "COMMENT",
+]
+
+KEY_COLUMNS = ["LOCATION", "TABLE_NAME"]
+
+# 1文のMERGEに含める行数（バインド変数の数を抑える）
+MERGE_CHUNK_ROWS = 500
+
+# 1ページに表示する行数の選択肢
+PAGE_SIZE_OPTIONS = [50, 100, 200, 500]
+DEFAULT_PAGE_SIZE = 100
+
+
+def build_filter(location=None, search_text=None):
+    """フィルター条件から (WHERE句, バインド変数) を返す"""
+    # 削除されたテーブル（差分同期で DELETED_DATE が付いた行）は編集対象外
+    clauses = ["DELETED_DATE IS NULL"]
+    params = []
+    if location and location != "すべて":
+        clauses.append("LOCATION = ?")
+        params.append(location)
+    if search_text and search_text.strip():
+        # テーブル名またはロケーション名で部分一致検索（ワイルドカードはエスケープする）
+        pattern = search_text.strip().upper().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        clauses.append("(UPPER(TABLE_NAME) LIKE ? ESCAPE '\\\\' OR UPPER(LOCATION) LIKE ? ESCAPE '\\\\')")
+        params.extend([f"%{pattern}%", f"%{pattern}%"])
+    return " AND ".join(clauses), params
+
+
+def count_table_info(session, where_clause, params):
+    """フィルター条件に一致する件数"""
+    result = session.sql(
+        f"SELECT COUNT(*) AS CNT FROM {TABLE_INFO} WHERE {where_clause}",
+        params=params
+    ).collect()
+    return result[0]['CNT'] if result else 0
+
+
+def fetch_table_info_page(session, where_clause, params, after_key=None, page_size=DEFAULT_PAGE_SIZE):
+    """after_key = (LOCATION, TABLE_NAME) より後ろの1ページ分をDataFrameで返す"""
+    page_params = list(params)
+    keyset = ""
+    if after_key is not None:
+        keyset = "AND (LOCATION > ? OR (LOCATION = ? AND TABLE_NAME > ?))"
+        page_params.extend([after_key[0], after_key[0], after_key[1]])
+    column_list = ",\n            ".join(TABLE_INFO_COLUMNS)
+    return session.sql(f"""
+        SELECT
+            {column_list}
+        FROM {TABLE_INFO}
+        WHERE {where_clause}
+        {keyset}
+        ORDER BY LOCATION, TABLE_NAME
+        LIMIT {int(page_size)}
+    """, params=page_params).to_pandas()
+
+
+def merge_pending_changes(pending, page_df, page_changes):
+    """ページ内の変更セットを未保存の変更 {(LOCATION, TABLE_NAME): {カラム: 値}} に反映する
+
+    ページに表示された行のうち、元の値に戻した行は未保存の変更から取り除く。
+    """
+    for key in zip(page_df["LOCATION"], page_df["TABLE_NAME"]):
+        pending.pop(key, None)
+    for record in page_changes.to_dict("records"):
+        key = (record["LOCATION"], record["TABLE_NAME"])
+        pending[key] = {name: record[name] for name in EDITABLE_COLUMNS}
+    return pending
+
+
+def apply_pending_to_page(page_df, pending):
+    """未保存の変更をページのDataFrameに重ねて、エディタの表示用に返す"""
+    if not pending:
+        return page_df
+    display_df = page_df.copy()
+    keys = list(zip(display_df["LOCATION"], display_df["TABLE_NAME"]))
+    for position, key in enumerate(keys):
+        values = pending.get(key)
+        if values:
+            for name, value in values.items():
+                display_df.at[display_df.index[position], name] = value
+    return display_df
+
+
+def pending_to_changes(pending):
+    """未保存の変更を apply_table_info_changes に渡せる変更セットに変換する"""
+    records = [
+        {"LOCATION": key[0], "TABLE_NAME": key[1], **values}
+        for key, values in pending.items()
+    ]
+    return pd.DataFrame(records, columns=KEY_COLUMNS + EDITABLE_COLUMNS)
+
+
+def _normalize(df):
+    """比較用に編集可能カラムを取り出し、空文字・空白のみをNULLに揃える"""
+    values = df[EDITABLE_COLUMNS].astype(object)
+    blank = values.apply(lambda column: column.astype("string").str.strip().eq("").fillna(False))
+    return values.mask(values.isna() | blank, None)
+
+
+def diff_table_info(original_df, edited_df):
+    """変更のあった行だけを KEY_COLUMNS + EDITABLE_COLUMNS のDataFrameで返す"""
+    original = _normalize(original_df.set_index(KEY_COLUMNS))
+    edited = _normalize(edited_df.set_index(KEY_COLUMNS)).reindex(original.index)
+
+    both_null = original.isna() & edited.isna()
+    changed_cells = ~((original == edited) | both_null)
+    changed_rows = changed_cells.any(axis=1)
+
+    return edited.loc[changed_rows].reset_index()[KEY_COLUMNS + EDITABLE_COLUMNS]
+
+
+def _merge_sql(row_count):
+    placeholders = ", ".join(["(" + ", ".join(["?"] * (len(KEY_COLUMNS) + len(EDITABLE_COLUMNS))) + ")"] * row_count)
+    source_columns = ",\n                ".join(
+        f"column{i + 1} AS {name}"
+        for i, name in enumerate(KEY_COLUMNS + EDITABLE_COLUMNS)
+    )
+    update_set = ",\n            ".join(f"target.{name} = source.{name}" for name in EDITABLE_COLUMNS)
+    return f"""
+        MERGE INTO {TABLE_INFO} AS target
+        USING (
+            SELECT
+                {source_columns}
+            FROM VALUES {placeholders}
+        ) AS source
+        ON target.LOCATION = source.LOCATION
+           AND target.TABLE_NAME = source.TABLE_NAME
+        WHEN MATCHED THEN UPDATE SET
+            {update_set}
+    """
+
+
+def apply_table_info_changes(session, changes, chunk_rows=MERGE_CHUNK_ROWS):
+    """変更セットをMERGEで反映し、{'changed': 変更行数, 'updated': 更新された行数} を返す
+
+    全チャンクを1トランザクションで実行し、途中で失敗した場合はロールバックして例外を送出する。
+    """
+    if changes.empty:
+        return {'changed': 0, 'updated': 0}
+
+    records = changes[KEY_COLUMNS + EDITABLE_COLUMNS].astype(object)
+    records = records.where(pd.notna(records), None).values.tolist()
+
+    updated = 0
+    session.sql("BEGIN").collect()
+    try:
+        for start in range(0, len(records), chunk_rows):
+            chunk = records[start:start + chunk_rows]
+            params = [value for record in chunk for value in record]
+            result = session.sql(_merge_sql(len(chunk)), params=params).collect()
+            if result:
+                updated += result[0][0]
+        session.sql("COMMIT").collect()
+    except Exception:
+        session.sql("ROLLBACK").collect()
+        raise
+
+    return {'changed': len(records), 'updated': updated}
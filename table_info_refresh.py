@@ -0,0 +1,453 @@
+# ###
+# TABLE_INFO の自動取得項目の更新（セットベース）
+#
+# 従来の INSERT / MERGE はテーブルごとに ACCOUNT_USAGE.COLUMNS への相関サブクエリを
+# 3本（カラム数・カラムコメントJSON・コメントフラグ）発行していた。
+# ここでは COLUMNS を (TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME) で1回だけ集計し、
+# TABLES に結合して MERGE する。比較用に従来の相関サブクエリ版も残している
+# （benchmarks/table_info_refresh_benchmark.py で DuckDB 上の結果と速度を比較できる）。
+#
+# sync_table_info() は差分同期を行う。データベースごとに同期済みの LAST_ALTERED
+# （最高水位）を TABLE_INFO_SYNC_STATE に保持し、それ以降に変更されたテーブルだけを
+# 再計算する。削除されたテーブルの行は物理削除せず DELETED_DATE を設定する。
+#
+# ACCOUNT_USAGE は反映が遅れ（最大数時間）、共有（IMPORTED DATABASE）データベースを含まない。
+# 毎時のタスクはデータベースごとの UPDATE_TABLE_INFO_REALTIME を並列実行し（refresh_orchestrator）、
+# この差分同期は SOURCE に ACCOUNT_USAGE を指定した場合だけ使う。
+# ###
+
+import datetime
+import math
+import time
+
+from catalog import TABLE_INFO
+from sql_utils import quote_identifier
+
+# メタデータの取得元（ACCOUNT_USAGE のスキーマ）
+ACCOUNT_USAGE = "SNOWFLAKE.ACCOUNT_USAGE"
+
+# 差分同期の状態（データベースごとの LAST_ALTERED の最高水位）
+SYNC_STATE_TABLE = "DIESELPJ_GEN.DATA_CATALOG.TABLE_INFO_SYNC_STATE"
+
+# ACCOUNT_USAGE の反映遅延を見込んで、最高水位から少し遡って再確認する
+INCREMENTAL_LOOKBACK_MINUTES = 180
+
+# データベースを指定しない同期の状態キー
+ALL_DATABASES = "*"
+
+ACCOUNT_NAME = "DIESELPJ"
+CLASSIFICATION = "SNOWFLAKE"
+
+# MERGE で更新する自動取得項目（手動入力項目は更新しない）
+AUTO_COLUMNS = [
+    "ACCOUNT",
+    "CLASSIFICATION",
+    "COLUMN_NUM",
+    "CREATION_DATE",
+    "UPDATE_DATE",
+    "TABLE_COMMENT",
+    "COLUMN_COMMENT",
+    "COLUMN_COMMENT_FLAG",
+]
+
+# カラムコメントJSONの1要素（従来のSQLと同じ組み立て方）
+_COLUMN_JSON = """'{"column":"' || c.COLUMN_NAME || '","comment":"' || REPLACE(IFNULL(c.COMMENT, ''), '"', '\\\\"') || '"}'"""
+
+# コメントなしの判定
+_NO_COMMENT = "(c.COMMENT IS NULL OR LENGTH(TRIM(c.COMMENT)) = 0)"
+
+
+def _ordered_listagg(expression, order_by, dialect):
+    """順序付きのLISTAGG（DuckDB は WITHIN GROUP を受け付けないため書き方を変える）"""
+    if dialect == "duckdb":
+        return f"LISTAGG({expression}, ',' ORDER BY {order_by})"
+    return f"LISTAGG({expression}, ',') WITHIN GROUP (ORDER BY {order_by})"
+
+
+def _table_filter(database, changed_since=False):
+    clauses = []
+    if database:
+        clauses.append("AND t.TABLE_CATALOG = ?")
+    if changed_since:
+        clauses.append("AND t.LAST_ALTERED > ?::TIMESTAMP_LTZ")
+    return "\n          ".join(clauses)
+
+
+def source_sql(source=ACCOUNT_USAGE, database=None, dialect="snowflake", changed_since=False):
+    """セットベース版: 対象テーブルの COLUMNS を1回だけ集計して TABLES に結合する
+
+    database / changed_since を指定した場合はバインド変数（?）が付く（source_params で作る）。
+    database を指定した場合は COLUMNS 側もそのデータベースに絞り、アカウント全体を集計しない。
+    changed_since=True のときは LAST_ALTERED が指定時刻より後のテーブルだけを対象にする。
+    """
+    return f"""
+        WITH TARGET_TABLES AS (
+            SELECT
+                t.TABLE_CATALOG,
+                t.TABLE_SCHEMA,
+                t.TABLE_NAME,
+                t.COMMENT,
+                t.CREATED,
+                t.LAST_ALTERED
+            FROM {source}.TABLES t
+            WHERE t.TABLE_TYPE = 'BASE TABLE'
+              AND t.DELETED IS NULL
+              AND t.TABLE_SCHEMA NOT IN ('INFORMATION_SCHEMA')
+              {_table_filter(database, changed_since)}
+        ),
+        COLUMN_STATS AS (
+            SELECT
+                c.TABLE_CATALOG,
+                c.TABLE_SCHEMA,
+                c.TABLE_NAME,
+                COUNT(*) AS COLUMN_NUM,
+                '[' || {_ordered_listagg(_COLUMN_JSON, "c.ORDINAL_POSITION", dialect)} || ']' AS COLUMN_COMMENT,
+                COUNT_IF({_NO_COMMENT}) AS NO_COMMENT_NUM
+            FROM {source}.COLUMNS c
+            JOIN TARGET_TABLES t
+              ON c.TABLE_CATALOG = t.TABLE_CATALOG
+             AND c.TABLE_SCHEMA = t.TABLE_SCHEMA
+             AND c.TABLE_NAME = t.TABLE_NAME
+            WHERE c.DELETED IS NULL
+              {"AND c.TABLE_CATALOG = ?" if database else ""}
+            GROUP BY c.TABLE_CATALOG, c.TABLE_SCHEMA, c.TABLE_NAME
+        )
+        SELECT
+            t.TABLE_NAME,
+            CONCAT(t.TABLE_CATALOG, '.', t.TABLE_SCHEMA) AS LOCATION,
+            '{ACCOUNT_NAME}' AS ACCOUNT,
+            '{CLASSIFICATION}' AS CLASSIFICATION,
+            COALESCE(cs.COLUMN_NUM, 0) AS COLUMN_NUM,
+            NULL AS RECORD_NUM,
+            t.CREATED AS CREATION_DATE,
+            t.LAST_ALTERED AS UPDATE_DATE,
+            t.COMMENT AS TABLE_COMMENT,
+            -- 有効なカラムが1つもないテーブルは従来どおり NULL（'[]' にしない）
+            cs.COLUMN_COMMENT AS COLUMN_COMMENT,
+            CASE WHEN COALESCE(cs.NO_COMMENT_NUM, 0) = 0 THEN 1 ELSE 0 END AS COLUMN_COMMENT_FLAG
+        FROM TARGET_TABLES t
+        LEFT JOIN COLUMN_STATS cs
+          ON cs.TABLE_CATALOG = t.TABLE_CATALOG
+         AND cs.TABLE_SCHEMA = t.TABLE_SCHEMA
+         AND cs.TABLE_NAME = t.TABLE_NAME
+    """
+
+
+def legacy_source_sql(source=ACCOUNT_USAGE, database=None):
+    """従来版: テーブルごとに COLUMNS への相関サブクエリを3本発行する（比較用）"""
+    def correlated(extra=""):
+        return f"""
+            FROM {source}.COLUMNS c
+            WHERE c.TABLE_CATALOG = t.TABLE_CATALOG
+              AND c.TABLE_SCHEMA = t.TABLE_SCHEMA
+              AND c.TABLE_NAME = t.TABLE_NAME
+              AND c.DELETED IS NULL
+              {extra}"""
+
+    return f"""
+        SELECT
+            t.TABLE_NAME,
+            CONCAT(t.TABLE_CATALOG, '.', t.TABLE_SCHEMA) AS LOCATION,
+            '{ACCOUNT_NAME}' AS ACCOUNT,
+            '{CLASSIFICATION}' AS CLASSIFICATION,
+            (SELECT COUNT(*) {correlated()}) AS COLUMN_NUM,
+            NULL AS RECORD_NUM,
+            t.CREATED AS CREATION_DATE,
+            t.LAST_ALTERED AS UPDATE_DATE,
+            t.COMMENT AS TABLE_COMMENT,
+            (SELECT '[' || LISTAGG(c.COLUMN_JSON, ',') || ']'
+             FROM (
+                 SELECT {_COLUMN_JSON} AS COLUMN_JSON
+                 {correlated()}
+                 ORDER BY c.ORDINAL_POSITION
+             ) c
+            ) AS COLUMN_COMMENT,
+            CASE
+                WHEN (SELECT COUNT(*) {correlated("AND " + _NO_COMMENT)}) = 0
+                THEN 1
+                ELSE 0
+            END AS COLUMN_COMMENT_FLAG
+        FROM {source}.TABLES t
+        WHERE t.TABLE_TYPE = 'BASE TABLE'
+          AND t.DELETED IS NULL
+          AND t.TABLE_SCHEMA NOT IN ('INFORMATION_SCHEMA')
+          {_table_filter(database)}
+    """
+
+
+def _timestamp_param(value):
+    """タイムゾーン付きの時刻をそのまま渡せるよう ISO 形式の文字列にする"""
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+def build_params(database=None, changed_since=None):
+    """legacy_source_sql と TABLES だけを読むクエリに渡すバインド変数"""
+    params = []
+    if database:
+        params.append(database)
+    if changed_since is not None:
+        params.append(_timestamp_param(changed_since))
+    return params
+
+
+def source_params(database=None, changed_since=None):
+    """source_sql に渡すバインド変数（COLUMNS 側のデータベース条件を含む）"""
+    params = build_params(database, changed_since)
+    if database:
+        params.append(database)
+    return params
+
+
+class DeadlineExceeded(TimeoutError):
+    """データベースごとの期限を過ぎた"""
+
+
+def statement_params_until(deadline, statement_params=None, clock=time.monotonic):
+    """期限（clock() の値）までの残り秒数を STATEMENT_TIMEOUT_IN_SECONDS に設定した statement_params
+
+    元の statement_params のタイムアウトの方が短い場合はそちらを使う。期限を過ぎていれば DeadlineExceeded。
+    """
+    if deadline is None:
+        return statement_params
+    remaining = deadline - clock()
+    if remaining <= 0:
+        raise DeadlineExceeded("データベースごとの期限を超過しました")
+    params = dict(statement_params or {})
+    timeout = math.ceil(remaining)
+    if params.get("STATEMENT_TIMEOUT_IN_SECONDS"):
+        timeout = min(timeout, int(params["STATEMENT_TIMEOUT_IN_SECONDS"]))
+    params["STATEMENT_TIMEOUT_IN_SECONDS"] = timeout
+    return params
+
+
+def merge_sql(source_query):
+    """取得元のSELECTから TABLE_INFO への MERGE 文を作る
+
+    値が変わった行（または削除フラグが付いていた行）だけを更新するため、
+    MERGE の更新件数がそのまま「変更された行数」になる。
+    """
+    update_set = ",\n            ".join(f"target.{name} = source.{name}" for name in AUTO_COLUMNS)
+    changed = "\n              OR ".join(
+        f"target.{name} IS DISTINCT FROM source.{name}" for name in AUTO_COLUMNS
+    )
+    return f"""
+        MERGE INTO {TABLE_INFO} AS target
+        USING ({source_query}) AS source
+        ON target.TABLE_NAME = source.TABLE_NAME
+           AND target.LOCATION = source.LOCATION
+        WHEN MATCHED AND (
+              {changed}
+              OR target.DELETED_DATE IS NOT NULL
+        ) THEN UPDATE SET
+            {update_set},
+            target.DELETED_DATE = NULL
+        WHEN NOT MATCHED THEN INSERT (
+            TABLE_NAME, LOCATION, ACCOUNT, CLASSIFICATION, COLUMN_NUM, RECORD_NUM,
+            CREATION_DATE, UPDATE_DATE, TABLE_COMMENT, COLUMN_COMMENT, COLUMN_COMMENT_FLAG
+        ) VALUES (
+            source.TABLE_NAME, source.LOCATION, source.ACCOUNT, source.CLASSIFICATION,
+            source.COLUMN_NUM, source.RECORD_NUM, source.CREATION_DATE, source.UPDATE_DATE,
+            source.TABLE_COMMENT, source.COLUMN_COMMENT, source.COLUMN_COMMENT_FLAG
+        )
+    """
+
+
+def flag_deleted_sql(source=ACCOUNT_USAGE, database=None):
+    """削除されたテーブルの行に DELETED_DATE を付ける UPDATE 文
+
+    ACCOUNT_USAGE.TABLES にデータベースの行が1件もない場合（参照権限がないなど）は
+    全行を削除扱いにしないよう対象外にする。
+    """
+    database_filter = "AND SPLIT_PART(target.LOCATION, '.', 1) = ?" if database else ""
+    return f"""
+        UPDATE {TABLE_INFO} AS target
+        SET DELETED_DATE = CURRENT_TIMESTAMP()
+        WHERE target.DELETED_DATE IS NULL
+          AND target.CLASSIFICATION = '{CLASSIFICATION}'
+          {database_filter}
+          AND NOT EXISTS (
+              SELECT 1
+              FROM {source}.TABLES t
+              WHERE t.TABLE_TYPE = 'BASE TABLE'
+                AND t.DELETED IS NULL
+                AND CONCAT(t.TABLE_CATALOG, '.', t.TABLE_SCHEMA) = target.LOCATION
+                AND t.TABLE_NAME = target.TABLE_NAME
+          )
+          AND EXISTS (
+              SELECT 1
+              FROM {source}.TABLES t
+              WHERE t.TABLE_CATALOG = SPLIT_PART(target.LOCATION, '.', 1)
+          )
+    """
+
+
+def flag_deleted_realtime_sql(database):
+    """1データベースの INFORMATION_SCHEMA.TABLES にないテーブルの行に DELETED_DATE を付ける UPDATE 文
+    （バインド変数: データベース名）
+
+    UPDATE_TABLE_INFO_REALTIME は削除を反映しないため、その後にデータベースごとに実行する。
+    flag_deleted_sql と同じく、テーブルが1件も見えない場合（参照権限がないなど）は対象外にする。
+    """
+    information_schema = f"{quote_identifier(database)}.INFORMATION_SCHEMA"
+    return f"""
+        UPDATE {TABLE_INFO} AS target
+        SET DELETED_DATE = CURRENT_TIMESTAMP()
+        WHERE target.DELETED_DATE IS NULL
+          AND target.CLASSIFICATION = '{CLASSIFICATION}'
+          AND SPLIT_PART(target.LOCATION, '.', 1) = ?
+          AND NOT EXISTS (
+              SELECT 1
+              FROM {information_schema}.TABLES t
+              WHERE t.TABLE_TYPE = 'BASE TABLE'
+                AND CONCAT(t.TABLE_CATALOG, '.', t.TABLE_SCHEMA) = target.LOCATION
+                AND t.TABLE_NAME = target.TABLE_NAME
+          )
+          AND EXISTS (
+              SELECT 1
+              FROM {information_schema}.TABLES t
+              WHERE t.TABLE_TYPE = 'BASE TABLE'
+          )
+    """
+
+def _high_water_mark(session, database, statement_params=None):
+    result = session.sql(
+        f"SELECT HIGH_WATER_MARK FROM {SYNC_STATE_TABLE} WHERE DATABASE_NAME = ?",
+        params=[database or ALL_DATABASES]
+    ).collect(statement_params=statement_params)
+    return result[0]['HIGH_WATER_MARK'] if result else None
+
+
+def _examine(session, source, database, changed_since, statement_params=None):
+    """同期対象になるテーブル数と、その中の最新の LAST_ALTERED"""
+    result = session.sql(f"""
+        SELECT COUNT(*) AS EXAMINED, MAX(t.LAST_ALTERED) AS MAX_LAST_ALTERED
+        FROM {source}.TABLES t
+        WHERE t.TABLE_TYPE = 'BASE TABLE'
+          AND t.DELETED IS NULL
+          AND t.TABLE_SCHEMA NOT IN ('INFORMATION_SCHEMA')
+          {_table_filter(database, changed_since is not None)}
+    """, params=build_params(database, changed_since)).collect(statement_params=statement_params)
+    return result[0]['EXAMINED'], result[0]['MAX_LAST_ALTERED']
+
+
+def _save_sync_state(session, database, high_water_mark, report, statement_params=None):
+    session.sql(f"""
+        MERGE INTO {SYNC_STATE_TABLE} AS target
+        USING (
+            SELECT
+                ? AS DATABASE_NAME,
+                ?::TIMESTAMP_LTZ AS HIGH_WATER_MARK,
+                ? AS MODE,
+                ? AS ROWS_EXAMINED,
+                ? AS ROWS_CHANGED,
+                ? AS ROWS_DELETED
+        ) AS source
+        ON target.DATABASE_NAME = source.DATABASE_NAME
+        WHEN MATCHED THEN UPDATE SET
+            target.HIGH_WATER_MARK = GREATEST_IGNORE_NULLS(target.HIGH_WATER_MARK, source.HIGH_WATER_MARK),
+            target.LAST_RUN_AT = CURRENT_TIMESTAMP(),
+            target.MODE = source.MODE,
+            target.ROWS_EXAMINED = source.ROWS_EXAMINED,
+            target.ROWS_CHANGED = source.ROWS_CHANGED,
+            target.ROWS_DELETED = source.ROWS_DELETED
+        WHEN NOT MATCHED THEN INSERT (
+            DATABASE_NAME, HIGH_WATER_MARK, LAST_RUN_AT, MODE, ROWS_EXAMINED, ROWS_CHANGED, ROWS_DELETED
+        ) VALUES (
+            source.DATABASE_NAME, source.HIGH_WATER_MARK, CURRENT_TIMESTAMP(), source.MODE,
+            source.ROWS_EXAMINED, source.ROWS_CHANGED, source.ROWS_DELETED
+        )
+    """, params=[
+        database or ALL_DATABASES,
+        _timestamp_param(high_water_mark),
+        report['mode'],
+        report['examined'],
+        report['changed'],
+        report['deleted'],
+    ]).collect(statement_params=statement_params)
+
+
+def sync_table_info(session, database=None, source=ACCOUNT_USAGE, full=False,
+                    lookback_minutes=INCREMENTAL_LOOKBACK_MINUTES, statement_params=None,
+                    deadline=None, clock=time.monotonic):
+    """TABLE_INFO を差分同期する
+
+    前回の最高水位（LAST_ALTERED）以降に変更されたテーブルだけを再計算して MERGE し、
+    削除されたテーブルの行には DELETED_DATE を付ける。
+    初回（最高水位なし）または full=True のときは全テーブルを対象にする。
+    statement_params はすべてのクエリに渡す（STATEMENT_TIMEOUT_IN_SECONDS など）。
+    deadline（clock() の値）を渡すと各クエリのタイムアウトを期限までの残り秒数に縮め、
+    期限を過ぎていれば次のクエリを発行せずに DeadlineExceeded を送出する。
+    戻り値: {'database', 'mode', 'since', 'examined', 'inserted', 'updated', 'changed',
+             'deleted', 'high_water_mark', 'seconds'}
+    """
+    started = time.perf_counter()
+
+    def params():
+        return statement_params_until(deadline, statement_params, clock)
+
+    high_water_mark = None if full else _high_water_mark(session, database, params())
+    since = None
+    if high_water_mark is not None:
+        since = high_water_mark - datetime.timedelta(minutes=lookback_minutes)
+
+    examined, max_last_altered = _examine(session, source, database, since, params())
+
+    inserted = updated = 0
+    if examined:
+        result = session.sql(
+            merge_sql(source_sql(source, database, changed_since=since is not None)),
+            params=source_params(database, since)
+        ).collect(statement_params=params())
+        if result:
+            inserted, updated = result[0][0], result[0][1]
+
+    result = session.sql(
+        flag_deleted_sql(source, database),
+        params=[database] if database else []
+    ).collect(statement_params=params())
+    deleted = result[0][0] if result else 0
+
+    report = {
+        'database': database,
+        'mode': "incremental" if since is not None else "full",
+        'since': since,
+        'examined': examined,
+        'inserted': inserted,
+        'updated': updated,
+        'changed': inserted + updated,
+        'deleted': deleted,
+        'high_water_mark': max_last_altered or high_water_mark,
+    }
+    _save_sync_state(session, database, report['high_water_mark'], report, params())
+    report['seconds'] = time.perf_counter() - started
+    return report
+
+
+def format_sync_report(report):
+    """同期結果の1行要約"""
+    return (
+        f"{report['database'] or '全データベース'}: "
+        f"{'差分' if report['mode'] == 'incremental' else '全件'}同期 "
+        f"確認 {report['examined']}件 / 変更 {report['changed']}件"
+        f"（新規 {report['inserted']}件・更新 {report['updated']}件） / 削除フラグ {report['deleted']}件"
+    )
+
+
+def refresh_table_info(session, database=None, source=ACCOUNT_USAGE):
+    """TABLE_INFO の自動取得項目をセットベースの MERGE 1文で更新する
+
+    database を指定するとそのデータベースのテーブルだけを対象にする。
+    戻り値: {'database', 'inserted', 'updated', 'seconds'}
+    """
+    started = time.perf_counter()
+    result = session.sql(
+        merge_sql(source_sql(source, database)),
+        params=source_params(database)
+    ).collect()
+    inserted, updated = (result[0][0], result[0][1]) if result else (0, 0)
+    return {
+        'database': database,
+        'inserted': inserted,
+        'updated': updated,
+        'seconds': time.perf_counter() - started,
+    }
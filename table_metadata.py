@@ -0,0 +1,192 @@
+# ###
+# テーブル単位のメタデータ（コメント生成アプリ用）
+#
+# コメント生成アプリは再実行のたびに SHOW DATABASES / SCHEMAS / TABLES と、
+# INFORMATION_SCHEMA.TABLES（左右のパネルで2回）・COLUMNS を問い合わせていた。ここでは
+# - テーブルコメントを (データベース, スキーマ, テーブル) ごとに保持し（コメント保存時に失効させる）、
+#   カラム一覧（型・コメント）は column_metadata のスキーマ単位のキャッシュから取る
+#   （カラム情報のキャッシュは column_metadata の1か所だけにする）
+# - SHOW の一覧はTTL付きで保持する
+# 一括処理向けの fetch_table_metadata() はキャッシュを通さず、TABLES と COLUMNS の結合1文で取得する。
+# ###
+
+import threading
+import time
+
+from column_metadata import get_columns, invalidate_columns
+from sql_utils import quote_identifier
+
+# テーブルコメントの保持時間（秒）。アプリ外でコメントが変わった場合もこの時間で反映される
+TABLE_METADATA_TTL_SECONDS = 300
+
+# SHOW DATABASES / SCHEMAS / TABLES の一覧の保持時間（秒）
+LISTING_TTL_SECONDS = 300
+
+# 保持するテーブル数の上限（超えたら古いものから破棄する）
+MAX_TABLES = 200
+
+
+def table_metadata_sql(db):
+    """テーブルコメントとカラム情報を1文で取得するSELECT文（バインド変数: スキーマ, テーブル, スキーマ, テーブル）
+
+    COLUMNS 側にもスキーマ・テーブルの条件を付け、結合前に対象テーブルのカラムだけに絞る。
+    """
+    information_schema = f"{quote_identifier(db)}.INFORMATION_SCHEMA"
+    return f"""
+        SELECT
+            t.COMMENT AS TABLE_COMMENT,
+            c.COLUMN_NAME,
+            c.DATA_TYPE,
+            c.COMMENT,
+            c.ORDINAL_POSITION
+        FROM {information_schema}.TABLES t
+        LEFT JOIN {information_schema}.COLUMNS c
+            ON c.TABLE_SCHEMA = t.TABLE_SCHEMA
+           AND c.TABLE_NAME = t.TABLE_NAME
+           AND c.TABLE_SCHEMA = ?
+           AND c.TABLE_NAME = ?
+        WHERE t.TABLE_SCHEMA = ?
+          AND t.TABLE_NAME = ?
+        ORDER BY c.ORDINAL_POSITION
+    """
+
+
+def table_comment_sql(db):
+    """テーブルコメントを取得するSELECT文（バインド変数: スキーマ, テーブル）"""
+    return f"""
+        SELECT COMMENT AS TABLE_COMMENT
+        FROM {quote_identifier(db)}.INFORMATION_SCHEMA.TABLES
+        WHERE TABLE_SCHEMA = ?
+          AND TABLE_NAME = ?
+    """
+
+
+def _build_metadata(table_comment, columns):
+    commented = sum(1 for column in columns if column['COMMENT'] is not None)
+    return {
+        'table_comment': table_comment or "",
+        'columns': columns,
+        'total_columns': len(columns),
+        'commented_columns': commented,
+        'comment_rate': commented / len(columns) * 100 if columns else 0,
+    }
+
+
+def fetch_table_metadata(session, db, schema, table):
+    """キャッシュを通さずにテーブル単位のメタデータを取得する（一括処理などで使う）"""
+    rows = session.sql(table_metadata_sql(db), params=[schema, table, schema, table]).collect()
+    columns = [
+        {
+            'COLUMN_NAME': row['COLUMN_NAME'],
+            'DATA_TYPE': row['DATA_TYPE'],
+            'COMMENT': row['COMMENT'],
+            'ORDINAL_POSITION': row['ORDINAL_POSITION'],
+        }
+        for row in rows
+        if row['COLUMN_NAME'] is not None
+    ]
+    return _build_metadata(rows[0]['TABLE_COMMENT'] if rows else None, columns)
+
+
+class TableMetadataCache:
+    """テーブルコメントとSHOWの一覧を保持する（カラム情報は column_metadata が保持する）"""
+
+    def __init__(self, ttl_seconds=TABLE_METADATA_TTL_SECONDS, listing_ttl_seconds=LISTING_TTL_SECONDS,
+                 max_tables=MAX_TABLES, clock=time.time):
+        self.ttl_seconds = ttl_seconds
+        self.listing_ttl_seconds = listing_ttl_seconds
+        self.max_tables = max_tables
+        self._clock = clock
+        self._lock = threading.Lock()
+        # key -> (読み込み時刻, 値)
+        self._tables = {}
+        self._listings = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, entries, key, ttl_seconds, load):
+        with self._lock:
+            entry = entries.get(key)
+            if entry is not None and self._clock() - entry[0] < ttl_seconds:
+                self.hits += 1
+                return entry[1]
+
+        value = load()
+
+        with self._lock:
+            self.misses += 1
+            entries[key] = (self._clock(), value)
+            if entries is self._tables:
+                while len(entries) > self.max_tables:
+                    del entries[min(entries, key=lambda name: entries[name][0])]
+        return value
+
+    def get_table(self, session, db, schema, table):
+        """{'table_comment', 'columns', 'total_columns', 'commented_columns', 'comment_rate'} を返す"""
+        def load():
+            rows = session.sql(table_comment_sql(db), params=[schema, table]).collect()
+            return rows[0]['TABLE_COMMENT'] if rows else None
+
+        table_comment = self._get(self._tables, (db, schema, table), self.ttl_seconds, load)
+        # get_columns() はキャッシュのコピーを返す
+        return _build_metadata(table_comment, get_columns(session, db, schema, table))
+
+    def list_names(self, session, command):
+        """SHOW コマンドの結果の name 一覧"""
+        def load():
+            return [row['name'] for row in session.sql(command).collect()]
+
+        return list(self._get(self._listings, command, self.listing_ttl_seconds, load))
+
+    def invalidate(self, db=None, schema=None, table=None):
+        """テーブルコメントを失効させる（何も指定しない場合はSHOWの一覧も破棄する）"""
+        with self._lock:
+            if db is None:
+                self._tables.clear()
+                self._listings.clear()
+                return
+            for key in list(self._tables):
+                if key[0] == db and (schema is None or key[1] == schema) and (table is None or key[2] == table):
+                    del self._tables[key]
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'tables': len(self._tables),
+                'listings': len(self._listings),
+            }
+
+
+# プロセス内で共有するキャッシュ（Streamlitの再実行ではモジュールは再importされない）
+_cache = TableMetadataCache()
+
+
+def get_table_metadata(session, db, schema, table):
+    return _cache.get_table(session, db, schema, table)
+
+
+def list_databases(session):
+    return _cache.list_names(session, "SHOW DATABASES")
+
+
+def list_schemas(session, db):
+    return _cache.list_names(session, f"SHOW SCHEMAS IN DATABASE {quote_identifier(db)}")
+
+
+def list_tables(session, db, schema):
+    return _cache.list_names(session, f"SHOW TABLES IN {quote_identifier(db)}.{quote_identifier(schema)}")
+
+
+def invalidate_table_metadata(db=None, schema=None, table=None):
+    """テーブルコメントを失効させる（何も指定しない場合はカラム情報も含めてすべて破棄する）"""
+    _cache.invalidate(db, schema, table)
+    if db is None:
+        invalidate_columns()
+
+
+def table_metadata_stats():
+    return _cache.stats()
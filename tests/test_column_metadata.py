@@ -0,0 +1,68 @@
+import threading
+
+from column_metadata import ColumnMetadataCache
+from fake_session import FakeSession
+
+
+def _columns_handler(release=None, started=None):
+    """INFORMATION_SCHEMA.COLUMNS の結果を返す（release を渡すと DB_SLOW の読み込みを止めておく）"""
+    def handler(query, params):
+        if release is not None and '"DB_SLOW"' in query:
+            started.set()
+            release.wait(5)
+        return [
+            {'TABLE_NAME': 'T1', 'COLUMN_NAME': 'ID', 'DATA_TYPE': 'NUMBER', 'COMMENT': None, 'ORDINAL_POSITION': 1},
+            {'TABLE_NAME': 'T2', 'COLUMN_NAME': 'NAME', 'DATA_TYPE': 'TEXT', 'COMMENT': 'x', 'ORDINAL_POSITION': 1},
+        ]
+    return handler
+
+
+def test_schema_load_does_not_block_other_schemas():
+    release, started = threading.Event(), threading.Event()
+    cache = ColumnMetadataCache()
+    session = FakeSession(handler=_columns_handler(release, started))
+    cache.get_columns(session, "DB_FAST", "S", "T1")
+
+    slow = threading.Thread(target=cache.get_columns, args=(session, "DB_SLOW", "S", "T1"))
+    slow.start()
+    started.wait(5)
+    try:
+        # DB_SLOW の読み込み中でも、読み込み済みのスキーマはすぐ返る
+        fast = threading.Thread(target=cache.get_columns, args=(session, "DB_FAST", "S", "T2"))
+        fast.start()
+        fast.join(1)
+        assert not fast.is_alive()
+    finally:
+        release.set()
+        slow.join(5)
+    assert cache.stats()['schema_loads'] == 2
+
+
+def test_concurrent_loads_of_one_schema_query_once():
+    cache = ColumnMetadataCache()
+    session = FakeSession(handler=_columns_handler())
+    threads = [threading.Thread(target=cache.get_columns, args=(session, "DB", "S", "T1")) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(session.executed) == 1
+    assert cache.stats()['hits'] == 7
+
+
+def test_invalidation_during_load_is_not_overwritten():
+    release, started = threading.Event(), threading.Event()
+    cache = ColumnMetadataCache()
+    session = FakeSession(handler=_columns_handler(release, started))
+
+    loader = threading.Thread(target=cache.get_columns, args=(session, "DB_SLOW", "S", "T1"))
+    loader.start()
+    started.wait(5)
+    cache.invalidate("DB_SLOW", "S", "T1")
+    release.set()
+    loader.join(5)
+
+    # 失効前に読み始めた結果は登録せず、次回は読み直す
+    cache.get_columns(session, "DB_SLOW", "S", "T1")
+    assert cache.stats()['schema_loads'] == 2
@@ -0,0 +1,56 @@
+import re
+
+from column_sampler import _profile_chunk_sql, profile_columns
+from fake_session import FakeSession
+
+COLUMNS = [
+    {'COLUMN_NAME': 'ID', 'DATA_TYPE': 'NUMBER'},
+    {'COLUMN_NAME': 'BAD', 'DATA_TYPE': 'TEXT'},
+    {'COLUMN_NAME': 'NAME', 'DATA_TYPE': 'TEXT'},
+]
+
+
+def _aggregate_row(query):
+    """集計SQLの別名（NN_0 など）に合わせた結果行を返す"""
+    row = {'SAMPLED_ROWS': 10}
+    for i in sorted({int(index) for index in re.findall(r"AS NN_(\d+)", query)}):
+        row.update({f'NN_{i}': 8, f'ND_{i}': 3, f'MIN_{i}': 1, f'MAX_{i}': 9, f'S_{i}': '["a", "b"]'})
+    return [row]
+
+
+def _handler(query, params):
+    # "BAD" カラムを含む集計は型エラーになる
+    if '"BAD"' in query:
+        raise RuntimeError("Invalid argument types for function 'APPROX_COUNT_DISTINCT'")
+    return _aggregate_row(query)
+
+
+def test_unsupported_types_are_aggregated_as_strings():
+    sql = _profile_chunk_sql('"DB"."S"."T"', [{'COLUMN_NAME': 'GEO', 'DATA_TYPE': 'GEOGRAPHY'}], 100, 5, 50, "limit")
+
+    assert 'APPROX_COUNT_DISTINCT(TO_VARCHAR("GEO"))' in sql
+    assert 'COUNT("GEO")' in sql
+
+
+def test_failed_chunk_falls_back_to_single_columns():
+    session = FakeSession(handler=_handler)
+
+    profiles = profile_columns(session, "DB", "S", "T", COLUMNS)
+
+    assert profiles['ID'].samples == ["a", "b"]
+    assert profiles['NAME'].samples == ["a", "b"]
+    assert profiles['BAD'].samples == []
+    assert "APPROX_COUNT_DISTINCT" in profiles['BAD'].error
+    assert profiles['BAD'].summary() == "不明"
+    # チャンク1回 + 1カラムずつ3回
+    assert len(session.executed) == 4
+
+
+def test_healthy_chunk_uses_one_statement():
+    session = FakeSession(handler=_handler)
+
+    profiles = profile_columns(session, "DB", "S", "T", [COLUMNS[0], COLUMNS[2]])
+
+    assert set(profiles) == {'ID', 'NAME'}
+    assert profiles['ID'].min_value == 1
+    assert len(session.executed) == 1
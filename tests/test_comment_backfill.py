@@ -0,0 +1,91 @@
+from comment_backfill import apply_reviewed_comments, backfill_comments
+from fake_session import FakeSession
+
+APPROVED_ROWS = [
+    {'LOCATION': 'DB.S', 'TABLE_NAME': 'T', 'COLUMN_NAME': None, 'CURRENT_COMMENT': None, 'COMMENT_TEXT': '生成テーブル'},
+    {'LOCATION': 'DB.S', 'TABLE_NAME': 'T', 'COLUMN_NAME': 'A', 'CURRENT_COMMENT': None, 'COMMENT_TEXT': '生成A'},
+    {'LOCATION': 'DB.S', 'TABLE_NAME': 'T', 'COLUMN_NAME': 'B', 'CURRENT_COMMENT': None, 'COMMENT_TEXT': '生成B'},
+    {'LOCATION': 'DB.S', 'TABLE_NAME': 'T', 'COLUMN_NAME': 'C', 'CURRENT_COMMENT': None, 'COMMENT_TEXT': '生成C'},
+]
+
+
+def _live_metadata(table_comment):
+    # 生成後に B のコメントが手入力され、C は削除された
+    return [
+        {'TABLE_COMMENT': table_comment, 'COLUMN_NAME': 'A', 'DATA_TYPE': 'TEXT', 'COMMENT': None, 'ORDINAL_POSITION': 1},
+        {'TABLE_COMMENT': table_comment, 'COLUMN_NAME': 'B', 'DATA_TYPE': 'TEXT', 'COMMENT': '手入力', 'ORDINAL_POSITION': 2},
+    ]
+
+
+def _session(table_comment):
+    return FakeSession(responses=[
+        (r"FROM \S+COMMENT_BACKFILL_STAGING\s+WHERE REVIEW_STATUS = 'APPROVED'", APPROVED_ROWS),
+        (r"INFORMATION_SCHEMA\.TABLES", _live_metadata(table_comment)),
+    ])
+
+
+def _statuses(results):
+    return {result['COLUMN_NAME']: result['STATUS'] for result in results}
+
+
+def test_changed_comments_are_not_overwritten():
+    session = _session(table_comment="手入力テーブル")
+
+    results = apply_reviewed_comments(session)
+
+    assert _statuses(results) == {None: 'CONFLICT', 'A': 'OK', 'B': 'CONFLICT', 'C': 'CONFLICT'}
+    alters = [query for query, params in session.executed if "ALTER TABLE" in query]
+    assert len(alters) == 1 and '"A"' in alters[0] and "SET COMMENT" not in alters[0]
+    updates = {params[0]: params[3:] for query, params in session.executed if query.lstrip().startswith("UPDATE")}
+    assert sorted(updates) == ['APPLIED', 'CONFLICT']
+    assert updates['APPLIED'] == ['A']
+
+
+def test_unchanged_table_comment_is_applied():
+    session = _session(table_comment=None)
+
+    results = apply_reviewed_comments(session)
+
+    assert _statuses(results)[None] == 'OK'
+    assert any("SET COMMENT" in query for query, params in session.executed)
+
+
+def _backfill_session():
+    # BIG は長いカラム名のコメントなしカラムが多く、見込みが予算全体を超える。SMALL はテーブルコメントだけ生成する
+    metadata = {
+        'BIG': [
+            {'TABLE_COMMENT': 'テーブル', 'COLUMN_NAME': f"COLUMN_{i}_{'X' * 200}", 'DATA_TYPE': 'TEXT',
+             'COMMENT': None, 'ORDINAL_POSITION': i}
+            for i in range(1, 51)
+        ],
+        'SMALL': [
+            {'TABLE_COMMENT': None, 'COLUMN_NAME': 'ID', 'DATA_TYPE': 'NUMBER', 'COMMENT': 'ID', 'ORDINAL_POSITION': 1},
+        ],
+    }
+
+    def handler(query, params):
+        if "COMMENT_BACKFILL_STATE s" in query:
+            return [{'LOCATION': 'DB.S', 'TABLE_NAME': 'BIG'}, {'LOCATION': 'DB.S', 'TABLE_NAME': 'SMALL'}]
+        if "INFORMATION_SCHEMA.TABLES" in query:
+            return metadata[params[-1]]
+        if "CORTEX.COMPLETE" in query:
+            return [{'RESPONSE': '生成テーブル'}]
+        return []
+
+    return FakeSession(handler=handler)
+
+
+def test_over_budget_table_does_not_block_smaller_tables():
+    session = _backfill_session()
+
+    run_id, budget, results = backfill_comments(session, max_concurrency=1, token_budget=3000)
+
+    by_table = {result['TABLE_NAME']: result for result in results}
+    assert by_table['BIG']['STATUS'] == 'SKIPPED'
+    assert by_table['BIG']['ESTIMATED_TOKENS'] > 3000
+    assert by_table['SMALL']['STATUS'] == 'DONE'
+    assert by_table['SMALL']['TABLE_COMMENT_GENERATED']
+    assert 0 < budget.used == by_table['SMALL']['ESTIMATED_TOKENS']
+    # BIG は理由付きで STATE に記録され、次回の対象から外れる
+    checkpoints = {params[1]: params[3] for query, params in session.executed if "MERGE INTO" in query}
+    assert checkpoints == {'BIG': 'SKIPPED', 'SMALL': 'DONE'}
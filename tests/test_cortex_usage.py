@@ -0,0 +1,68 @@
+import pytest
+
+from comment_generation import PromptTooLongError, build_column_prompt
+from cortex import CortexUsageLog, estimate_tokens
+from fake_session import FakeSession
+from query_log import instrument_session
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _inserts(session):
+    return [params for query, params in session.executed if "INSERT INTO" in query]
+
+
+def test_usage_is_persisted_with_source_and_target():
+    log = CortexUsageLog()
+    app_session = instrument_session(FakeSession(), page="コメント生成", log_to_table=False)
+    batch_session = FakeSession()
+
+    log.record("DB.S.T", "COMPLETE", "m", 100, 20, session=app_session)
+    log.record("DB.S.T", "TRY_COMPLETE", "m", 300, 60, prompts=5, session=batch_session)
+
+    app_row = _inserts(app_session.unwrapped)[0]
+    batch_row = _inserts(batch_session)[0]
+    assert app_row[1:] == ["コメント生成", "DB.S.T", "COMPLETE", "m", 1, 100, 20]
+    assert batch_row[1:] == ["BATCH", "DB.S.T", "TRY_COMPLETE", "m", 5, 300, 60]
+    # 書き込みは計測対象（アプリのクエリ記録）に含めない
+    assert not app_session.recorder.records
+    assert log.stats()['persisted'] == 2
+
+
+def test_failed_persist_waits_before_retrying():
+    clock = FakeClock()
+    log = CortexUsageLog(retry_seconds=300, clock=clock)
+
+    def missing_table(query, params):
+        raise RuntimeError("Table 'CORTEX_USAGE_LOG' does not exist")
+
+    session = FakeSession(handler=missing_table)
+    log.record("T", "COMPLETE", "m", 1, 1, session=session)
+    log.record("T", "COMPLETE", "m", 1, 1, session=session)
+    assert len(session.executed) == 1
+
+    clock.now = 301
+    session.handler = None
+    log.record("T", "COMPLETE", "m", 1, 1, session=session)
+    assert len(session.executed) == 2
+    stats = log.stats()
+    assert (stats['requests'], stats['persisted'], stats['persist_errors']) == (3, 1, 1)
+
+
+def test_column_prompt_never_exceeds_cap():
+    long_name = "長" * 255
+    prompt = build_column_prompt(long_name, "説明" * 200, long_name, "VARCHAR", ["値"] * 10, "概要" * 300,
+                                 max_tokens=400)
+
+    assert estimate_tokens(prompt) <= 400
+
+
+def test_column_prompt_rejected_when_template_exceeds_cap():
+    with pytest.raises(PromptTooLongError):
+        build_column_prompt("T", None, "C", "NUMBER", [], None, max_tokens=50)
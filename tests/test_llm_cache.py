@@ -0,0 +1,68 @@
+from llm_cache import LLMCache
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class _FlakyTier:
+    """1回目の get だけ失敗する永続層。呼び出しに使われたセッションを記録する"""
+
+    def __init__(self):
+        self.rows = {}
+        self.sessions = []
+        self.fail_next = True
+
+    def get(self, session, key, ttl_seconds):
+        self.sessions.append(session)
+        if self.fail_next:
+            self.fail_next = False
+            raise RuntimeError("warehouse suspended")
+        return self.rows.get(key)
+
+    def put(self, session, key, query, model, prompt_version, response):
+        self.sessions.append(session)
+        self.rows[key] = response
+
+
+def test_persistent_tier_retries_after_cooldown():
+    clock = _Clock()
+    tier = _FlakyTier()
+    cache = LLMCache(persistent=tier, retry_seconds=60, clock=clock)
+
+    assert cache.get_or_compute("q1", "m", "v1", lambda: "a1", session="s1") == "a1"
+    assert cache.stats()['persistent_errors'] == 1
+    # 待機中は永続層を使わない（put もしない）
+    assert tier.sessions == ["s1"]
+
+    clock.now += 61
+    assert cache.get_or_compute("q2", "m", "v1", lambda: "a2", session="s2") == "a2"
+    assert tier.sessions == ["s1", "s2", "s2"]
+    assert list(tier.rows.values()) == ["a2"]
+
+
+def test_persistent_tier_uses_the_callers_session():
+    tier = _FlakyTier()
+    tier.fail_next = False
+    tier.rows = {}
+    cache = LLMCache(persistent=tier)
+
+    cache.get_or_compute("q", "m", "v1", lambda: "a", session="session-a")
+    cache.clear()
+    assert cache.get_or_compute("q", "m", "v1", lambda: "unused", session="session-b") == "a"
+
+    assert tier.sessions == ["session-a", "session-a", "session-b"]
+    assert cache.stats()['persistent_hits'] == 1
+
+
+def test_without_session_only_memory_tier_is_used():
+    tier = _FlakyTier()
+    cache = LLMCache(persistent=tier)
+
+    assert cache.get_or_compute("q", "m", "v1", lambda: "a") == "a"
+    assert cache.get_or_compute("q", "m", "v1", lambda: "unused") == "a"
+    assert tier.sessions == []
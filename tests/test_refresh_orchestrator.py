@@ -0,0 +1,119 @@
+import pytest
+
+from fake_session import FakeSession
+from refresh_orchestrator import (
+    SOURCE_ACCOUNT_USAGE,
+    parse_realtime_result,
+    refresh_all_databases,
+    refresh_database,
+    summarize_results,
+)
+from table_info_refresh import DeadlineExceeded, source_params, source_sql, statement_params_until
+
+SHOW_DATABASES = [
+    {'name': 'DIESELPJ_GEN', 'kind': 'STANDARD'},
+    {'name': 'KF67257_IP16082_SHARE_DIESELPJ', 'kind': 'IMPORTED DATABASE'},
+]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_realtime_refresh_calls_procedure_per_database():
+    session = FakeSession(responses=[
+        (r"SHOW DATABASES", SHOW_DATABASES),
+        (r"CALL .*UPDATE_TABLE_INFO_REALTIME", [{'RESULT': "更新: 3件, 新規挿入: 2件, エラー: 0件"}]),
+    ])
+
+    results = refresh_all_databases(session, max_workers=2)
+
+    calls = [params for query, params in session.executed if "UPDATE_TABLE_INFO_REALTIME" in query]
+    assert sorted(calls) == [['DIESELPJ_GEN'], ['KF67257_IP16082_SHARE_DIESELPJ']]
+    assert [result['status'] for result in results] == ["OK", "OK"]
+    assert results[0]['updated'] == 3 and results[0]['inserted'] == 2
+
+
+def test_realtime_refresh_flags_deleted_tables():
+    session = FakeSession(responses=[
+        (r"CALL .*UPDATE_TABLE_INFO_REALTIME", [{'RESULT': "更新: 3件, 新規挿入: 0件, エラー: 0件"}]),
+        (r"UPDATE .*TABLE_INFO", [{'number of rows updated': 2}]),
+    ])
+
+    result = refresh_database(session, "DIESELPJ_GEN")
+
+    queries = [query for query, params in session.executed]
+    assert "UPDATE_TABLE_INFO_REALTIME" in queries[0]
+    assert '"DIESELPJ_GEN".INFORMATION_SCHEMA.TABLES' in queries[1]
+    assert session.executed[1][1] == ['DIESELPJ_GEN']
+    assert result['status'] == "OK"
+    assert result['deleted'] == 2
+    assert summarize_results([result])['deleted'] == 2
+
+
+def test_realtime_table_errors_are_reported():
+    assert parse_realtime_result("更新: 1件, 新規挿入: 0件, エラー: 4件") == (1, 0, 4)
+    session = FakeSession(responses=[
+        (r"CALL", [{'RESULT': "更新: 1件, 新規挿入: 0件, エラー: 4件"}]),
+    ])
+
+    result = refresh_database(session, "DIESELPJ_GEN", sleep=lambda seconds: None)
+
+    assert result['status'] == "ERROR"
+    assert result['attempts'] == 1
+
+
+def test_account_usage_skips_imported_databases():
+    session = FakeSession(responses=[(r"SHOW DATABASES", SHOW_DATABASES)])
+
+    results = refresh_all_databases(session, source=SOURCE_ACCOUNT_USAGE, backoff_seconds=0)
+
+    skipped = [result for result in results if result['status'] == "SKIPPED"]
+    assert [result['database'] for result in skipped] == ['KF67257_IP16082_SHARE_DIESELPJ']
+    assert not any('KF67257' in str(params) for query, params in session.executed)
+    assert summarize_results(results)['skipped'] == 1
+
+
+def test_columns_are_filtered_by_database():
+    sql = source_sql(database="DIESELPJ_GEN")
+
+    assert sql.count("?") == len(source_params("DIESELPJ_GEN")) == 2
+    assert "c.TABLE_CATALOG = ?" in sql
+
+
+def test_statement_timeout_is_capped_by_deadline():
+    clock = FakeClock()
+    params = {"STATEMENT_TIMEOUT_IN_SECONDS": 900}
+
+    assert statement_params_until(100.0, params, clock) == {"STATEMENT_TIMEOUT_IN_SECONDS": 100}
+    clock.now = 99.5
+    assert statement_params_until(100.0, params, clock) == {"STATEMENT_TIMEOUT_IN_SECONDS": 1}
+    clock.now = 100.0
+    with pytest.raises(DeadlineExceeded):
+        statement_params_until(100.0, params, clock)
+
+
+def test_retries_stop_at_database_deadline():
+    clock = FakeClock()
+
+    def slow_timeout(query, params):
+        clock.now += 900
+        raise RuntimeError("000630 (57014): Statement reached its statement or warehouse timeout")
+
+    session = FakeSession(handler=slow_timeout)
+
+    result = refresh_database(
+        session, "DIESELPJ_GEN", max_retries=5, backoff_seconds=5, sleep=clock.sleep,
+        database_timeout_seconds=1800, clock=clock
+    )
+
+    assert result['status'] == "TIMEOUT"
+    assert result['attempts'] == 2
+    assert clock.now < 1800 + 900
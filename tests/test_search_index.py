@@ -0,0 +1,51 @@
+from search_index import SearchIndex, tokenize
+
+
+def _row(table_name, table_comment="", location="DB.SCHEMA"):
+    return {
+        "LOCATION": location,
+        "TABLE_NAME": table_name,
+        "TABLE_COMMENT": table_comment,
+        "COLUMN_COMMENT": None,
+        "APPLICATION_PROJECT": None,
+        "SCOPE": None,
+        "COMMENT": None,
+    }
+
+
+def _index(rows):
+    index = SearchIndex()
+    index.sync(rows, version=1)
+    return index
+
+
+def test_tokenize_japanese_bigrams():
+    assert tokenize("車") == ["車"]
+    assert tokenize("車両データ") == ["車両", "両デ", "デー", "ータ"]
+
+
+def test_single_kanji_query_matches_bigram_indexed_words():
+    index = _index([
+        _row("TB_VEHICLE", "車両データ"),
+        _row("TB_CAR", "自動車の一覧"),
+        _row("TB_SALES", "売上集計"),
+    ])
+
+    assert {hit.row["TABLE_NAME"] for hit in index.search("車")} == {"TB_VEHICLE", "TB_CAR"}
+    assert [hit.row["TABLE_NAME"] for hit in index.search("売")] == ["TB_SALES"]
+    assert index.search("速") == []
+
+
+def test_single_kanji_query_counts_as_full_keyword_match():
+    index = _index([_row("TB_SALES", "売上集計"), _row("TB_COST", "原価")])
+
+    hits = index.search_keywords(["売", "原価"])
+
+    assert {hit.row["TABLE_NAME"] for hit in hits} == {"TB_SALES", "TB_COST"}
+    assert all(hit.matched_terms for hit in hits)
+
+
+def test_multi_character_query_still_uses_bigrams():
+    index = _index([_row("TB_VEHICLE", "車両データ"), _row("TB_CAR", "自動車の一覧")])
+
+    assert [hit.row["TABLE_NAME"] for hit in index.search("車両")] == ["TB_VEHICLE"]
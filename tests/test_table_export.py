@@ -0,0 +1,93 @@
+import os
+
+from fake_session import FakeSession
+from table_export import EXPORT_FILE_PREFIX, export_table, remove_export, remove_stale_exports
+
+
+def _rows(count):
+    return [{'ID': i, 'NAME': f"name_{i}"} for i in range(count)]
+
+
+def test_export_truncates_at_max_rows(tmp_path):
+    session = FakeSession(handler=lambda query, params: _rows(50))
+
+    result = export_table(session, "DB", "S", "T", max_rows=20, directory=str(tmp_path))
+
+    assert result['rows'] == 20
+    assert result['truncated']
+    assert os.path.basename(result['path']).startswith(EXPORT_FILE_PREFIX)
+    remove_export(result)
+    assert not os.path.exists(result['path'])
+
+
+def test_stale_exports_are_removed(tmp_path):
+    old = tmp_path / f"{EXPORT_FILE_PREFIX}T_old.csv"
+    new = tmp_path / f"{EXPORT_FILE_PREFIX}T_new.csv"
+    other = tmp_path / "other_file.csv"
+    for path in (old, new, other):
+        path.write_text("x")
+    os.utime(old, (1000, 1000))
+    os.utime(other, (1000, 1000))
+    os.utime(new, (5000, 5000))
+
+    removed = remove_stale_exports(str(tmp_path), max_age_seconds=3600, clock=lambda: 5000)
+
+    assert removed == 1
+    assert not old.exists()
+    assert new.exists() and other.exists()
+
+
+def test_export_start_removes_stale_files(tmp_path):
+    old = tmp_path / f"{EXPORT_FILE_PREFIX}T_old.csv"
+    old.write_text("x")
+    os.utime(old, (1000, 1000))
+    session = FakeSession(handler=lambda query, params: _rows(3))
+
+    result = export_table(session, "DB", "S", "T", directory=str(tmp_path))
+
+    assert not old.exists()
+    assert result['rows'] == 3
+
+
+class _BatchSession:
+    """to_pandas_batches() で決まったバッチを返すセッション"""
+
+    def __init__(self, batches):
+        self.batches = batches
+
+    def sql(self, query, params=None):
+        return self
+
+    def to_pandas_batches(self):
+        return iter(self.batches)
+
+
+def test_parquet_export_promotes_types_between_batches(tmp_path):
+    import pandas as pd
+    import pyarrow.parquet as pq
+
+    batches = [
+        # 1バッチ目: NOTE は全件 NULL、AMOUNT は整数
+        pd.DataFrame({'NOTE': [None, None], 'AMOUNT': [1, 2]}),
+        # 2バッチ目: NOTE に文字列、AMOUNT は NULL・小数を含み float64
+        pd.DataFrame({'NOTE': ["a", None], 'AMOUNT': [2.5, None]}),
+        pd.DataFrame({'NOTE': [None, "b"], 'AMOUNT': [3, 4]}),
+    ]
+
+    result = export_table(_BatchSession(batches), "DB", "S", "T", fmt="parquet", directory=str(tmp_path))
+
+    table = pq.read_table(result['path'])
+    assert result['rows'] == 6
+    assert table.column('NOTE').to_pylist() == [None, None, "a", None, None, "b"]
+    assert table.column('AMOUNT').to_pylist() == [1.0, 2.0, 2.5, None, 3.0, 4.0]
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".previous")]
+
+
+def test_table_name_with_path_separator(tmp_path):
+    session = FakeSession(handler=lambda query, params: _rows(2))
+
+    result = export_table(session, "DB", "S", "A/B", directory=str(tmp_path))
+
+    assert os.path.dirname(result['path']) == str(tmp_path)
+    assert result['file_name'] == "A/B.csv"
+    assert result['rows'] == 2
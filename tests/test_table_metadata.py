@@ -0,0 +1,67 @@
+from column_metadata import invalidate_columns
+from fake_session import FakeSession
+from table_metadata import (
+    fetch_table_metadata,
+    get_table_metadata,
+    invalidate_table_metadata,
+    table_metadata_sql,
+)
+
+COLUMNS = [
+    {'TABLE_NAME': 'T1', 'COLUMN_NAME': 'ID', 'DATA_TYPE': 'NUMBER', 'COMMENT': 'ID', 'ORDINAL_POSITION': 1},
+    {'TABLE_NAME': 'T1', 'COLUMN_NAME': 'NAME', 'DATA_TYPE': 'TEXT', 'COMMENT': None, 'ORDINAL_POSITION': 2},
+    {'TABLE_NAME': 'T2', 'COLUMN_NAME': 'CODE', 'DATA_TYPE': 'TEXT', 'COMMENT': None, 'ORDINAL_POSITION': 1},
+]
+
+
+def _session():
+    return FakeSession(responses=[
+        (r"INFORMATION_SCHEMA\.COLUMNS", COLUMNS),
+        (r"INFORMATION_SCHEMA\.TABLES", [{'TABLE_COMMENT': 'テーブル'}]),
+    ])
+
+
+def _queries(session, name):
+    return [query for query, params in session.executed if name in query]
+
+
+def setup_function():
+    invalidate_table_metadata()
+
+
+def test_joined_columns_are_filtered_by_table():
+    sql = table_metadata_sql("DB")
+
+    assert "c.TABLE_SCHEMA = ?" in sql and "c.TABLE_NAME = ?" in sql
+    session = FakeSession(handler=lambda query, params: [])
+    fetch_table_metadata(session, "DB", "S", "T1")
+    assert session.executed[0][1] == ["S", "T1", "S", "T1"]
+
+
+def test_columns_come_from_the_schema_column_cache():
+    session = _session()
+
+    first = get_table_metadata(session, "DB", "S", "T1")
+    second = get_table_metadata(session, "DB", "S", "T2")
+
+    assert first['table_comment'] == 'テーブル'
+    assert [column['COLUMN_NAME'] for column in first['columns']] == ['ID', 'NAME']
+    assert first['comment_rate'] == 50
+    assert second['total_columns'] == 1
+    # カラム情報はスキーマ単位で1回だけ読み込む
+    assert len(_queries(session, "INFORMATION_SCHEMA.COLUMNS")) == 1
+
+
+def test_table_comment_invalidation_keeps_columns():
+    session = _session()
+    get_table_metadata(session, "DB", "S", "T1")
+
+    invalidate_table_metadata("DB", "S", "T1")
+    get_table_metadata(session, "DB", "S", "T1")
+
+    assert len(_queries(session, "INFORMATION_SCHEMA.TABLES")) == 2
+    assert len(_queries(session, "INFORMATION_SCHEMA.COLUMNS")) == 1
+
+    invalidate_columns("DB", "S", "T1")
+    get_table_metadata(session, "DB", "S", "T1")
+    assert len(_queries(session, "INFORMATION_SCHEMA.COLUMNS")) == 2
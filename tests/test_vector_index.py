@@ -0,0 +1,92 @@
+import numpy as np
+
+from vector_index import HashingEmbedder, VectorIndex, get_vector_index
+
+
+class _Snapshot:
+    def __init__(self, rows, version):
+        self.rows = rows
+        self.version = version
+
+
+class _CountingEmbedder(HashingEmbedder):
+    def __init__(self, dim=64):
+        super().__init__(dim)
+        self.embedded = []
+
+    def embed(self, texts):
+        self.embedded.extend(texts)
+        return super().embed(texts)
+
+
+def _row(table_name, table_comment, update_date="2024-01-01"):
+    return {
+        "LOCATION": "DB.SCHEMA",
+        "TABLE_NAME": table_name,
+        "TABLE_COMMENT": table_comment,
+        "COLUMN_COMMENT": None,
+        "UPDATE_DATE": update_date,
+    }
+
+
+ROWS = [
+    _row("TB_SALES_SUMMARY", "売上集計 sales summary"),
+    _row("TB_ENGINE_TEST", "エンジン試験 engine test result"),
+    _row("TB_VEHICLE_MASTER", "車両マスタ vehicle master"),
+]
+
+
+def test_hashing_embedder_is_deterministic():
+    embedder = HashingEmbedder(dim=64)
+
+    first = embedder.embed(["engine test", "売上集計"])
+    second = HashingEmbedder(dim=64).embed(["engine test", "売上集計"])
+
+    assert first.shape == (2, 64)
+    assert np.array_equal(first, second)
+
+
+def test_search_ranks_matching_table_first():
+    index = VectorIndex(HashingEmbedder(dim=64))
+    index.sync(ROWS, version=1)
+
+    results = index.search("engine test", limit=2)
+
+    assert [row["TABLE_NAME"] for row, _ in results][0] == "TB_ENGINE_TEST"
+    assert len(results) == 2
+    assert results[0][1] >= results[1][1]
+
+
+def test_sync_reembeds_only_changed_rows():
+    embedder = _CountingEmbedder()
+    index = VectorIndex(embedder)
+    assert index.sync(ROWS, version=1) == {"embedded": 3, "reused": 0, "removed": 0}
+
+    changed = [ROWS[0], _row("TB_ENGINE_TEST", "エンジン試験 updated", "2024-02-01")]
+    embedder.embedded.clear()
+
+    assert index.sync(changed, version=2) == {"embedded": 1, "reused": 1, "removed": 1}
+    assert len(embedder.embedded) == 1
+    assert len(index) == 2
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "vectors.npz")
+    index = VectorIndex(HashingEmbedder(dim=64), path)
+    index.sync(ROWS, version=1)
+
+    reloaded = VectorIndex(HashingEmbedder(dim=64), path)
+
+    assert reloaded.keys == index.keys
+    assert reloaded.sync(ROWS, version=1)["embedded"] == 0
+
+
+def test_get_vector_index_swaps_embedder_and_syncs(tmp_path):
+    first = HashingEmbedder(dim=32)
+    second = HashingEmbedder(dim=32)
+
+    index = get_vector_index(_Snapshot(ROWS, "v1"), first, directory=str(tmp_path))
+    assert get_vector_index(_Snapshot(ROWS, "v1"), second, directory=str(tmp_path)) is index
+
+    assert index.embedder is second
+    assert index.version == "v1"
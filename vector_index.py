@@ -0,0 +1,233 @@
+# ###
+# TABLE_INFO用のベクトル検索インデックス
+#
+# - TABLE_NAME・TABLE_COMMENT・カラムコメントをテーブルごとに1回だけ埋め込む
+# - ベクトルは (LOCATION, TABLE_NAME) をキーとするNumPy配列（float16）で保存する
+# - UPDATE_DATEやコメントが変わった行だけを再計算する
+# - 埋め込み器は差し替え可能（本番: Cortex EMBED_TEXT、テスト: ハッシュ埋め込み）
+# ###
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+from search_index import column_comment_text, tokenize
+
+# ベクトルの保存先ディレクトリ（環境変数で変更可能）
+VECTOR_INDEX_DIR = os.environ.get("CATALOG_VECTOR_INDEX_DIR", tempfile.gettempdir())
+
+# 1テーブルの埋め込みに使う最大文字数
+MAX_DOCUMENT_CHARS = 2000
+
+
+def document_text(row):
+    """テーブル1件分の埋め込み対象テキスト"""
+    parts = [
+        (row.get('TABLE_NAME') or "").replace("_", " "),
+        row.get('TABLE_COMMENT') or "",
+        column_comment_text(row.get('COLUMN_COMMENT')),
+    ]
+    return "\n".join(part for part in parts if part)[:MAX_DOCUMENT_CHARS]
+
+
+def row_signature(row):
+    """再埋め込みが必要かどうかの判定に使う行のハッシュ"""
+    payload = json.dumps([
+        str(row.get('UPDATE_DATE')),
+        row.get('TABLE_NAME'),
+        row.get('TABLE_COMMENT'),
+        row.get('COLUMN_COMMENT'),
+    ], ensure_ascii=False)
+    return hashlib.md5(payload.encode("utf-8")).hexdigest()
+
+
+class HashingEmbedder:
+    """トークンをハッシュで次元に割り当てる決定的な埋め込み（テスト・オフライン用）"""
+
+    def __init__(self, dim=256):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for token in tokenize(text):
+                digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+                value = int.from_bytes(digest, "little")
+                sign = 1.0 if value & 1 else -1.0
+                vectors[i, (value >> 1) % self.dim] += sign
+        return vectors
+
+
+class CortexEmbedder:
+    """Snowflake Cortex EMBED_TEXT_1024 による埋め込み（多言語モデルで日英をまたいで検索できる）"""
+
+    def __init__(self, session, model="multilingual-e5-large", batch_size=100):
+        self.session = session
+        self.model = model
+        self.batch_size = batch_size
+        self.dim = 1024
+        self.name = f"cortex-{model}"
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for start in range(0, len(texts), self.batch_size):
+            batch = texts[start:start + self.batch_size]
+            # バッチ内のテキストを1文で埋め込む
+            result = self.session.sql(f"""
+                SELECT
+                    f.INDEX AS IDX,
+                    SNOWFLAKE.CORTEX.EMBED_TEXT_1024('{self.model}', f.VALUE::STRING)::ARRAY AS EMBEDDING
+                FROM TABLE(FLATTEN(INPUT => PARSE_JSON(?))) f
+            """, params=[json.dumps(batch, ensure_ascii=False)]).collect()
+            for row in result:
+                embedding = row['EMBEDDING']
+                if isinstance(embedding, str):
+                    embedding = json.loads(embedding)
+                vectors[start + row['IDX']] = embedding
+        return vectors
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class VectorIndex:
+    """(LOCATION, TABLE_NAME) をキーとする正規化済みベクトルの配列"""
+
+    def __init__(self, embedder, path=None):
+        self.embedder = embedder
+        self.path = path
+        self._lock = threading.Lock()
+        self.keys = []
+        self.signatures = []
+        self.vectors = np.zeros((0, embedder.dim), dtype=np.float32)
+        self._rows = {}
+        self.version = None
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def set_embedder(self, embedder):
+        """埋め込み器を差し替える（同期・検索の実行中は待つ）"""
+        if embedder.name != self.embedder.name:
+            raise ValueError(f"埋め込み器が異なります: {embedder.name} != {self.embedder.name}")
+        with self._lock:
+            self.embedder = embedder
+
+    # ----- 永続化 -----
+
+    def save(self, path=None):
+        path = path or self.path
+        if not path:
+            return
+        tmp_path = f"{path}.tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            embedder=np.array(self.embedder.name),
+            locations=np.array([key[0] for key in self.keys], dtype=str),
+            table_names=np.array([key[1] for key in self.keys], dtype=str),
+            signatures=np.array(self.signatures, dtype=str),
+            vectors=self.vectors.astype(np.float16),
+        )
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        """保存済みベクトルを読み込む。埋め込み器が異なる・壊れている場合は無視する"""
+        try:
+            with np.load(path) as data:
+                if str(data['embedder']) != self.embedder.name:
+                    return False
+                keys = list(zip(data['locations'].tolist(), data['table_names'].tolist()))
+                signatures = data['signatures'].tolist()
+                vectors = data['vectors'].astype(np.float32)
+        except (OSError, ValueError, KeyError):
+            return False
+        if vectors.shape != (len(keys), self.embedder.dim):
+            return False
+        self.keys = keys
+        self.signatures = signatures
+        self.vectors = vectors
+        return True
+
+    # ----- 同期 -----
+
+    def sync(self, rows, version=None):
+        """行リストに合わせてベクトルを更新し、変更行だけ埋め込みを再計算する"""
+        with self._lock:
+            previous = {key: i for i, key in enumerate(self.keys)}
+            keys = []
+            signatures = []
+            vectors = np.zeros((len(rows), self.embedder.dim), dtype=np.float32)
+            stale_positions = []
+            stale_texts = []
+
+            for i, row in enumerate(rows):
+                key = (row['LOCATION'], row['TABLE_NAME'])
+                signature = row_signature(row)
+                keys.append(key)
+                signatures.append(signature)
+                old = previous.get(key)
+                if old is not None and self.signatures[old] == signature:
+                    vectors[i] = self.vectors[old]
+                else:
+                    stale_positions.append(i)
+                    stale_texts.append(document_text(row))
+
+            if stale_texts:
+                vectors[stale_positions] = _normalize(self.embedder.embed(stale_texts))
+
+            removed = len(set(previous) - set(keys))
+            self.keys = keys
+            self.signatures = signatures
+            self.vectors = vectors
+            self._rows = {key: row for key, row in zip(keys, rows)}
+            self.version = version
+            if stale_texts or removed:
+                self.save()
+            return {
+                "embedded": len(stale_texts),
+                "reused": len(rows) - len(stale_texts),
+                "removed": removed,
+            }
+
+    # ----- 検索 -----
+
+    def search(self, query, limit=50):
+        """コサイン類似度の上位limit件を (row, score) のリストで返す"""
+        with self._lock:
+            if not self.keys or not query.strip():
+                return []
+            query_vector = _normalize(self.embedder.embed([query]))[0]
+            scores = self.vectors @ query_vector
+            limit = min(limit, len(scores))
+            top = np.argpartition(-scores, limit - 1)[:limit]
+            top = top[np.argsort(-scores[top])]
+            return [(self._rows[self.keys[i]], float(scores[i])) for i in top]
+
+
+# 埋め込み器ごとにプロセス内で共有する索引
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_vector_index(snapshot, embedder, directory=VECTOR_INDEX_DIR):
+    """スナップショットに同期済みの共有ベクトル索引を返す"""
+    with _indexes_lock:
+        index = _indexes.get(embedder.name)
+        if index is None:
+            path = os.path.join(directory, f"table_info_vectors_{embedder.name}.npz") if directory else None
+            index = _indexes[embedder.name] = VectorIndex(embedder, path)
+    # 埋め込み器がセッションを持つ場合は最新のものに差し替える
+    index.set_embedder(embedder)
+    if index.version != snapshot.version:
+        index.sync(snapshot.rows, snapshot.version)
+    return index
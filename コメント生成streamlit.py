@@ -24,9 +24,22 @@
 import streamlit as st
 from snowflake.snowpark.context import get_active_session
 import pandas as pd
+from catalog import get_snapshot, invalidate_snapshot
+from column_sampler import profile_columns
+from comment_generation import (
+    build_column_prompt,
+    drop_legacy_procedures,
+    find_legacy_procedures,
+    generate_column_comments,
+    generate_table_comment,
+)
+from comment_saver import diff_column_comments, save_column_comments, save_table_comment
+from cortex import cortex_usage_by_target, cortex_usage_stats
+from query_log import instrument_session, render_debug_panel
+from table_metadata import get_table_metadata, invalidate_table_metadata, list_databases, list_schemas, list_tables
 
-# Snowflakeセッションを取得
-session = get_active_session()
+# Snowflakeセッションを取得（クエリごとに所要時間・件数を記録する）
+session = instrument_session(get_active_session(), page="コメント生成")
 
 st.set_page_config(layout="wide")
 st.title("テーブル・カラムコメント生成")
@@ -38,31 +51,31 @@ if 'generated_col_comments' not in st.session_state:
     st.session_state.generated_col_comments = None
 if 'generated_table_comment' not in st.session_state:
     st.session_state.generated_table_comment = None
+if 'generated_col_errors' not in st.session_state:
+    st.session_state.generated_col_errors = []
 
 # 左右2カラムレイアウト
 left_col, right_col = st.columns([1, 3])
 
 # ===== 左側: コントロールパネル =====
+session.set_section("コントロールパネル")
 with left_col:
     #st.header("⚙️ コントロール")
     
-    # データベース選択
-    databases = session.sql("SHOW DATABASES").collect()
-    db_list = [row['name'] for row in databases]
+    # データベース選択（SHOW の一覧は一定時間キャッシュする）
+    db_list = list_databases(session)
     selected_db = st.selectbox("データベース", db_list, key="db_select")
     
     # スキーマ選択
     selected_schema = None
     if selected_db:
-        schemas = session.sql(f'SHOW SCHEMAS IN DATABASE "{selected_db}"').collect()
-        schema_list = [row['name'] for row in schemas]
+        schema_list = list_schemas(session, selected_db)
         selected_schema = st.selectbox("スキーマ", schema_list, key="schema_select")
     
     # テーブル選択
     selected_table = None
     if selected_db and selected_schema:
-        tables = session.sql(f'SHOW TABLES IN "{selected_db}"."{selected_schema}"').collect()
-        table_list = [row['name'] for row in tables]
+        table_list = list_tables(session, selected_db, selected_schema)
         selected_table = st.selectbox("テーブル", table_list, key="table_select")
     
     #st.markdown("---")
@@ -72,33 +85,19 @@ with left_col:
         #st.subheader("📋 現在の状況")
         
         if st.button("🔄 更新", use_container_width=True):
+            # テーブルのメタデータとSHOWの一覧を読み直す
+            invalidate_table_metadata()
             st.rerun()
         
         # 最新のコメント状況を取得して表示
         try:
-            # テーブルコメント取得
-            table_info = session.sql(f"""
-                SELECT COMMENT
-                FROM "{selected_db}".INFORMATION_SCHEMA.TABLES
-                WHERE TABLE_SCHEMA = '{selected_schema}'
-                  AND TABLE_NAME = '{selected_table}'
-            """).collect()
+            # テーブルコメント・カラムコメント統計（1文で取得し、右側のパネルと共有する）
+            table_metadata = get_table_metadata(session, selected_db, selected_schema, selected_table)
             
-            table_comment = table_info[0]['COMMENT'] if table_info and table_info[0]['COMMENT'] else ""
-            
-            # カラムコメント統計取得
-            columns_info = session.sql(f"""
-                SELECT 
-                    COUNT(*) as total_columns,
-                    COUNT(COMMENT) as commented_columns
-                FROM "{selected_db}".INFORMATION_SCHEMA.COLUMNS
-                WHERE TABLE_SCHEMA = '{selected_schema}'
-                  AND TABLE_NAME = '{selected_table}'
-            """).collect()
-            
-            total_cols = columns_info[0]['TOTAL_COLUMNS']
-            commented_cols = columns_info[0]['COMMENTED_COLUMNS']
-            comment_rate = (commented_cols / total_cols * 100) if total_cols > 0 else 0
+            table_comment = table_metadata['table_comment']
+            total_cols = table_metadata['total_columns']
+            commented_cols = table_metadata['commented_columns']
+            comment_rate = table_metadata['comment_rate']
             
             st.metric(
                 label="テーブルコメント",
@@ -122,52 +121,14 @@ with left_col:
         if st.button("テーブルコメント生成", use_container_width=True, type="primary"):
             with st.spinner("生成中..."):
                 try:
-                    # プロシージャ作成・実行
-                    session.sql(f"""
-                        CREATE OR REPLACE PROCEDURE gen_tbl_cmt_{selected_table}()
-                        RETURNS VARCHAR
-                        LANGUAGE JAVASCRIPT
-                        AS
-                        $$
-                            var get_columns_sql = `
-                                SELECT COLUMN_NAME
-                                FROM "{selected_db}".INFORMATION_SCHEMA.COLUMNS
-                                WHERE TABLE_SCHEMA = '{selected_schema}'
-                                  AND TABLE_NAME = '{selected_table}'
-                                ORDER BY ORDINAL_POSITION
-                            `;
-                            
-                            var stmt = snowflake.createStatement({{sqlText: get_columns_sql}});
-                            var columns = stmt.execute();
-                            var column_list = [];
-                            while (columns.next()) {{
-                                column_list.push(columns.getColumnValue(1));
-                            }}
-                            
-                            var generate_sql = `
-                                SELECT SNOWFLAKE.CORTEX.COMPLETE(
-                                    'mistral-large2',
-                                    CONCAT(
-                                        'テーブル名: {selected_table}\\\\n',
-                                        'カラム一覧: ` + column_list.join(', ') + `\\\\n\\\\n',
-                                        '【参考例】\\\\n',
-                                        'TB_SALES_SUMMARY: 売上集計テーブル。日次・月次の売上データを格納\\\\n\\\\n',
-                                        '上記を参考に、このテーブルの目的を日本語で100文字以内で説明して。説明文のみ出力。'
-                                    )
-                                ) AS comment_text
-                            `;
-                            
-                            var gen_stmt = snowflake.createStatement({{sqlText: generate_sql}});
-                            var result = gen_stmt.execute();
-                            result.next();
-                            var ai_comment = result.getColumnValue(1);
-                            
-                            return ai_comment;
-                        $$
-                    """).collect()
-                    
-                    result = session.sql(f"CALL gen_tbl_cmt_{selected_table}()").collect()
-                    generated_comment = result[0][0] if result else ""
+                    # キャッシュ済みのカラム一覧からプロンプトを作り、CORTEX.COMPLETE を1文で呼び出す
+                    gen_metadata = get_table_metadata(session, selected_db, selected_schema, selected_table)
+                    generated_comment = generate_table_comment(
+                        session,
+                        selected_table,
+                        [column['COLUMN_NAME'] for column in gen_metadata['columns']],
+                        target=f"{selected_db}.{selected_schema}.{selected_table}"
+                    )
                     
                     # セッションステートに保存
                     st.session_state.generated_table_comment = generated_comment
@@ -179,132 +140,104 @@ with left_col:
         if st.button("カラムコメント生成", use_container_width=True, type="primary", key="gen_col_comments"):
             with st.spinner("生成中..."):
                 try:
-                    # プロシージャ作成・実行
-                    session.sql(f"""
-                        CREATE OR REPLACE PROCEDURE gen_col_cmt_{selected_table}()
-                        RETURNS VARCHAR
-                        LANGUAGE JAVASCRIPT
-                        AS
-                        $$
-                            var get_table_comment_sql = `
-                                SELECT COMMENT
-                                FROM "{selected_db}".INFORMATION_SCHEMA.TABLES
-                                WHERE TABLE_SCHEMA = '{selected_schema}'
-                                  AND TABLE_NAME = '{selected_table}'
-                            `;
-                            
-                            var table_stmt = snowflake.createStatement({{sqlText: get_table_comment_sql}});
-                            var table_result = table_stmt.execute();
-                            table_result.next();
-                            var table_comment = table_result.getColumnValue(1) || 'テーブル説明なし';
-                            
-                            var get_columns_sql = `
-                                SELECT COLUMN_NAME, DATA_TYPE
-                                FROM "{selected_db}".INFORMATION_SCHEMA.COLUMNS
-                                WHERE TABLE_SCHEMA = '{selected_schema}'
-                                  AND TABLE_NAME = '{selected_table}'
-                                ORDER BY ORDINAL_POSITION
-                            `;
-                            
-                            var stmt = snowflake.createStatement({{sqlText: get_columns_sql}});
-                            var columns = stmt.execute();
-                            var result_array = [];
-                            
-                            while (columns.next()) {{
-                                var col_name = columns.getColumnValue(1);
-                                var data_type = columns.getColumnValue(2);
-                                
-                                try {{
-                                    // サンプルデータを取得
-                                    var sample_sql = `SELECT TOP 100 "` + col_name + `" FROM "{selected_db}"."{selected_schema}"."{selected_table}"`;
-                                    var sample_stmt = snowflake.createStatement({{sqlText: sample_sql}});
-                                    var sample_result = sample_stmt.execute();
-                                    var samples = [];
-                                    while (sample_result.next()) {{
-                                        var val = sample_result.getColumnValue(1);
-                                        if (val !== null) {{
-                                            samples.push(val.toString());
-                                        }}
-                                    }}
-                                    var sample_data = samples.join(', ');
-                                    
-                                    var generate_sql = `
-                                        SELECT SNOWFLAKE.CORTEX.COMPLETE(
-                                            'mistral-large2',
-                                            CONCAT(
-                                                'テーブル: {selected_table}\\\\n',
-                                                'テーブル説明: ` + table_comment + `\\\\n',
-                                                'カラム名: ` + col_name + `\\\\n',
-                                                'データ型: ` + data_type + `\\\\n',
-                                                'サンプルデータ: ` + sample_data + `\\\\n\\\\n',
-                                                '【参考例】\\\\n',
-                                                'qmin: 最小流量。単位:[mm3/sec]\\\\n\\\\n',
-                                                'KOHIN: 子品番。\\\\n\\\\n',
-                                                '上記のテーブル名、テーブル説明、カラム名とサンプルデータを考慮して、このカラムの技術的な説明を日本語で50文字以内で簡潔に生成して。\\\\n',
-                                                '説明文のみを出力し、前置きや補足説明は不要。\\\\n',
-                                                '数値型の場合のみ単位を記載。'
-                                            )
-                                        ) AS comment_text
-                                    `;
-                                    
-                                    var gen_stmt = snowflake.createStatement({{sqlText: generate_sql}});
-                                    var result = gen_stmt.execute();
-                                    result.next();
-                                    var ai_comment = result.getColumnValue(1);
-                                    
-                                    result_array.push(col_name + '|' + ai_comment);
-                                }} catch (err) {{
-                                    result_array.push(col_name + '|ERROR');
-                                }}
-                            }}
-                            
-                            return result_array.join('^^');
-                        $$
-                    """).collect()
+                    # テーブルコメントとカラム一覧を取得
+                    gen_metadata = get_table_metadata(session, selected_db, selected_schema, selected_table)
+                    gen_table_comment = gen_metadata['table_comment'] or None
+                    gen_columns = gen_metadata['columns']
                     
-                    result = session.sql(f"CALL gen_col_cmt_{selected_table}()").collect()
-                    result_str = result[0][0]
+                    # 全カラムのサンプル値とプロファイルを1回のスキャンで取得
+                    profiles = profile_columns(session, selected_db, selected_schema, selected_table, gen_columns)
+                    
+                    # 全カラムのプロンプトを作成して一括生成
+                    prompts = [
+                        (
+                            column['COLUMN_NAME'],
+                            build_column_prompt(
+                                selected_table,
+                                gen_table_comment,
+                                column['COLUMN_NAME'],
+                                column['DATA_TYPE'],
+                                profiles[column['COLUMN_NAME']].samples,
+                                profiles[column['COLUMN_NAME']].summary()
+                            )
+                        )
+                        for column in gen_columns
+                    ]
                     
-                    # 結果をパース
-                    result_list = result_str.split('^^')
-                    generated_comments = {}
-                    success_count = 0
-                    for item in result_list:
-                        if '|' in item and 'ERROR' not in item:
-                            col_name, comment = item.split('|', 1)
-                            generated_comments[col_name] = comment
-                            success_count += 1
+                    progress_bar = st.progress(0.0, text="生成中...")
+                    
+                    def update_progress(done_chunks, total_chunks, done_columns, total_columns):
+                        progress_bar.progress(
+                            done_columns / total_columns,
+                            text=f"生成中... {done_columns}/{total_columns}カラム（チャンク {done_chunks}/{total_chunks}）"
+                        )
+                    
+                    results = generate_column_comments(
+                        session,
+                        prompts,
+                        on_progress=update_progress,
+                        target=f"{selected_db}.{selected_schema}.{selected_table}"
+                    )
+                    
+                    # 結果を集計
+                    generated_comments = {
+                        result['COLUMN_NAME']: result['COMMENT']
+                        for result in results
+                        if result['STATUS'] == 'OK'
+                    }
+                    failed_columns = [result['COLUMN_NAME'] for result in results if result['STATUS'] != 'OK']
+                    success_count = len(generated_comments)
                     
                     # セッションステートに保存
                     st.session_state.generated_col_comments = generated_comments
+                    st.session_state.generated_col_errors = failed_columns
                     st.success(f"✅ {success_count}件のコメントが生成されました")
                     st.rerun()
                 except Exception as e:
                     st.error(f"❌ エラー: {str(e)}")
+    
+    # 以前のバージョンが生成のたびに作成したプロシージャ（GEN_TBL_CMT_<テーブル> など）の削除
+    st.markdown("---")
+    with st.expander("🧹 旧生成プロシージャの削除", expanded=False):
+        st.caption("以前のバージョンがコメント生成のたびに作成した GEN_TBL_CMT_* / GEN_COL_CMT_* を現在のスキーマから削除します")
+        if st.button("🔍 残っているプロシージャを検索", key="find_legacy_procedures", use_container_width=True):
+            try:
+                st.session_state.legacy_procedures = find_legacy_procedures(session)
+            except Exception as e:
+                st.error(f"❌ エラー: {str(e)}")
+        
+        legacy_procedures = st.session_state.get('legacy_procedures')
+        if legacy_procedures is not None:
+            if not legacy_procedures:
+                st.info("削除対象のプロシージャはありません")
+            else:
+                st.caption(
+                    f"{len(legacy_procedures)}件: "
+                    + ", ".join(procedure['name'] for procedure in legacy_procedures[:20])
+                    + (" ..." if len(legacy_procedures) > 20 else "")
+                )
+                if st.button(f"🗑️ {len(legacy_procedures)}件を削除", key="drop_legacy_procedures", use_container_width=True):
+                    drop_results = drop_legacy_procedures(session, legacy_procedures)
+                    drop_failed = [result for result in drop_results if result['STATUS'] != 'OK']
+                    for result in drop_failed:
+                        st.error(f"❌ {result['name']}: {result['ERROR']}")
+                    st.success(f"✅ {len(drop_results) - len(drop_failed)}件削除しました")
+                    st.session_state.legacy_procedures = None
 
 # ===== 右側: コメント表示・編集 =====
+session.set_section("コメント表示・編集")
 with right_col:
     if selected_db and selected_schema and selected_table:
         st.subheader(f"{selected_table}")
         
-        # 最新のテーブルコメント取得
-        table_info = session.sql(f"""
-            SELECT COMMENT
-            FROM "{selected_db}".INFORMATION_SCHEMA.TABLES
-            WHERE TABLE_SCHEMA = '{selected_schema}'
-              AND TABLE_NAME = '{selected_table}'
-        """).collect()
+        # テーブルコメント・カラムコメント取得（左側のパネルと同じキャッシュから取得し、保存時に失効させる）
+        table_metadata = get_table_metadata(session, selected_db, selected_schema, selected_table)
         
-        current_table_comment = table_info[0]['COMMENT'] if table_info and table_info[0]['COMMENT'] else ""
+        current_table_comment = table_metadata['table_comment']
+        columns_info = table_metadata['columns']
         
-        # 最新のカラムコメント取得
-        columns_info = session.sql(f"""
-            SELECT COLUMN_NAME, DATA_TYPE, COMMENT
-            FROM "{selected_db}".INFORMATION_SCHEMA.COLUMNS
-            WHERE TABLE_SCHEMA = '{selected_schema}'
-              AND TABLE_NAME = '{selected_table}'
-            ORDER BY ORDINAL_POSITION
-        """).collect()
+        # 差分保存の比較元になる読み込み時のカラムコメント
+        current_column_comments = {row['COLUMN_NAME']: row['COMMENT'] for row in columns_info}
         
         # 現在のコメントを表示・編集
         #st.subheader("📖 コメントを表示・編集")
@@ -327,11 +260,9 @@ with right_col:
             with col_tbl_gen1:
                 if st.button("💾 生成コメント保存", key="save_generated_table_comment", use_container_width=True, type="primary"):
                     try:
-                        escaped = edited_generated_table_comment.replace("'", "''")
-                        session.sql(f"""
-                            ALTER TABLE "{selected_db}"."{selected_schema}"."{selected_table}"
-                            SET COMMENT = '{escaped}'
-                        """).collect()
+                        save_table_comment(
+                            session, selected_db, selected_schema, selected_table, edited_generated_table_comment
+                        )
                         st.success("✅ 保存しました！")
                         st.session_state.generated_table_comment = None
                         st.rerun()
@@ -360,11 +291,7 @@ with right_col:
             
             if st.button("💾 テーブルコメント保存", key="save_table_quick"):
                 try:
-                    escaped = edited_table_comment_quick.replace("'", "''")
-                    session.sql(f"""
-                        ALTER TABLE "{selected_db}"."{selected_schema}"."{selected_table}"
-                        SET COMMENT = '{escaped}'
-                    """).collect()
+                    save_table_comment(session, selected_db, selected_schema, selected_table, edited_table_comment_quick)
                     st.success("✅ 保存しました！")
                     st.rerun()
                 except Exception as e:
@@ -376,6 +303,8 @@ with right_col:
         # 生成されたコメントがある場合は、それを表示・編集
         if st.session_state.generated_col_comments:
             st.info("💡 生成されたコメントです。編集後に「保存」ボタンを押してください。")
+            if st.session_state.generated_col_errors:
+                st.warning(f"⚠️ 生成に失敗したカラム: {', '.join(st.session_state.generated_col_errors)}")
             
             # 生成コメントをDataFrameに変換
             generated_df = pd.DataFrame([
@@ -403,26 +332,32 @@ with right_col:
             with col_gen_btn1:
                 if st.button("💾 生成コメント保存", key="save_generated_comments", use_container_width=True, type="primary"):
                     try:
-                        success_count = 0
-                        for idx, row in generated_edited_df.iterrows():
-                            col_name = row['カラム名']
-                            comment = row['コメント'] if pd.notna(row['コメント']) else ""
-                            escaped = comment.replace("'", "''")
-                            session.sql(f"""
-                                ALTER TABLE "{selected_db}"."{selected_schema}"."{selected_table}"
-                                ALTER COLUMN "{col_name}" COMMENT '{escaped}'
-                            """).collect()
-                            success_count += 1
+                        # 読み込み時のコメントから変更のあったカラムだけをまとめて保存
+                        changes = diff_column_comments(
+                            current_column_comments,
+                            zip(generated_edited_df['カラム名'], generated_edited_df['コメント'])
+                        )
+                        save_results = save_column_comments(
+                            session, selected_db, selected_schema, selected_table, changes
+                        )
+                        failed = [result for result in save_results if result['STATUS'] != 'OK']
+                        success_count = len(save_results) - len(failed)
                         
-                        st.success(f"✅ {success_count}件保存しました！")
-                        st.session_state.generated_col_comments = None
-                        st.rerun()
+                        if failed:
+                            for result in failed:
+                                st.error(f"❌ {result['COLUMN_NAME']}: {result['ERROR']}")
+                        else:
+                            st.success(f"✅ {success_count}件保存しました！（変更なし {len(generated_edited_df) - len(changes)}件）")
+                            st.session_state.generated_col_comments = None
+                            st.session_state.generated_col_errors = []
+                            st.rerun()
                     except Exception as e:
                         st.error(f"❌ エラー: {str(e)}")
             
             with col_gen_btn2:
                 if st.button("❌ キャンセル", key="cancel_generated_comments", use_container_width=True):
                     st.session_state.generated_col_comments = None
+                    st.session_state.generated_col_errors = []
                     st.rerun()
         else:
             # 通常の編集フロー
@@ -452,19 +387,25 @@ with right_col:
             with col_btn1:
                 if st.button("💾 カラムコメント保存", key="save_columns_quick", use_container_width=True):
                     try:
-                        success_count = 0
-                        for idx, row in edited_df.iterrows():
-                            col_name = row['カラム名']
-                            comment = row['コメント'] if pd.notna(row['コメント']) else ""
-                            escaped = comment.replace("'", "''")
-                            session.sql(f"""
-                                ALTER TABLE "{selected_db}"."{selected_schema}"."{selected_table}"
-                                ALTER COLUMN "{col_name}" COMMENT '{escaped}'
-                            """).collect()
-                            success_count += 1
+                        # 読み込み時のコメントから変更のあったカラムだけをまとめて保存
+                        changes = diff_column_comments(
+                            current_column_comments,
+                            zip(edited_df['カラム名'], edited_df['コメント'])
+                        )
+                        save_results = save_column_comments(
+                            session, selected_db, selected_schema, selected_table, changes
+                        )
+                        failed = [result for result in save_results if result['STATUS'] != 'OK']
+                        success_count = len(save_results) - len(failed)
                         
-                        st.success(f"✅ {success_count}件保存しました！")
-                        st.rerun()
+                        if failed:
+                            for result in failed:
+                                st.error(f"❌ {result['COLUMN_NAME']}: {result['ERROR']}")
+                        elif not changes:
+                            st.info("変更がありませんでした")
+                        else:
+                            st.success(f"✅ {success_count}件保存しました！")
+                            st.rerun()
                     except Exception as e:
                         st.error(f"❌ エラー: {str(e)}")
         
@@ -473,25 +414,11 @@ with right_col:
         st.markdown("**📋 TABLE_INFO メタデータ編集:**")
         
         try:
-            # TABLE_INFOから該当テーブルの情報を取得
+            # スナップショットから該当テーブルの情報を取得
             location = f"{selected_db}.{selected_schema}"
-            table_info_query = f"""
-                SELECT 
-                    OWNER,
-                    SUB_OWNER,
-                    PUBLISH,
-                    SCOPE,
-                    APPLICATION_PROJECT,
-                    COMMENT
-                FROM DIESELPJ_GEN.DATA_CATALOG.TABLE_INFO
-                WHERE TABLE_NAME = '{selected_table}'
-                  AND LOCATION = '{location}'
-            """
-            table_info_result = session.sql(table_info_query).collect()
+            info = get_snapshot(session).get(location, selected_table)
             
-            if table_info_result:
-                info = table_info_result[0]
-                
+            if info:
                 # 編集フォーム
                 with st.form(key=f"table_info_form_{selected_table}_{st.session_state.refresh}"):
                     col_meta1, col_meta2 = st.columns(2)
@@ -558,6 +485,7 @@ with right_col:
                                   AND LOCATION = '{location}'
                             """
                             session.sql(update_sql).collect()
+                            invalidate_snapshot()
                             st.success("✅ TABLE_INFO を更新しました！")
                             st.session_state.refresh += 1
                             st.rerun()
@@ -572,5 +500,21 @@ with right_col:
     else:
         st.info("👈 左側からテーブルを選択してください")
 
+
+# Cortex の推定トークン数（プロセス内の累計、テーブル別）
+def render_cortex_usage():
+    usage_stats = cortex_usage_stats()
+    if usage_stats['requests']:
+        st.markdown(
+            f"**Cortex 推定トークン**: {usage_stats['total_tokens']:,}"
+            f"（{usage_stats['requests']}回 / プロンプト {usage_stats['prompt_tokens']:,}・出力 {usage_stats['output_tokens']:,}）"
+        )
+        st.dataframe(pd.DataFrame(cortex_usage_by_target()), use_container_width=True, hide_index=True)
+
+
+# クエリ計測（URLに ?debug=1 を付けるか、環境変数 CATALOG_QUERY_DEBUG=1 のときに表示）
+render_debug_panel(session, extra=render_cortex_usage)
+session.recorder.finish()
+
 st.markdown("---")
 st.caption("Powered by Powertrain DX Team © DENSO Corporation")
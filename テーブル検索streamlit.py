@@ -1,9 +1,24 @@
 import streamlit as st
 from snowflake.snowpark.context import get_active_session
 import pandas as pd
+import re
+import time
+from catalog import get_snapshot, snapshot_stats, format_bytes, format_stats
+from column_metadata import get_columns
+from data_preview import PREVIEW_ROWS, get_preview
+from table_export import render_export_panel
+from cortex import DEFAULT_MODEL, complete
+from llm_cache import get_llm_cache, format_stats as format_llm_cache_stats
+from search_index import get_search_index
+from session_context import connection_text, get_session_context, odbc_connection_string, power_query_m
+from vector_index import CortexEmbedder, get_vector_index
+from query_log import instrument_session, render_debug_panel
 
-# Snowflakeセッションを取得
-session = get_active_session()
+# Snowflakeセッションを取得（クエリごとに所要時間・件数を記録する）
+session = instrument_session(get_active_session(), page="テーブル検索")
+
+# キーワード抽出プロンプトのバージョン（プロンプトを変更したら上げる）
+KEYWORD_PROMPT_VERSION = "v1"
 
 st.set_page_config(layout="wide")
 st.title("テーブル検索")
@@ -38,9 +53,10 @@ with left_col:
     st.subheader("🔍 検索オプション")
     
     # タブで検索方法を分ける
-    tab1, tab2, tab3 = st.tabs(["💬 AI検索", "🔤 キーワード検索", "📁 フィルター検索"])
+    tab1, tab2, tab3, tab4 = st.tabs(["💬 AI検索", "🔤 キーワード検索", "📁 フィルター検索", "🧭 意味検索"])
     
     # ===== AI検索タブ =====
+    session.set_section("AI検索")
     with tab1:
         st.markdown("自然言語で質問してください")
         
@@ -75,66 +91,42 @@ TABLE_INFOのカラム:
 例: 売上,sales,売上管理
 """
                         
-                        # Cortex AIでキーワード生成
+                        # Cortex AIでキーワード生成（同じ質問はキャッシュから返す）
                         try:
-                            ai_result = session.sql(f"""
-                                SELECT SNOWFLAKE.CORTEX.COMPLETE(
-                                    'mistral-large2',
-                                    '{ai_prompt.replace("'", "''")}'
-                                ) as keywords
-                            """).collect()
-                            
-                            keywords_text = ai_result[0]['KEYWORDS'] if ai_result else ""
-                            keywords = [kw.strip() for kw in keywords_text.split(',') if kw.strip()]
+                            llm_cache = get_llm_cache()
+                            keywords_text = llm_cache.get_or_compute(
+                                ai_query,
+                                DEFAULT_MODEL,
+                                KEYWORD_PROMPT_VERSION,
+                                lambda: complete(session, ai_prompt),
+                                prompt=ai_prompt,
+                                session=session
+                            )
+                            keywords = [kw.strip() for kw in re.split(r"[,、\n]", keywords_text) if kw.strip()]
                         except:
                             keywords = [ai_query.strip()]
                         
-                        # キーワードでTABLE_INFOを検索
-                        search_conditions = []
-                        for kw in keywords[:5]:  # 最大5キーワード
-                            kw_escaped = kw.replace("'", "''")
-                            search_conditions.append(f"""
-                                (UPPER(TABLE_NAME) LIKE UPPER('%{kw_escaped}%') OR
-                                 UPPER(LOCATION) LIKE UPPER('%{kw_escaped}%') OR
-                                 UPPER(TABLE_COMMENT) LIKE UPPER('%{kw_escaped}%') OR
-                                 UPPER(COLUMN_COMMENT) LIKE UPPER('%{kw_escaped}%') OR
-                                 UPPER(APPLICATION_PROJECT) LIKE UPPER('%{kw_escaped}%') OR
-                                 UPPER(SCOPE) LIKE UPPER('%{kw_escaped}%') OR
-                                 UPPER(COMMENT) LIKE UPPER('%{kw_escaped}%'))
-                            """)
-                        
-                        search_where = " OR ".join(search_conditions) if search_conditions else "1=0"
+                        if not keywords:
+                            keywords = [ai_query.strip()]
                         
-                        search_query = f"""
-                            SELECT 
-                                TABLE_NAME,
-                                LOCATION,
-                                TABLE_COMMENT,
-                                COLUMN_COMMENT,
-                                APPLICATION_PROJECT,
-                                SCOPE,
-                                COMMENT,
-                                COLUMN_NUM,
-                                RECORD_NUM,
-                                OWNER,
-                                SUB_OWNER
-                            FROM DIESELPJ_GEN.DATA_CATALOG.TABLE_INFO
-                            WHERE {search_where}
-                            ORDER BY TABLE_NAME
-                            LIMIT 50
-                        """
+                        # キャッシュ済みカタログの索引で、一致キーワード数・一致フィールドによる関連度順検索
+                        search_index = get_search_index(get_snapshot(session))
+                        hits = search_index.search_keywords(keywords, limit=50)
+                        result = [hit.as_result() for hit in hits]
                         
-                        result = session.sql(search_query).collect()
                         st.session_state.search_results = result
-                        st.session_state.search_method = f"AI検索: {ai_query}"
+                        st.session_state.search_method = f"AI検索: {ai_query} （キーワード: {', '.join(keywords)}）"
                         st.rerun()
                         
                     except Exception as e:
                         st.error(f"❌ AI検索エラー: {str(e)}")
             else:
                 st.warning("質問を入力してください")
+        
+        st.caption(format_llm_cache_stats(get_llm_cache().stats()))
     
     # ===== キーワード検索タブ =====
+    session.set_section("キーワード検索")
     with tab2:
         st.markdown("キーワードで検索")
         
@@ -147,35 +139,15 @@ TABLE_INFOのカラム:
         if st.button("🔎 キーワード検索", type="primary", use_container_width=True, key="keyword_search_btn"):
             if keyword_query.strip():
                 try:
-                    kw_escaped = keyword_query.replace("'", "''")
-                    search_query = f"""
-                        SELECT 
-                            TABLE_NAME,
-                            LOCATION,
-                            TABLE_COMMENT,
-                            COLUMN_COMMENT,
-                            APPLICATION_PROJECT,
-                            SCOPE,
-                            COMMENT,
-                            COLUMN_NUM,
-                            RECORD_NUM,
-                            OWNER,
-                            SUB_OWNER
-                        FROM DIESELPJ_GEN.DATA_CATALOG.TABLE_INFO
-                        WHERE UPPER(TABLE_NAME) LIKE UPPER('%{kw_escaped}%')
-                           OR UPPER(LOCATION) LIKE UPPER('%{kw_escaped}%')
-                           OR UPPER(TABLE_COMMENT) LIKE UPPER('%{kw_escaped}%')
-                           OR UPPER(COLUMN_COMMENT) LIKE UPPER('%{kw_escaped}%')
-                           OR UPPER(APPLICATION_PROJECT) LIKE UPPER('%{kw_escaped}%')
-                           OR UPPER(SCOPE) LIKE UPPER('%{kw_escaped}%')
-                           OR UPPER(COMMENT) LIKE UPPER('%{kw_escaped}%')
-                        ORDER BY TABLE_NAME
-                        LIMIT 50
-                    """
+                    # インメモリ索引でBM25ランキング検索
+                    start_time = time.perf_counter()
+                    search_index = get_search_index(get_snapshot(session))
+                    hits = search_index.search(keyword_query, limit=50)
+                    elapsed_ms = (time.perf_counter() - start_time) * 1000
                     
-                    result = session.sql(search_query).collect()
+                    result = [hit.as_result() for hit in hits]
                     st.session_state.search_results = result
-                    st.session_state.search_method = f"キーワード検索: {keyword_query}"
+                    st.session_state.search_method = f"キーワード検索: {keyword_query} （関連度順, {elapsed_ms:.0f}ms）"
                     st.rerun()
                     
                 except Exception as e:
@@ -184,114 +156,59 @@ TABLE_INFOのカラム:
                 st.warning("キーワードを入力してください")
     
     # ===== フィルター検索タブ =====
+    session.set_section("フィルター検索")
     with tab3:
         st.markdown("フィルターで絞り込み")
         
-        # データベース一覧を取得
+        # スナップショットからデータベース一覧を取得
         try:
-            locations_query = """
-                SELECT DISTINCT LOCATION
-                FROM DIESELPJ_GEN.DATA_CATALOG.TABLE_INFO
-                ORDER BY LOCATION
-            """
-            locations_result = session.sql(locations_query).collect()
-            
-            # LOCATIONを分解してデータベースリストを作成
-            databases = sorted(list(set([row['LOCATION'].split('.')[0] for row in locations_result])))
-            database_list = ["すべて"] + databases
+            snapshot = get_snapshot(session)
+            database_list = ["すべて"] + snapshot.databases()
             
             selected_database = st.selectbox(
                 "📁 データベース",
                 database_list,
+                format_func=lambda db: db if db == "すべて" else snapshot.label(db),
                 key="database_filter"
             )
         except Exception as e:
             st.error(f"データベース取得エラー: {str(e)}")
+            snapshot = None
             selected_database = "すべて"
         
         # スキーマ一覧を取得（データベースが選択されている場合）
         selected_schema = "すべて"
         if selected_database != "すべて":
-            try:
-                # 選択されたデータベースに属するスキーマを取得
-                schemas = sorted(list(set([
-                    row['LOCATION'].split('.')[1] 
-                    for row in locations_result 
-                    if row['LOCATION'].startswith(f"{selected_database}.")
-                ])))
-                schema_list = ["すべて"] + schemas
-                
-                selected_schema = st.selectbox(
-                    "📂 スキーマ",
-                    schema_list,
-                    key="schema_filter"
-                )
-            except Exception as e:
-                st.error(f"スキーマ取得エラー: {str(e)}")
-                selected_schema = "すべて"
+            schema_list = ["すべて"] + snapshot.schemas_in(selected_database)
+            
+            selected_schema = st.selectbox(
+                "📂 スキーマ",
+                schema_list,
+                format_func=lambda schema: schema if schema == "すべて" else snapshot.label(selected_database, schema),
+                key="schema_filter"
+            )
         
         # テーブル一覧を取得（スキーマが選択されている場合）
         selected_table_filter = "すべて"
         if selected_database != "すべて" and selected_schema != "すべて":
-            try:
-                location = f"{selected_database}.{selected_schema}"
-                tables_query = f"""
-                    SELECT DISTINCT TABLE_NAME
-                    FROM DIESELPJ_GEN.DATA_CATALOG.TABLE_INFO
-                    WHERE LOCATION = '{location}'
-                    ORDER BY TABLE_NAME
-                """
-                tables_result = session.sql(tables_query).collect()
-                table_list = ["すべて"] + [row['TABLE_NAME'] for row in tables_result]
-                
-                selected_table_filter = st.selectbox(
-                    "📄 テーブル",
-                    table_list,
-                    key="table_filter"
-                )
-            except Exception as e:
-                st.error(f"テーブル取得エラー: {str(e)}")
-                selected_table_filter = "すべて"
+            location = f"{selected_database}.{selected_schema}"
+            table_list = ["すべて"] + snapshot.tables_in(location)
+            
+            selected_table_filter = st.selectbox(
+                "📄 テーブル",
+                table_list,
+                key="table_filter"
+            )
         
         if st.button("🔍 フィルター検索", type="primary", use_container_width=True, key="filter_search_btn"):
             try:
-                where_clauses = []
-                
-                # データベースフィルター
-                if selected_database != "すべて":
-                    if selected_schema != "すべて":
-                        # データベースとスキーマが指定されている
-                        location = f"{selected_database}.{selected_schema}"
-                        where_clauses.append(f"LOCATION = '{location}'")
-                        
-                        # テーブルフィルター
-                        if selected_table_filter != "すべて":
-                            where_clauses.append(f"TABLE_NAME = '{selected_table_filter}'")
-                    else:
-                        # データベースのみ指定（スキーマは全て）
-                        where_clauses.append(f"LOCATION LIKE '{selected_database}.%'")
-                
-                where_clause = " AND ".join(where_clauses) if where_clauses else "1=1"
-                
-                search_query = f"""
-                    SELECT 
-                        TABLE_NAME,
-                        LOCATION,
-                        TABLE_COMMENT,
-                        APPLICATION_PROJECT,
-                        SCOPE,
-                        COMMENT,
-                        COLUMN_NUM,
-                        RECORD_NUM,
-                        OWNER,
-                        SUB_OWNER
-                    FROM DIESELPJ_GEN.DATA_CATALOG.TABLE_INFO
-                    WHERE {where_clause}
-                    ORDER BY TABLE_NAME
-                    LIMIT 50
-                """
-                
-                result = session.sql(search_query).collect()
+                # スナップショットから絞り込み（DBクエリは発行しない）
+                result = get_snapshot(session).filter(
+                    database=selected_database if selected_database != "すべて" else None,
+                    schema=selected_schema if selected_schema != "すべて" else None,
+                    table_name=selected_table_filter if selected_table_filter != "すべて" else None,
+                    limit=50
+                )
                 st.session_state.search_results = result
                 
                 # フィルター説明を生成
@@ -310,6 +227,34 @@ TABLE_INFOのカラム:
             except Exception as e:
                 st.error(f"❌ フィルター検索エラー: {str(e)}")
     
+    # ===== 意味検索タブ =====
+    session.set_section("意味検索")
+    with tab4:
+        st.markdown("意味の近いテーブルを検索（類義語・日英の違いも考慮）")
+        
+        semantic_query = st.text_input(
+            "検索文",
+            placeholder="例: 耐久試験の結果 / durability test",
+            key="semantic_query"
+        )
+        
+        if st.button("🧭 意味検索", type="primary", use_container_width=True, key="semantic_search_btn"):
+            if semantic_query.strip():
+                with st.spinner("ベクトル検索中...（初回はテーブルの埋め込みを作成します）"):
+                    try:
+                        vector_index = get_vector_index(get_snapshot(session), CortexEmbedder(session))
+                        result = [
+                            dict(row, SCORE=round(score, 3))
+                            for row, score in vector_index.search(semantic_query, limit=50)
+                        ]
+                        st.session_state.search_results = result
+                        st.session_state.search_method = f"意味検索: {semantic_query} （コサイン類似度順）"
+                        st.rerun()
+                    except Exception as e:
+                        st.error(f"❌ 意味検索エラー: {str(e)}")
+            else:
+                st.warning("検索文を入力してください")
+    
     st.markdown("---")
     
     # 検索リセットボタン
@@ -317,8 +262,11 @@ TABLE_INFOのカラム:
         st.session_state.search_results = None
         st.session_state.search_method = ""
         st.rerun()
+    
+    st.caption(format_stats(snapshot_stats()))
 
 # ===== 右側: 検索結果 =====
+session.set_section("検索結果")
 with right_col:
     st.subheader("📊 検索結果")
     
@@ -343,8 +291,13 @@ with right_col:
                 rec_num = row['RECORD_NUM']
                 owner = row['OWNER'] or "-"
                 sub_owner = row['SUB_OWNER'] or "-"
+                score = row.get('SCORE')
+                
+                expander_title = f"📋 {table_name} ({location})"
+                if score is not None:
+                    expander_title += f"  ・関連度 {score:.2f}"
                 
-                with st.expander(f"📋 {table_name} ({location})"):
+                with st.expander(expander_title):
                     col_a, col_b = st.columns(2)
                     
                     with col_a:
@@ -361,6 +314,11 @@ with right_col:
                     if comment != "-":
                         st.markdown(f"**備考:** {comment}")
                     
+                    if row.get('MATCHED_KEYWORDS'):
+                        st.caption(f"一致したキーワード: {', '.join(row['MATCHED_KEYWORDS'])}")
+                    if row.get('MATCHED_FIELDS'):
+                        st.caption(f"一致した項目: {', '.join(row['MATCHED_FIELDS'])}")
+                    
                     st.markdown("---")
                     
                     # テーブル詳細を表示するボタン
@@ -379,11 +337,13 @@ with right_col:
         - **AI検索**: 自然言語で質問
         - **キーワード検索**: キーワードで全文検索
         - **フィルター検索**: ロケーションとテーブル名で絞り込み
+        - **意味検索**: 埋め込みベクトルで意味の近いテーブルを検索
         """)
 
 st.markdown("---")
 
 # ===== テーブル詳細情報表示セクション =====
+session.set_section("テーブル詳細")
 if st.session_state.selected_table_for_detail and st.session_state.selected_location_for_detail:
     table_name = st.session_state.selected_table_for_detail
     location = st.session_state.selected_location_for_detail
@@ -399,18 +359,10 @@ if st.session_state.selected_table_for_detail and st.session_state.selected_loca
     st.markdown("---")
     
     try:
-        # TABLE_INFOからテーブル情報を取得
-        table_info_query = f"""
-            SELECT *
-            FROM DIESELPJ_GEN.DATA_CATALOG.TABLE_INFO
-            WHERE TABLE_NAME = '{table_name}'
-              AND LOCATION = '{location}'
-        """
-        table_info_result = session.sql(table_info_query).collect()
+        # スナップショットからテーブル情報を取得
+        info = get_snapshot(session).get(location, table_name)
         
-        if table_info_result:
-            info = table_info_result[0]
-            
+        if info:
             # テーブルタイトル
             st.subheader(f"📊 {table_name}")
             st.caption(f"📁 {location}")
@@ -423,7 +375,8 @@ if st.session_state.selected_table_for_detail and st.session_state.selected_loca
             
             with col1:
                 st.metric("カラム数", f"{info['COLUMN_NUM']:,}")
-                st.metric("レコード数", f"{info['RECORD_NUM']:,}" if info['RECORD_NUM'] else "N/A")
+                st.metric("レコード数", f"{info['RECORD_NUM']:,}" if info['RECORD_NUM'] is not None else "N/A")
+                st.metric("サイズ", format_bytes(info['BYTES']))
                 st.write(f"**作成日:** {info['CREATION_DATE']}")
                 st.write(f"**更新日:** {info['UPDATE_DATE']}")
             
@@ -453,22 +406,14 @@ if st.session_state.selected_table_for_detail and st.session_state.selected_loca
             
             # LOCATIONからデータベースとスキーマを分解
             db_schema = location.split('.')
+            columns_result = []
             if len(db_schema) == 2:
                 db_name = db_schema[0]
                 schema_name = db_schema[1]
                 
                 try:
-                    columns_query = f"""
-                        SELECT 
-                            COLUMN_NAME,
-                            DATA_TYPE,
-                            COMMENT
-                        FROM "{db_name}".INFORMATION_SCHEMA.COLUMNS
-                        WHERE TABLE_SCHEMA = '{schema_name}'
-                          AND TABLE_NAME = '{table_name}'
-                        ORDER BY ORDINAL_POSITION
-                    """
-                    columns_result = session.sql(columns_query).collect()
+                    # カラム情報はスキーマ単位で先読みしたキャッシュから取得
+                    columns_result = get_columns(session, db_name, schema_name, table_name)
                     
                     if columns_result:
                         columns_df = pd.DataFrame([
@@ -494,40 +439,61 @@ if st.session_state.selected_table_for_detail and st.session_state.selected_loca
             
             st.markdown("---")
             
-            # データプレビュー
-            st.markdown("**👀 データプレビュー (先頭100件)**")
+            # データプレビュー（ボタンを押したときだけ取得する）
+            st.markdown(f"**👀 データプレビュー (先頭{PREVIEW_ROWS}件)**")
             
-            try:
-                preview_query = f"""
-                    SELECT *
-                    FROM "{db_name}"."{schema_name}"."{table_name}"
-                    LIMIT 100
-                """
-                preview_result = session.sql(preview_query).collect()
-                
-                if preview_result:
-                    preview_df = pd.DataFrame([row.as_dict() for row in preview_result])
-                    
-                    st.dataframe(
-                        preview_df,
-                        use_container_width=True,
-                        hide_index=True,
-                        height=400
-                    )
-                    
-                    # CSV ダウンロード
-                    csv = preview_df.to_csv(index=False).encode('utf-8-sig')
-                    st.download_button(
-                        label="📥 プレビューデータをCSVダウンロード",
-                        data=csv,
-                        file_name=f"{table_name}_preview.csv",
-                        mime="text/csv"
-                    )
-                else:
-                    st.info("データがありません")
+            preview_key = f"{location}.{table_name}"
+            preview_columns = st.multiselect(
+                "表示するカラム（未選択の場合は全カラム）",
+                [column['COLUMN_NAME'] for column in columns_result],
+                key=f"preview_columns_{preview_key}"
+            )
+            
+            if st.button("👀 プレビューを表示", key=f"preview_btn_{preview_key}"):
+                st.session_state.preview_requested = preview_key
+            
+            if st.session_state.get('preview_requested') != preview_key:
+                st.caption("「プレビューを表示」を押すとデータを取得します")
+            else:
+                try:
+                    # テーブルの更新日時ごとにキャッシュされる（Arrow経由でDataFrameに変換）
+                    with st.spinner("データ取得中..."):
+                        preview_df = get_preview(
+                            session, db_name, schema_name, table_name,
+                            update_date=info['UPDATE_DATE'],
+                            columns=preview_columns
+                        )
                     
-            except Exception as e:
-                st.error(f"データプレビューエラー: {str(e)}")
+                    if not preview_df.empty:
+                        st.dataframe(
+                            preview_df,
+                            use_container_width=True,
+                            hide_index=True,
+                            height=400
+                        )
+                        
+                        # CSV ダウンロード
+                        csv = preview_df.to_csv(index=False).encode('utf-8-sig')
+                        st.download_button(
+                            label="📥 プレビューデータをCSVダウンロード",
+                            data=csv,
+                            file_name=f"{table_name}_preview.csv",
+                            mime="text/csv"
+                        )
+                    else:
+                        st.info("データがありません")
+                
+                except Exception as e:
+                    st.error(f"データプレビューエラー: {str(e)}")
+            
+            st.markdown("---")
+            
+            # エクスポート（バッチごとにファイルへ書き出す）
+            st.markdown("**📤 エクスポート (CSV / Parquet)**")
+            render_export_panel(
+                session, db_name, schema_name, table_name,
+                [column['COLUMN_NAME'] for column in columns_result], info['RECORD_NUM']
+            )
             
             st.markdown("---")
             
@@ -535,51 +501,47 @@ if st.session_state.selected_table_for_detail and st.session_state.selected_loca
             st.markdown("**📊 Power BI接続**")
             
             try:
-                # Snowflakeアカウント情報を取得
-                account_info = session.sql("SELECT CURRENT_ACCOUNT() AS ACCOUNT, CURRENT_REGION() AS REGION").collect()
-                if account_info:
-                    account = account_info[0]['ACCOUNT']
-                    region = account_info[0]['REGION']
-                    
-                    # Power BI接続用の情報
-                    server_name = f"{account}.{region}.snowflakecomputing.com"
-                    database_name = db_name
-                    warehouse_info = session.sql("SELECT CURRENT_WAREHOUSE() AS WH").collect()
-                    warehouse = warehouse_info[0]['WH'] if warehouse_info else 'N/A'
-                    
-                    connection_col1, connection_col2 = st.columns(2)
+                # アカウント・リージョン・ウェアハウスはセッション中変わらないため1回だけ取得する
+                context = get_session_context(session)
+                
+                connection_col1, connection_col2 = st.columns(2)
+                
+                with connection_col1:
+                    connection_tab, odbc_tab, m_tab = st.tabs(["接続情報", "ODBC", "Power Query (M)"])
                     
-                    with connection_col1:
+                    with connection_tab:
                         # 接続文字列をテキストエリアに表示
-                        connection_info = f"""サーバー: {server_name}
-データベース: {database_name}
-スキーマ: {schema_name}
-テーブル: {table_name}
-ウェアハウス: {warehouse}"""
-                        
                         st.text_area(
                             "接続情報（Power BIで使用）",
-                            value=connection_info,
+                            value=connection_text(context, db_name, schema_name, table_name),
                             height=150,
                             key="powerbi_connection_info"
                         )
                     
-                    with connection_col2:
-                        st.markdown("**Power BI接続手順:**")
-                        st.info("⚠️ 事前にODBC設定が必要。[リンクをご参照ください](https://globaldenso.sharepoint.com/sites/jp102749/SitePages/Alluser/snowflake%E3%81%AE%E8%AA%8D%E8%A8%BC%E6%96%B9%E5%BC%8F.aspx)")
-                        st.markdown("""                                        
+                    with odbc_tab:
+                        st.code(odbc_connection_string(context, db_name, schema_name), language=None)
+                        st.caption("↑ ODBCデータソース（接続文字列）に使用")
+                    
+                    with m_tab:
+                        st.code(power_query_m(context, db_name, schema_name, table_name), language=None)
+                        st.caption("↑ Power BI の「空のクエリ」→「詳細エディター」に貼り付け")
+                
+                with connection_col2:
+                    st.markdown("**Power BI接続手順:**")
+                    st.info("⚠️ 事前にODBC設定が必要。[リンクをご参照ください](https://globaldenso.sharepoint.com/sites/jp102749/SitePages/Alluser/snowflake%E3%81%AE%E8%AA%8D%E8%A8%BC%E6%96%B9%E5%BC%8F.aspx)")
+                    st.markdown("""                                        
 1. Power BI Desktopを起動
 2. 「データを取得」→「その他」
 3. 「Snowflake」を選択
 4. サーバー名とウェアハウスを入力
 5. データベースとスキーマを選択
 6. 対象テーブルを選択
-                        """)
+                    """)
                         
-                        # テーブルの完全パスをコピー用に表示
-                        full_table_path = f"{database_name}.{schema_name}.{table_name}"
-                        st.code(full_table_path, language=None)
-                        st.caption("↑ このテーブルパスをコピーして使用")
+                    # テーブルの完全パスをコピー用に表示
+                    full_table_path = f"{db_name}.{schema_name}.{table_name}"
+                    st.code(full_table_path, language=None)
+                    st.caption("↑ このテーブルパスをコピーして使用")
             
             except Exception as e:
                 st.error(f"接続情報取得エラー: {str(e)}")
@@ -590,5 +552,9 @@ if st.session_state.selected_table_for_detail and st.session_state.selected_loca
     except Exception as e:
         st.error(f"エラーが発生しました: {str(e)}")
 
+# クエリ計測（URLに ?debug=1 を付けるか、環境変数 CATALOG_QUERY_DEBUG=1 のときに表示）
+render_debug_panel(session)
+session.recorder.finish()
+
 st.markdown("---")
 st.caption("Powered by Powertrain DX Team © DENSO Corporation")